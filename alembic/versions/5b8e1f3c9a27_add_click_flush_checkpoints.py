@@ -0,0 +1,29 @@
+"""Add click_flush_checkpoints table
+
+Revision ID: 5b8e1f3c9a27
+Revises: 738c9066211c
+Create Date: 2026-10-17 10:12:41.523904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e1f3c9a27'
+down_revision = '738c9066211c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_flush_checkpoints',
+    sa.Column('flush_key', sa.String(), nullable=False),
+    sa.Column('batch_id', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('flush_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('click_flush_checkpoints')
@@ -0,0 +1,26 @@
+"""Add fence_token to click_flush_checkpoints
+
+Revision ID: 9d4c2a7e5f10
+Revises: 5b8e1f3c9a27
+Create Date: 2026-10-17 13:40:18.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4c2a7e5f10'
+down_revision = '5b8e1f3c9a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('click_flush_checkpoints',
+    sa.Column('fence_token', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('click_flush_checkpoints', 'fence_token')
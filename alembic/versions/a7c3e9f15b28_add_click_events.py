@@ -0,0 +1,38 @@
+"""Add day-partitioned click_events table
+
+Revision ID: a7c3e9f15b28
+Revises: f4b2d7a9c1e3
+Create Date: 2026-10-17 17:48:12.051774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f15b28'
+down_revision = 'f4b2d7a9c1e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_events',
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('referrer', sa.String(), nullable=True),
+    sa.Column('user_agent_class', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('occurred_at', 'id'),
+    postgresql_partition_by='RANGE (occurred_at)',
+    )
+    op.create_index('ix_click_events_url_id_occurred_at', 'click_events', ['url_id', 'occurred_at'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        # Daily partitions are created ahead of time by rotate_click_events;
+        # this one catches anything outside them.
+        op.execute('CREATE TABLE click_events_default PARTITION OF click_events DEFAULT')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_click_events_url_id_occurred_at', table_name='click_events')
+    op.drop_table('click_events')
@@ -0,0 +1,30 @@
+"""Add click_rollups table
+
+Revision ID: c3f7a1d9e842
+Revises: 9d4c2a7e5f10
+Create Date: 2026-10-17 15:02:37.918244
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f7a1d9e842'
+down_revision = '9d4c2a7e5f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_rollups',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('url_id', 'resolution', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('click_rollups')
@@ -0,0 +1,32 @@
+"""Add unique visitor sketches
+
+Revision ID: e1a5b8c4d2f6
+Revises: c3f7a1d9e842
+Create Date: 2026-10-17 16:21:09.334817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a5b8c4d2f6'
+down_revision = 'c3f7a1d9e842'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('urls',
+    sa.Column('unique_visitors', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.create_table('url_visitor_sketches',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('sketch', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('url_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('url_visitor_sketches')
+    op.drop_column('urls', 'unique_visitors')
@@ -0,0 +1,41 @@
+"""Add top_urls table
+
+Revision ID: f4b2d7a9c1e3
+Revises: e1a5b8c4d2f6
+Create Date: 2026-10-17 17:04:51.602318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from shortener_app.config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b2d7a9c1e3'
+down_revision = 'e1a5b8c4d2f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('top_urls',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('url_id')
+    )
+    op.create_index(op.f('ix_top_urls_clicks'), 'top_urls', ['clicks'], unique=False)
+    # Seed from the existing totals; from here on the click flush maintains it.
+    # The one full sort of urls happens here, not per request. Same size as the
+    # flush keeps (CLICK_LEADERBOARD_SIZE), so seed and runtime top-K agree.
+    size = get_settings().click_leaderboard_size
+    if size:
+        op.execute(sa.text(
+            "INSERT INTO top_urls (url_id, clicks) "
+            "SELECT id, clicks FROM urls WHERE clicks > 0 ORDER BY clicks DESC LIMIT :size"
+        ).bindparams(size=size))
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_top_urls_clicks'), table_name='top_urls')
+    op.drop_table('top_urls')
@@ -0,0 +1,84 @@
+"""Click buffer backends: sorted-set counters (ZINCRBY) vs Redis Stream events (XADD).
+
+Records --clicks clicks spread over --urls URLs (Zipf-like: a few URLs get
+most of the traffic), then flushes them into SQLite. Reports recording
+throughput, flush time, and the Redis memory the buffer held before the
+flush.
+
+By default it runs against the test suite's in-process FakeRedis, which
+measures client-side overhead only. Pass --redis-url (pointing at a scratch
+database: the benchmark deletes the buffer keys) to measure a real server,
+where the memory column is meaningful too.
+
+    python -m benchmarks.click_backends [--clicks 20000] [--urls 500] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from redis.asyncio import Redis
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from shortener_app import models
+from shortener_app.database import Base
+from shortener_app.infrastructure import ClickBuffer, StreamClickBuffer
+from shortener_app.infrastructure.click_buffer import _LEADERBOARD_KEY
+from shortener_app.infrastructure.click_stream import _STREAM_KEY
+from tests.conftest import FakeRedis
+
+
+async def _memory(redis, key: str):
+    if isinstance(redis, FakeRedis):
+        return None
+    return await redis.memory_usage(key, samples=0)
+
+
+async def _run(name: str, buffer: ClickBuffer, key: str, url_ids: list[int], session_factory):
+    await buffer.redis.delete(key)
+    started = time.perf_counter()
+    for url_id in url_ids:
+        await buffer.increment(url_id)
+    recorded = time.perf_counter() - started
+    memory = await _memory(buffer.redis, key)
+
+    started = time.perf_counter()
+    async with session_factory() as db:
+        await buffer.flush_to_db(db)
+    flushed = time.perf_counter() - started
+    await buffer.redis.delete(key)
+
+    memory_text = f"{memory / 1024:8.0f} KiB" if memory is not None else "       n/a"
+    print(f"{name:<16} {len(url_ids) / recorded:10.0f} clicks/s  flush {flushed:6.3f}s  buffer {memory_text}")
+
+
+async def main(clicks: int, urls: int, redis_url: str = None):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(models.URL), [
+            {"key": f"K{i:05d}", "secret_key": f"K{i:05d}_SECRET", "target_url": "https://example.com"}
+            for i in range(urls)
+        ])
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    redis = Redis.from_url(redis_url, decode_responses=True) if redis_url else FakeRedis()
+    rng = random.Random(42)
+    url_ids = [min(urls, int(rng.paretovariate(1.2))) for _ in range(clicks)]
+
+    await _run("zset (ZINCRBY)", ClickBuffer(redis), _LEADERBOARD_KEY, url_ids, session_factory)
+    stream = StreamClickBuffer(redis, maxlen=clicks * 2)
+    await _run("stream (XADD)", stream, _STREAM_KEY, url_ids, session_factory)
+
+    await redis.close()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=20_000)
+    parser.add_argument("--urls", type=int, default=500)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.clicks, args.urls, args.redis_url))
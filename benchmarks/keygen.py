@@ -0,0 +1,66 @@
+"""Key generation: random.choices per key vs batched os.urandom + bytes.translate.
+
+Generates --keys url keys (plus an 8-character secret suffix per key, as
+URLService.create does) four ways and reports keys/s:
+
+  - random.choices: the previous generate_random_key (Mersenne Twister,
+    predictable, one call per key)
+  - secrets.choice: the obvious CSPRNG fix, one call per character
+  - generate_random_key: CSPRNG characters from a 4 KiB buffer, one key at a time
+  - generate_keys: the same buffer, all keys in one call (bulk paths)
+
+    python -m benchmarks.keygen [--keys 100000] [--size 6]
+"""
+import argparse
+import random
+import secrets
+import time
+
+from shortener_app.keygen import ALPHABET, generate_keys, generate_random_key
+
+
+def _choices(count: int, size: int):
+    for _ in range(count):
+        "".join(random.choices(ALPHABET, k=size))
+        "".join(random.choices(ALPHABET, k=8))
+
+
+def _secrets_choice(count: int, size: int):
+    for _ in range(count):
+        "".join(secrets.choice(ALPHABET) for _ in range(size))
+        "".join(secrets.choice(ALPHABET) for _ in range(8))
+
+
+def _buffered(count: int, size: int):
+    for _ in range(count):
+        generate_random_key(size)
+        generate_random_key(8)
+
+
+def _batched(count: int, size: int):
+    generate_keys(count, size)
+    generate_keys(count, 8)
+
+
+def main(keys: int, size: int):
+    print(f"{keys} keys of {size} characters, each with an 8-character secret suffix")
+    baseline = None
+    for name, run in (
+        ("random.choices", _choices),
+        ("secrets.choice", _secrets_choice),
+        ("generate_random_key", _buffered),
+        ("generate_keys", _batched),
+    ):
+        started = time.perf_counter()
+        run(keys, size)
+        rate = keys / (time.perf_counter() - started)
+        baseline = baseline or rate
+        print(f"{name:<20} {rate:12.0f} keys/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--size", type=int, default=6)
+    args = parser.parse_args()
+    main(args.keys, args.size)
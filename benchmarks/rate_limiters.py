@@ -0,0 +1,143 @@
+"""Rate limiters: fixed window (INCR + EXPIRE) vs GCRA (one Lua script).
+
+Two measurements per algorithm:
+
+  - boundary burst: a client makes one request, waits until just before the
+    fixed window would reset, then hammers for --burst-seconds straddling that
+    moment. Reports how many requests got through in that short span (the
+    limit is --max per --window seconds). Runs on a simulated clock, so it is
+    exact and instant.
+  - throughput: --checks limiter checks spread over --clients clients, with
+    Redis round trips per check. Against the test suite's in-process FakeRedis
+    by default (client-side overhead only); pass --redis-url (a scratch
+    database: the benchmark deletes rate_limit:* keys) for a real server.
+
+    python -m benchmarks.rate_limiters [--max 100] [--window 60] [--checks 20000] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+
+from shortener_app.config import get_settings
+from shortener_app.infrastructure import RateLimiter
+from shortener_app.infrastructure.rate_limiter import LIMITER_STEPS
+from tests.conftest import FakeRedis
+
+
+class _ClockedRedis(FakeRedis):
+    """FakeRedis with a settable clock, real INCR and key expiry."""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1_000_000.0
+        self._expires: dict[str, float] = {}
+        self.calls = 0
+
+    def _expire_keys(self):
+        for key, deadline in list(self._expires.items()):
+            if deadline <= self.now:
+                self._strings.pop(key, None)
+                del self._expires[key]
+
+    def register_script(self, script: str):
+        run = super().register_script(script)
+
+        async def counted(keys=(), args=(), client=None):
+            self.calls += 1  # one EVALSHA, whatever the script does inside
+            return await run(keys=keys, args=args)
+        return counted
+
+    async def time(self):
+        seconds, fraction = divmod(self.now, 1)
+        return int(seconds), int(fraction * 1_000_000)
+
+    async def incr(self, key: str) -> int:
+        self.calls += 1
+        self._expire_keys()
+        self._strings[key] = str(int(self._strings.get(key, 0)) + 1)
+        return int(self._strings[key])
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        self.calls += 1
+        self._expires[key] = self.now + seconds
+        return True
+
+
+def _request(redis, client: int = 0):
+    request = MagicMock()
+    request.app.state.redis = redis
+    request.client.host = f"10.0.{client // 256}.{client % 256}"
+    request.url.path = "/url"
+    return request
+
+
+async def _check(limiter: RateLimiter, request) -> bool:
+    try:
+        await limiter.check_rate_limit(request)
+    except HTTPException:
+        return False
+    return True
+
+
+async def _boundary_burst(algorithm: str, max_requests: int, window: int, burst_seconds: float) -> int:
+    redis = _ClockedRedis()
+    limiter = RateLimiter(max_requests, window, algorithm=algorithm)
+    request = _request(redis)
+    await _check(limiter, request)
+    redis.now += window - burst_seconds / 2
+    allowed = 0
+    for step in range(max_requests * 4):
+        redis.now += burst_seconds / (max_requests * 4)
+        allowed += await _check(limiter, request)
+    return allowed
+
+
+async def _throughput(algorithm: str, redis, max_requests: int, window: int, checks: int, clients: int):
+    limiter = RateLimiter(max_requests, window, algorithm=algorithm)
+    requests = [_request(redis, client) for client in range(clients)]
+    calls_before = getattr(redis, "calls", None)
+    started = time.perf_counter()
+    for i in range(checks):
+        await _check(limiter, requests[i % clients])
+    elapsed = time.perf_counter() - started
+    round_trips = (
+        (redis.calls - calls_before) / checks if calls_before is not None else None
+    )
+    return checks / elapsed, round_trips
+
+
+async def main(max_requests: int, window: int, burst_seconds: float, checks: int, clients: int,
+               redis_url: str = None):
+    get_settings().rate_limit_enabled = True
+    print(f"limit: {max_requests} per {window}s; burst span {burst_seconds}s")
+    for algorithm in LIMITER_STEPS:
+        allowed = await _boundary_burst(algorithm, max_requests, window, burst_seconds)
+        redis = Redis.from_url(redis_url, decode_responses=True) if redis_url else _ClockedRedis()
+        if redis_url:
+            keys = [key async for key in redis.scan_iter("rate_limit:*")]
+            if keys:
+                await redis.delete(*keys)
+        else:
+            redis.now = time.time()
+        rate, round_trips = await _throughput(algorithm, redis, max_requests, window, checks, clients)
+        await redis.close()
+        trips = f"{round_trips:4.2f}" if round_trips is not None else " n/a"
+        print(f"{algorithm:<13} boundary burst {allowed:5d} allowed  "
+              f"{rate:10.0f} checks/s  {trips} round trips/check")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max", type=int, default=100)
+    parser.add_argument("--window", type=int, default=60)
+    parser.add_argument("--burst-seconds", type=float, default=1.0)
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=1_000)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.max, args.window, args.burst_seconds, args.checks, args.clients,
+                     args.redis_url))
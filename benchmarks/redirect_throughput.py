@@ -0,0 +1,74 @@
+"""Redirect requests/sec with eager vs lazily opened DB sessions.
+
+Runs the app in-process over httpx's ASGI transport against in-memory SQLite
+and the test suite's FakeRedis, so the numbers isolate framework, dependency
+injection and session overhead from network latency. Both variants serve the
+same warm process cache; the only difference is whether the route's
+dependency builds an AsyncSession it never uses.
+
+    python -m benchmarks.redirect_throughput [--requests 5000]
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from shortener_app.database import Base
+from shortener_app.infrastructure import ClickBuffer, URLCache
+from shortener_app.main import (
+    app, get_db, get_lazy_url_service, get_session_factory, get_url_service,
+)
+from tests.conftest import FakeRedis
+
+
+async def _measure(client: AsyncClient, url_key: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(f"/{url_key}", follow_redirects=False)
+        assert response.status_code == 307
+    return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    redis = FakeRedis()
+    app.state.redis = redis
+    app.state.click_buffer = ClickBuffer(redis)
+    app.state.url_cache = URLCache(redis)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        created = await client.post("/url", json={"target_url": "https://example.com"})
+        url_key = created.json()["url"].split("/")[-1]
+        await _measure(client, url_key, 100)  # warm the cache and the interpreter
+
+        # "Before": the route resolved Depends(get_url_service) → get_db, which
+        # opens and closes a session on every request regardless of the cache.
+        app.dependency_overrides[get_lazy_url_service] = get_url_service
+        eager = await _measure(client, url_key, requests)
+        del app.dependency_overrides[get_lazy_url_service]
+
+        lazy = await _measure(client, url_key, requests)
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+    print(f"eager session (before): {eager:8.0f} req/s")
+    print(f"lazy session  (after):  {lazy:8.0f} req/s  ({lazy / eager - 1:+.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main(parser.parse_args().requests))
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Optional
 
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
@@ -11,11 +12,74 @@ class Settings(BaseSettings):
     base_url: str = "http://localhost:8000"
     db_url: str = "sqlite+aiosqlite:///./shortener.db"
     redis_url: str = "redis://localhost:6379/0"
+    admin_token: str = ""  # bearer token for /admin/metrics and /admin/leaderboard; empty = both off
+    redis_breaker_enabled: bool = True  # timeouts + circuit breaker on the redirect path's Redis calls
+    redis_call_timeout_ms: int = 250  # per guarded call
+    redis_breaker_failure_threshold: int = 5  # consecutive failures/timeouts that open the breaker
+    redis_breaker_reset_seconds: float = 5.0  # open this long before a trial call
+    redis_socket_timeout: float = 5.0  # seconds; connect/read timeout for every Redis call
     rate_limit_enabled: bool = True
     rate_limit_create: int = 10  # POST requests per minute
     rate_limit_read: int = 100   # GET requests per minute
+    rate_limit_create_algorithm: str = "fixed_window"  # or "gcra": one-script token bucket, no boundary bursts
+    rate_limit_read_algorithm: str = "fixed_window"
+    rate_limit_create_local_quota: int = 0  # requests claimed per Redis call and spent in-process; 0 = off
+    rate_limit_read_local_quota: int = 0  # fixed_window only; see RateLimiter for the error bound
     use_migrations: bool = False  # True for production, False for tests
-    click_flush_interval: int = 30  # seconds between Redis → SQL click flushes
+    click_flush_interval: int = 30  # seconds between Redis → SQL click flushes (adapts, see below)
+    click_flush_min_interval: float = 1.0  # earliest flush after the last one; also the poll period
+    click_flush_max_interval: int = 120  # longest the scheduler may back off to
+    click_flush_cardinality_threshold: int = 50_000  # buffered URLs that trigger an early flush
+    click_flush_slow_seconds: float = 5.0  # flushes slower than this back the interval off
+    click_flush_leader_election: bool = True  # one flusher per deployment, elected via a Redis lease
+    click_flush_lease_ttl_ms: int = 10_000  # capped at 3/4 of the flush interval
+    click_buffer_backend: str = "zset"  # "zset" (sorted-set counters) or "stream" (Redis Stream event log)
+    click_stream_maxlen: int = 1_000_000  # approximate MAXLEN trim for the stream backend
+    click_stream_claim_idle_ms: int = 60_000  # pending entries of a consumer idle this long are taken over
+    click_rollup_enabled: bool = True  # also write per-minute click buckets on flush
+    click_rollup_minute_retention_hours: int = 48  # then folded into hour buckets
+    click_rollup_hour_retention_days: int = 90  # then folded into day buckets
+    click_rollup_compaction_interval: int = 300  # seconds between compaction runs
+    unique_visitors_enabled: bool = True  # per-URL HyperLogLog of client IPs (<= 12 KB each in Redis)
+    unique_visitors_persist_interval: int = 300  # seconds between sketch merges into the DB
+    unique_visitors_ttl: int = 86400  # seconds a persisted sketch stays in Redis without new visitors; 0 = forever
+    click_events_enabled: bool = True  # per-click referrer / user-agent class rows, written in batches
+    click_events_queue_size: int = 10_000  # events waiting per worker; more are dropped and counted
+    click_events_batch_size: int = 500  # rows per multi-row INSERT
+    click_events_max_wait_ms: int = 1000  # longest an event waits for its batch to fill
+    click_events_retention_days: int = 30  # older days are dropped (whole partitions on PostgreSQL)
+    click_buffer_shards: int = 1  # clicks:leaderboard:{n} keys; drain the buffer before changing
+    click_flush_concurrency: int = 4  # shards flushed in parallel, one DB connection each
+    click_leaderboard_size: int = 1000  # URLs kept in top_urls by each flush; caps ?n=, 0 disables
+    click_leaderboard_cache_ttl: float = 5.0  # seconds a computed leaderboard is reused per worker
+    click_flush_chunk_size: int = 1000  # URLs per set-based UPDATE (2 bind params each; PG caps at 32767)
+    click_local_aggregation: bool = False  # batch clicks in-process before sending to Redis
+    click_local_flush_interval_ms: int = 250  # process → Redis flush period
+    click_local_max_entries: int = 1000  # distinct URLs pending before an early flush
+    url_cache_enabled: bool = True
+    url_cache_max_size: int = 10_000  # entries per worker process
+    url_cache_ttl: int = 300  # seconds; bounds staleness if an invalidation is lost
+    redis_url_cache_enabled: bool = False  # shared url:{key} hash tier between workers and SQL
+    redis_url_cache_ttl: int = 3600  # seconds
+    redis_cache_url: Optional[str] = None  # separate allkeys-lru instance for url:{key}; default REDIS_URL
+    bloom_filter_enabled: bool = False  # 404 unknown keys without a SQL lookup
+    bloom_filter_capacity: int = 1_000_000  # expected number of issued keys
+    bloom_filter_error_rate: float = 0.001  # target false-positive rate at capacity
+    bloom_filter_redis_mirror: bool = True  # required with more than one worker process
+    url_batch_max_size: int = 100  # URLs per POST /urls/batch, capped at RATE_LIMIT_CREATE (each URL counts against it)
+    key_length: int = 6  # starting length of generated url keys
+    key_max_length: int = 20  # longest key the length can grow to (url keys are 1-20 characters)
+    key_max_collision_rate: float = 0.01  # grow the key length when this share of attempts would collide
+    key_space_refresh_interval: int = 300  # seconds between occupancy estimates (leader) or syncs (others)
+    key_space_window: int = 1000  # recent create attempts behind the observed collision rate
+    key_generator: str = "random"  # random | feistel (leased counter through a keyed permutation)
+    key_feistel_secret: str = ""  # required for feistel; must never change once keys are issued
+    key_feistel_block_size: int = 1000  # counter values leased per Redis round trip
+    key_pool_enabled: bool = True  # random generator only: take pre-validated keys from a Redis set
+    key_pool_low_water: int = 10_000  # refill when the pool drops below this
+    key_pool_high_water: int = 50_000  # refill up to this many keys
+    key_pool_batch_size: int = 5_000  # keys generated and checked per query
+    key_pool_refill_interval: int = 5  # seconds between pool size checks
 
 
 @lru_cache
@@ -1,5 +1,17 @@
 from shortener_app.infrastructure.redis_client import create_redis_client
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker
+from shortener_app.infrastructure.key_pool import KeyPool
+from shortener_app.infrastructure.key_blocks import FeistelKeyGenerator
+from shortener_app.infrastructure.key_space import KeySpaceMonitor
 from shortener_app.infrastructure.rate_limiter import RateLimiter
+from shortener_app.infrastructure.visitor_sketches import VisitorSketches
 from shortener_app.infrastructure.click_buffer import ClickBuffer
+from shortener_app.infrastructure.click_stream import StreamClickBuffer
+from shortener_app.infrastructure.bloom_filter import BloomFilter
+from shortener_app.infrastructure.singleflight import SingleFlight
+from shortener_app.infrastructure.leader_lease import LeaderLease
+from shortener_app.infrastructure.flush_scheduler import FlushScheduler
+from shortener_app.infrastructure.click_events import ClickEventQueue
+from shortener_app.infrastructure.url_cache import CachedURL, URLCache, RedisURLCache
 
-__all__ = ["create_redis_client", "RateLimiter", "ClickBuffer"]
+__all__ = ["create_redis_client", "RateLimiter", "ClickBuffer", "StreamClickBuffer", "CachedURL", "URLCache", "RedisURLCache", "BloomFilter", "SingleFlight", "LeaderLease", "FlushScheduler", "VisitorSketches", "ClickEventQueue", "CircuitBreaker", "KeyPool", "FeistelKeyGenerator", "KeySpaceMonitor"]
@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import math
+import time
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+
+logger = logging.getLogger(__name__)
+
+_REDIS_KEY_PREFIX = "urls:bloom"
+
+
+class BloomFilter:
+    """Set of every issued url key, answering "definitely not issued" without SQL.
+
+    Sized from (capacity, error_rate) with the standard formulas:
+        bits   m = -n·ln(p) / ln(2)²
+        hashes k = (m / n)·ln(2)
+    Positions come from one blake2b digest split into two 64-bit halves and
+    combined as h1 + i·h2 (Kirsch–Mitzenmacher), so a lookup hashes once.
+
+    The bit array is per process. Keys created by *other* workers are not in it,
+    so with a Redis mirror a local negative is re-checked against the shared
+    bitmap (one pipelined GETBIT round trip — still no SQL) and the bits are
+    learned locally. Without the mirror, a local negative is final, which is only
+    safe in a single-process deployment. That re-check goes through the breaker;
+    if Redis is unavailable the key counts as maybe present, and the lookup
+    continues to the cache tiers and SQL.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        redis: Optional[Redis] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.redis = redis
+        self.breaker = breaker
+        # Parameters are part of the key: a bitmap sized for a different
+        # configuration would silently answer wrong.
+        self.redis_key = f"{_REDIS_KEY_PREFIX}:{self.num_bits}:{self.num_hashes}"
+        self.items = 0
+        self.definite_misses = 0
+        self.redis_checks = 0
+        self.redis_unavailable = 0
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    # Bit i lives at byte i // 8, most significant bit first — the same layout
+    # Redis uses for SETBIT/GETBIT, so the local array can be uploaded as-is.
+    def _set_local(self, positions: list[int]):
+        for pos in positions:
+            self._bits[pos >> 3] |= 0x80 >> (pos & 7)
+
+    def _test_local(self, positions: list[int]) -> bool:
+        return all(self._bits[pos >> 3] & (0x80 >> (pos & 7)) for pos in positions)
+
+    def add_local(self, key: str):
+        self._set_local(self._positions(key))
+        self.items += 1
+
+    async def add(self, key: str):
+        """Set the key's bits locally and in the mirror. Called after the create
+        commits, so it never raises. If the mirror write is skipped, other
+        workers answer "never issued" for this key until a worker's startup
+        rebuild ORs the table into the mirror; this worker still serves it."""
+        positions = self._positions(key)
+        self._set_local(positions)
+        self.items += 1
+        if self.redis is not None:
+            try:
+                await guarded(self.breaker, self._mirror_set, positions)
+            except (RedisUnavailableError, RedisError) as exc:
+                self.redis_unavailable += 1
+                logger.warning("Skipped Bloom mirror write for %s: %r", key, exc)
+
+    async def _mirror_set(self, positions: list[int]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pos in positions:
+                pipe.setbit(self.redis_key, pos, 1)
+            await pipe.execute()
+
+    async def might_contain(self, key: str) -> bool:
+        positions = self._positions(key)
+        if self._test_local(positions):
+            return True
+        if self.redis is not None:
+            self.redis_checks += 1
+            try:
+                bits = await guarded(self.breaker, self._mirror_bits, positions)
+            except RedisUnavailableError:
+                self.redis_unavailable += 1
+                return True
+            if all(bits):
+                self._set_local(positions)  # issued by another worker; learn it
+                return True
+        self.definite_misses += 1
+        return False
+
+    async def _mirror_bits(self, positions: list[int]) -> list[int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for pos in positions:
+                pipe.getbit(self.redis_key, pos)
+            return await pipe.execute()
+
+    async def rebuild(self, db: AsyncSession, batch_size: int = 10_000):
+        """Load every issued key from the urls table. Run once at startup."""
+        started = time.perf_counter()
+        self._bits = bytearray(len(self._bits))
+        self.items = 0
+        result = await db.stream_scalars(
+            select(models.URL.key).execution_options(yield_per=batch_size)
+        )
+        async for key in result:
+            self.add_local(key)
+        if self.redis is not None:
+            # OR into the shared bitmap rather than overwrite it, so bits set by
+            # other workers' creates during our table scan are never lost.
+            staging_key = f"{self.redis_key}:rebuild"
+            await self.redis.set(staging_key, bytes(self._bits))
+            await self.redis.bitop("OR", self.redis_key, self.redis_key, staging_key)
+            await self.redis.delete(staging_key)
+        logger.info(
+            "Bloom filter rebuilt with %d keys in %.2fs (%d bytes, est. FPR %.5f)",
+            self.items, time.perf_counter() - started, len(self._bits),
+            self.estimated_false_positive_rate(),
+        )
+
+    def estimated_false_positive_rate(self) -> float:
+        """(1 - e^(-k·n/m))^k for the current item count; exceeds error_rate
+        once items outgrow capacity."""
+        return (1 - math.exp(-self.num_hashes * self.items / self.num_bits)) ** self.num_hashes
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": self.estimated_false_positive_rate(),
+            "items": self.items,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "memory_bytes": len(self._bits),
+            "redis_mirror": self.redis is not None,
+            "redis_checks": self.redis_checks,
+            "redis_unavailable": self.redis_unavailable,
+            "definite_misses": self.definite_misses,
+        }
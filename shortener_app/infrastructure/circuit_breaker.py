@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean "Redis is slow or unreachable", as opposed to a bug in the
+# command (ResponseError), which is raised as is and doesn't trip the breaker.
+_UNAVAILABLE = (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError, OSError)
+
+
+class RedisUnavailableError(Exception):
+    """A guarded call failed, timed out, or was refused by an open breaker."""
+
+
+class CircuitOpenError(RedisUnavailableError):
+    """The breaker is open: the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Per-call timeout plus circuit breaker for one dependency (Redis).
+
+    Every guarded call gets call_timeout seconds. After failure_threshold
+    consecutive failures or timeouts the breaker opens, and calls fail at once
+    with CircuitOpenError instead of queueing behind a stalled server. After
+    reset_timeout seconds one trial call is let through (half-open). It closes
+    the breaker if it succeeds and reopens it if not.
+
+    Callers catch RedisUnavailableError and fall back (see ClickBuffer and
+    RateLimiter). Without a breaker they call Redis directly, with no timeout.
+    """
+
+    def __init__(
+        self,
+        name: str = "redis",
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        call_timeout: float = 0.25,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._clock = time.monotonic
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are refused outright (open, trial not yet due)."""
+        return self.state == "open" and self._clock() - self._opened_at < self.reset_timeout
+
+    def _allow(self) -> bool:
+        if self.state == "open" and not self.is_open:
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return self.state != "open"
+
+    async def call(self, fn, *args, **kwargs):
+        """await fn(*args, **kwargs) under the timeout and the breaker."""
+        if not self._allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self.calls += 1
+        trial = self.state == "half_open"
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), self.call_timeout)
+        except _UNAVAILABLE as exc:
+            self._record_failure(exc)
+            raise RedisUnavailableError(f"{self.name} call failed: {exc!r}") from exc
+        finally:
+            if trial:
+                self._trial_in_flight = False
+        self._record_success()
+        return result
+
+    def _record_failure(self, exc: BaseException):
+        self.failures += 1
+        if isinstance(exc, (asyncio.TimeoutError, RedisTimeoutError)):
+            self.timeouts += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = "open"
+            self._opened_at = self._clock()
+            self.opened += 1
+            logger.warning(
+                "%s circuit opened after %d consecutive failures (last: %r)",
+                self.name, self.consecutive_failures, exc,
+            )
+
+    def _record_success(self):
+        if self.state != "closed":
+            logger.info("%s circuit closed", self.name)
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": "half_open" if self.state == "open" and not self.is_open else self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
+
+
+async def guarded(breaker, fn, *args, **kwargs):
+    """breaker.call(fn, ...) if there is a breaker, else a plain await."""
+    if breaker is None:
+        return await fn(*args, **kwargs)
+    return await breaker.call(fn, *args, **kwargs)
@@ -1,10 +1,20 @@
+import asyncio
+import heapq
 import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Optional
 
 from redis.asyncio import Redis
-from sqlalchemy import update
+from sqlalchemy import Integer, bindparam, column, delete, select, update, values
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from shortener_app import models
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+from shortener_app.infrastructure.rate_limiter import LIMITER_STEPS
+from shortener_app.infrastructure.visitor_sketches import VisitorSketches
 
 logger = logging.getLogger(__name__)
 
@@ -12,53 +22,553 @@ _LEADERBOARD_KEY = "clicks:leaderboard"
 _FLUSH_KEY = "clicks:leaderboard:flushing"
 
 
+class StaleFlushError(Exception):
+    """Another flusher (with a newer fencing token, or further ahead) owns this drain."""
+
+# Redirect hot path in one round trip: the rate limiter's step (fixed-window
+# INCR/EXPIRE or GCRA, see rate_limiter.LIMITER_STEPS) and, only if the request
+# is within the limit, the click increment. Same semantics as
+# RateLimiter.check_rate_limit followed by increment(), minus the crash gap
+# between INCR and EXPIRE.
+# With visitor tracking it also PFADDs the visitor into the URL's sketch and,
+# if that changed a register, marks the URL dirty for VisitorSketches.persist.
+# KEYS: rate limit key, leaderboard key[, sketch key, dirty-set key].
+# ARGV: window seconds, max requests, url_id, 1 to ZINCRBY here / 0 when the
+#       caller aggregates the click locally instead[, visitor].
+_COUNT_CLICK = """
+if count <= tonumber(ARGV[2]) then
+    if ARGV[4] == '1' then
+        redis.call('ZINCRBY', KEYS[2], 1, ARGV[3])
+    end
+    if ARGV[5] and redis.call('PFADD', KEYS[3], ARGV[5]) == 1 then
+        redis.call('SADD', KEYS[4], ARGV[3])
+    end
+end
+return count
+"""
+_RATE_LIMITED_INCREMENT_SCRIPTS = {
+    algorithm: "local cost = 1\n" + step + _COUNT_CLICK
+    for algorithm, step in LIMITER_STEPS.items()
+}
+_RATE_LIMITED_INCREMENT_SCRIPT = _RATE_LIMITED_INCREMENT_SCRIPTS["fixed_window"]
+
+# End of a drain: drop the flushing key and its batch id, but only if the batch
+# id is still the one this drain applied. A deposed flusher that finishes late
+# must not delete a batch handed off after its own was completed by the successor.
+# KEYS: flushing key, batch-id key. ARGV: batch id.
+_UNLINK_BATCH_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    return redis.call('UNLINK', KEYS[1], KEYS[2])
+end
+return 0
+"""
+
+
+def _shard_keys(shard: int, shards: int) -> tuple[str, str]:
+    """(live key, flushing key) for one shard of the click buffer."""
+    if shards == 1:
+        return _LEADERBOARD_KEY, _FLUSH_KEY
+    # {n} is a Redis Cluster hash tag: a shard's live, flushing and batch-id
+    # keys share one slot, which RENAME and the flush protocol require.
+    live = f"{_LEADERBOARD_KEY}:{{{shard}}}"
+    return live, f"{live}:flushing"
+
+
 class ClickBuffer:
-    def __init__(self, redis: Redis):
+    """Buffers click deltas in Redis sorted sets and periodically flushes them to SQL.
+
+    With shards > 1 the buffer is split into clicks:leaderboard:{n} keys, with
+    url_id % shards choosing the shard, so click traffic spreads over Redis
+    Cluster slots instead of pinning one key to one node. Every url_id lives in
+    exactly one shard, so per-URL reads stay a single ZSCORE and top-N is an
+    exact merge of each shard's top-N. Shards are flushed concurrently, each
+    over its own DB connection. Flush (or drain) before changing the shard
+    count: keys of the old layout are not picked up by the new one.
+
+    With aggregate_locally, increments first land in a per-process dict and are
+    sent to Redis as MULTI/EXEC batches of ZINCRBYs every few hundred
+    milliseconds (flush_local, driven by the lifespan) or as soon as
+    local_max_entries distinct URLs are pending. Redis ops then scale with the
+    number of distinct hot URLs per interval instead of with traffic, at the cost
+    of losing up to one local interval of clicks if the process is killed.
+
+    With a breaker, click writes go through its timeout, and while Redis is
+    unavailable clicks are kept in the process-local dict (fallback_clicks)
+    and sent by flush_local once the breaker closes. Clicks held there are
+    lost if the process dies before Redis comes back.
+
+    Each flush also keeps top_urls, the top top_urls_size URLs by flushed
+    total, up to date (see update_top_urls); 0 turns that off.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        aggregate_locally: bool = False,
+        local_max_entries: int = 1000,
+        flush_chunk_size: int = 1000,
+        shards: int = 1,
+        record_rollups: bool = True,
+        visitors: Optional[VisitorSketches] = None,
+        top_urls_size: int = 1000,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
         self.redis = redis
+        self.breaker = breaker
+        self.record_rollups = record_rollups
+        self.top_urls_size = top_urls_size
+        self.visitors = visitors
+        self.aggregate_locally = aggregate_locally
+        self.local_max_entries = local_max_entries
+        self.flush_chunk_size = flush_chunk_size
+        self.shards = shards
+        self.last_flush: Optional[dict] = None
+        self._rate_limited_scripts: dict = {}
+        self._unlink_batch_script = None
+        self._local: dict[int, int] = {}
+        # Batch currently being sent by flush_local; still counted by get_count
+        # so a concurrent admin read doesn't see the clicks vanish mid-flight.
+        self._sending: dict[int, int] = {}
+        self._local_visitors: dict[int, set[str]] = {}
+        self.local_flushes = 0
+        self.fallback_clicks = 0
+
+    def _live_key(self, url_id: int) -> str:
+        return _shard_keys(int(url_id) % self.shards, self.shards)[0]
+
+    async def increment(self, url_id: int, visitor: Optional[str] = None):
+        if self.aggregate_locally:
+            await self._increment_local(url_id, visitor)
+            return
+        try:
+            await guarded(self.breaker, self._send_click, url_id, visitor)
+        except RedisUnavailableError:
+            self._fall_back(url_id, visitor)
+
+    async def _send_click(self, url_id: int, visitor: Optional[str]):
+        if self.visitors is None or visitor is None:
+            await self.redis.zincrby(self._live_key(url_id), 1, url_id)
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zincrby(self._live_key(url_id), 1, url_id)
+            self.visitors.queue_add(pipe, url_id, [visitor])
+            await pipe.execute()
+
+    def _fall_back(self, url_id: int, visitor: Optional[str] = None):
+        """Keep a click in process while Redis is unavailable; flush_local
+        sends it once the breaker lets calls through again."""
+        self.fallback_clicks += 1
+        self._local[url_id] = self._local.get(url_id, 0) + 1
+        if self.visitors is not None and visitor is not None:
+            self._local_visitors.setdefault(url_id, set()).add(visitor)
+
+    async def _increment_local(self, url_id: int, visitor: Optional[str] = None):
+        self._local[url_id] = self._local.get(url_id, 0) + 1
+        if self.visitors is not None and visitor is not None:
+            self._local_visitors.setdefault(url_id, set()).add(visitor)
+        if len(self._local) >= self.local_max_entries:
+            try:
+                await self.flush_local()
+            except RedisUnavailableError:
+                pass  # deltas were merged back; the flush loop retries
+
+    async def flush_local(self):
+        """Send the process-local deltas to Redis, one transaction per shard."""
+        if not self._local or self._sending:
+            return  # Nothing pending, or a flush is already in flight
+        if self.breaker is not None and self.breaker.is_open:
+            return  # Redis is down; keep the deltas until the breaker's next trial
+        self._sending, self._local = self._local, {}
+        visitors, self._local_visitors = self._local_visitors, {}
+        by_shard: dict[str, dict[int, int]] = {}
+        for url_id, delta in self._sending.items():
+            by_shard.setdefault(self._live_key(url_id), {})[url_id] = delta
+        try:
+            # MULTI/EXEC so a failed shard applies none of its batch; its deltas
+            # are then merged back and retried, with no risk of double counting.
+            # One transaction per shard because MULTI can't span Cluster slots.
+            results = await asyncio.gather(
+                *[
+                    guarded(self.breaker, self._send_local_batch, key, batch, visitors)
+                    for key, batch in by_shard.items()
+                ],
+                return_exceptions=True,
+            )
+            failed = [
+                (batch, result) for batch, result in zip(by_shard.values(), results)
+                if isinstance(result, BaseException)
+            ]
+            for batch, _ in failed:
+                for url_id, delta in batch.items():
+                    self._local[url_id] = self._local.get(url_id, 0) + delta
+                    if url_id in visitors:
+                        self._local_visitors.setdefault(url_id, set()).update(visitors[url_id])
+        finally:
+            self._sending = {}
+        if failed:
+            raise failed[0][1]
+        self.local_flushes += 1
+
+    async def _send_local_batch(self, key: str, batch: dict[int, int], visitors: dict[int, set[str]]):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for url_id, delta in batch.items():
+                pipe.zincrby(key, delta, url_id)
+                if url_id in visitors:
+                    self.visitors.queue_add(pipe, url_id, visitors[url_id])
+            await pipe.execute()
+
+    async def increment_rate_limited(
+        self, url_id: int, rate_key: str, max_requests: int, window_seconds: int,
+        visitor: Optional[str] = None, algorithm: str = "fixed_window",
+    ) -> int:
+        """Count a click only if rate_key is within its limit; return the
+        limiter's request count. The caller decides whether to reject."""
+        if self.shards > 1:
+            # A script's keys must share a Cluster slot, so tag the rate key with
+            # the shard's hash tag. A redirect path always resolves to the same
+            # url_id, so the bucket is still per (ip, path).
+            rate_key = f"{rate_key}:{{{int(url_id) % self.shards}}}"
+        keys = [rate_key, self._live_key(url_id)]
+        args = [window_seconds, max_requests, url_id, 0 if self.aggregate_locally else 1]
+        if self.visitors is not None and visitor is not None:
+            keys.extend(self.visitors.keys(url_id))
+            args.append(visitor)
+        count = int(await guarded(
+            self.breaker, self._rate_limited_script(algorithm), keys=keys, args=args
+        ))
+        if self.aggregate_locally and count <= max_requests:
+            await self._increment_local(url_id)  # the script already PFADDed the visitor
+        return count
 
-    async def increment(self, url_id: int):
-        await self.redis.zincrby(_LEADERBOARD_KEY, 1, url_id)
+    def _rate_limited_script(self, algorithm: str):
+        if algorithm not in self._rate_limited_scripts:
+            self._rate_limited_scripts[algorithm] = self.redis.register_script(
+                _RATE_LIMITED_INCREMENT_SCRIPTS[algorithm]
+            )
+        return self._rate_limited_scripts[algorithm]
 
     async def get_count(self, url_id: int) -> int:
         """Return the buffered (unflushed) click count for a single URL."""
-        score = await self.redis.zscore(_LEADERBOARD_KEY, url_id)
-        return int(score) if score is not None else 0
+        score = await self.redis.zscore(self._live_key(url_id), url_id)
+        local = self._local.get(url_id, 0) + self._sending.get(url_id, 0)
+        return (int(score) if score is not None else 0) + local
+
+    async def get_counts(self, url_ids) -> dict[int, int]:
+        """get_count for many URLs in one pipelined round trip."""
+        url_ids = [int(url_id) for url_id in url_ids]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for url_id in url_ids:
+                pipe.zscore(self._live_key(url_id), url_id)
+            scores = await pipe.execute()
+        return {
+            url_id: (int(score) if score is not None else 0)
+            + self._local.get(url_id, 0) + self._sending.get(url_id, 0)
+            for url_id, score in zip(url_ids, scores)
+        }
+
+    async def pending_urls(self) -> int:
+        """Distinct URLs buffered in Redis across all shards (ZCARD each)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for shard in range(self.shards):
+                pipe.zcard(_shard_keys(shard, self.shards)[0])
+            return sum(await pipe.execute())
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.shards,
+            "aggregate_locally": self.aggregate_locally,
+            "local_pending_urls": len(self._local),
+            "local_pending_clicks": sum(self._local.values()),
+            "local_flushes": self.local_flushes,
+            "fallback_clicks": self.fallback_clicks,
+            "last_flush": self.last_flush,
+        }
 
     async def get_top_n(self, n: int) -> list[tuple[str, float]]:
         """Return (url_id, click_delta) pairs for the N most clicked URLs since last flush."""
-        return await self.redis.zrevrange(_LEADERBOARD_KEY, 0, n - 1, withscores=True)
+        per_shard = await asyncio.gather(*[
+            self.redis.zrevrange(_shard_keys(shard, self.shards)[0], 0, n - 1, withscores=True)
+            for shard in range(self.shards)
+        ])
+        # Each URL lives in one shard, so the global top N is within the union
+        # of the shards' top N.
+        return heapq.nlargest(n, (entry for entries in per_shard for entry in entries),
+                              key=lambda entry: entry[1])
+
+    async def flush_to_db(self, db: AsyncSession, fence: int = 0):
+        """Flush every shard, one after another, over a single session."""
+        started = time.perf_counter()
+        totals = [await self._flush_shard(shard, db, fence) for shard in range(self.shards)]
+        self._record_flush(totals, started)
+
+    async def flush_all(
+        self, session_factory: Callable[[], AsyncSession], concurrency: int = 4, fence: int = 0
+    ):
+        """Flush every shard concurrently, each over its own session/connection.
+
+        A failing shard doesn't stop the others; its keys stay in Redis for the
+        next flush, and the first error is re-raised once all shards are done.
+
+        fence is the flusher's leader-lease fencing token (see LeaderLease).
+        """
+        semaphore = asyncio.Semaphore(concurrency)
 
-    async def flush_to_db(self, db: AsyncSession):
+        async def flush_one(shard: int) -> tuple[int, int]:
+            async with semaphore, session_factory() as db:
+                return await self._flush_shard(shard, db, fence)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[flush_one(shard) for shard in range(self.shards)], return_exceptions=True
+        )
+        self._record_flush([r for r in results if not isinstance(r, BaseException)], started)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def _record_flush(self, totals: list[tuple[int, int]], started: float):
+        urls = sum(u for u, _ in totals)
+        rows = sum(r for _, r in totals)
+        self.last_flush = {"urls": urls, "rows": rows, "seconds": time.perf_counter() - started}
+        if urls:
+            logger.info(
+                "Flushed click counts for %d URLs (%d rows updated) in %.3fs",
+                urls, rows, self.last_flush["seconds"],
+            )
+
+    async def _flush_shard(self, shard: int, db: AsyncSession, fence: int = 0) -> tuple[int, int]:
+        live_key, flush_key = _shard_keys(shard, self.shards)
+        urls = rows = 0
         # Bug fix: if the previous flush crashed after RENAME but before db.commit(),
-        # _FLUSH_KEY is stranded. Without this check, the next RENAME would silently
+        # the flush key is stranded. Without this check, the next RENAME would silently
         # overwrite it, permanently losing the clicks from that crashed batch.
-        if await self.redis.exists(_FLUSH_KEY):
+        if await self.redis.exists(flush_key):
             logger.warning("Found stale flush key — recovering from previous failed flush")
-            await self._drain_to_db(_FLUSH_KEY, db)
+            urls, rows = await self._drain_to_db(flush_key, db, fence)
 
         try:
-            # Atomically hand off the active key so clicks during the flush go to a fresh key.
-            await self.redis.rename(_LEADERBOARD_KEY, _FLUSH_KEY)
+            # Atomically hand off the active key so clicks during the flush go to
+            # a fresh key. NX: if another flusher renamed in the meantime, its
+            # flushing key must not be overwritten; leave it to that flusher.
+            if not await self.redis.renamenx(live_key, flush_key):
+                return urls, rows
         except Exception:
-            return  # Key doesn't exist — nothing buffered since last flush
+            return urls, rows  # Key doesn't exist — nothing buffered since last flush
 
-        await self._drain_to_db(_FLUSH_KEY, db)
+        drained_urls, drained_rows = await self._drain_to_db(flush_key, db, fence)
+        return urls + drained_urls, rows + drained_rows
 
-    async def _drain_to_db(self, key: str, db: AsyncSession):
-        entries = await self.redis.zrange(key, 0, -1, withscores=True)
-        if not entries:
-            await self.redis.delete(key)
-            return
-        for url_id, delta in entries:
-            await db.execute(
-                update(models.URL)
-                .where(models.URL.id == int(url_id))
-                .values(clicks=models.URL.clicks + int(delta))
+    async def _drain_to_db(self, key: str, db: AsyncSession, fence: int = 0) -> tuple[int, int]:
+        """Stream the flushing set into SQL one page at a time.
+
+        Memory and Redis blocking time are bounded by flush_chunk_size instead
+        of by the number of distinct clicked URLs: each page is a ranged ZRANGE
+        (the renamed key is never written again, so rank order is stable).
+
+        Each page commits together with a checkpoint row recording how many
+        entries of this batch are applied. Progress and clicks land in the same
+        transaction, so a crash mid-drain resumes at the first unapplied page —
+        nothing is skipped and nothing is counted twice.
+
+        The checkpoint advance is conditional on the position this drain read
+        and, when fenced, on fence not being older than the token that last
+        advanced it. A second flusher draining the same batch (a deposed leader,
+        or a racing worker) loses its page and aborts with StaleFlushError
+        instead of counting it twice. fence=0 means unfenced (no leader election).
+
+        Returns (URLs drained, rows updated).
+        """
+        batch_key = f"{key}:batch"
+        batch_id = await self.redis.get(batch_key)
+        if batch_id is None:
+            # First drain of this batch. NX so a concurrent recovery can't
+            # replace an id that checkpoints were already written against.
+            # The id starts with the handoff time, which is the minute bucket
+            # this batch's clicks are rolled up into, even if the drain resumes later.
+            await self.redis.set(batch_key, f"{int(time.time())}:{uuid.uuid4().hex}", nx=True)
+            batch_id = await self.redis.get(batch_key)
+
+        checkpoint = await db.get(models.FlushCheckpoint, key)
+        if checkpoint is None or checkpoint.batch_id != batch_id:
+            checkpoint = models.FlushCheckpoint(
+                flush_key=key, batch_id=batch_id, position=0, fence_token=fence
             )
-        await db.commit()
+            checkpoint = await db.merge(checkpoint)
+        elif checkpoint.position:
+            logger.warning("Resuming click drain of %s at entry %d", key, checkpoint.position)
+        position = checkpoint.position
+
+        urls = rows = 0
+        while True:
+            page = await self.redis.zrange(
+                key, position, position + self.flush_chunk_size - 1, withscores=True
+            )
+            if not page:
+                break
+            deltas = [(int(url_id), int(delta)) for url_id, delta in page]
+            rows += await apply_click_deltas(db, deltas, self.flush_chunk_size)
+            if self.record_rollups:
+                bucket = _batch_bucket(batch_id)
+                await upsert_rollups(
+                    db, [(url_id, bucket, delta) for url_id, delta in deltas],
+                    chunk_size=self.flush_chunk_size,
+                )
+            if self.top_urls_size:
+                await update_top_urls(
+                    db, [url_id for url_id, _ in deltas], self.top_urls_size, self.flush_chunk_size
+                )
+            advance = (
+                update(models.FlushCheckpoint)
+                .where(
+                    models.FlushCheckpoint.flush_key == key,
+                    models.FlushCheckpoint.batch_id == batch_id,
+                    models.FlushCheckpoint.position == position,
+                )
+                .values(position=position + len(page), fence_token=fence)
+                .execution_options(synchronize_session=False)
+            )
+            if fence:
+                advance = advance.where(models.FlushCheckpoint.fence_token <= fence)
+            advanced = await db.execute(advance)
+            if advanced.rowcount != 1:
+                await db.rollback()  # discard this page's deltas with it
+                raise StaleFlushError(f"Another flusher advanced {key} past entry {position}")
+            position += len(page)
+            urls += len(page)
+            await db.commit()
+
         # Bug fix: only delete the flush key after a confirmed successful commit.
         # The old `finally: delete` ran even when commit() raised, silently
         # discarding every click in that batch. Now, if commit() raises, the key
         # persists and will be recovered by the stale-key check on the next call.
-        await self.redis.delete(key)
-        logger.info("Flushed click counts for %d URLs", len(entries))
+        # Flush key and batch id go in one UNLINK: deleting either alone would let
+        # a crash pair a checkpoint with the wrong batch. UNLINK frees a large
+        # set in the background instead of blocking Redis like DEL. The script
+        # only unlinks if batch_key still names this batch.
+        if self.top_urls_size:
+            await trim_top_urls(db, self.top_urls_size)
+        await db.commit()
+        if self._unlink_batch_script is None:
+            self._unlink_batch_script = self.redis.register_script(_UNLINK_BATCH_SCRIPT)
+        if not await self._unlink_batch_script(keys=[key, batch_key], args=[batch_id]):
+            logger.warning("Click batch %s on %s was replaced; left it to its flusher", batch_id, key)
+        return urls, rows
+
+
+async def apply_click_deltas(
+    db: AsyncSession, deltas: list[tuple[int, int]], chunk_size: int = 1000
+) -> int:
+    """Add each (url_id, delta) to urls.clicks with one statement per chunk.
+
+    The old drain ran one UPDATE per URL, so a flush covering 200k URLs meant
+    200k statements. PostgreSQL gets a single set-based UPDATE ... FROM (VALUES
+    ...) per chunk; SQLite, which can't alias VALUES columns, gets one
+    executemany per chunk. Returns the number of rows updated; it is lower than
+    len(deltas) when a URL was hard-deleted after being clicked.
+    """
+    urls = models.URL.__table__
+    postgres = db.get_bind().dialect.name == "postgresql"
+    rows = 0
+    for start in range(0, len(deltas), chunk_size):
+        chunk = deltas[start:start + chunk_size]
+        if postgres:
+            batch = values(
+                column("id", Integer), column("delta", Integer), name="deltas"
+            ).data(chunk)
+            result = await db.execute(
+                urls.update()
+                .where(urls.c.id == batch.c.id)
+                .values(clicks=urls.c.clicks + batch.c.delta)
+            )
+        else:
+            result = await db.execute(
+                urls.update()
+                .where(urls.c.id == bindparam("url_id"))
+                .values(clicks=urls.c.clicks + bindparam("delta")),
+                [{"url_id": url_id, "delta": delta} for url_id, delta in chunk],
+            )
+        rows += result.rowcount
+    return rows
+
+
+def _batch_bucket(batch_id: str) -> datetime:
+    """Minute (naive UTC) a sorted-set batch was handed off, from its batch id."""
+    stamp = batch_id.partition(":")[0]
+    handed_off = (
+        datetime.fromtimestamp(int(stamp), timezone.utc) if stamp.isdigit()
+        else datetime.now(timezone.utc)  # batch started before ids carried a time
+    )
+    return handed_off.replace(tzinfo=None, second=0, microsecond=0)
+
+
+async def upsert_rollups(
+    db: AsyncSession,
+    rows: list[tuple[int, datetime, int]],
+    resolution: str = "minute",
+    chunk_size: int = 1000,
+):
+    """Add each (url_id, bucket_start, clicks) to click_rollups, inserting
+    missing buckets: INSERT ... ON CONFLICT DO UPDATE SET clicks = clicks + new.
+
+    Called in the same transaction as apply_click_deltas, so the rollup and
+    urls.clicks move together and inherit the drain's exactly-once guarantees.
+    """
+    rollups = models.ClickRollup.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        stmt = dialect.insert(rollups)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[rollups.c.url_id, rollups.c.resolution, rollups.c.bucket_start],
+                set_={"clicks": rollups.c.clicks + stmt.excluded.clicks},
+            ),
+            [
+                {"url_id": url_id, "resolution": resolution, "bucket_start": bucket, "clicks": clicks}
+                for url_id, bucket, clicks in chunk
+            ],
+        )
+
+
+async def update_top_urls(db: AsyncSession, url_ids: list[int], size: int, chunk_size: int = 1000):
+    """Copy the new urls.clicks of url_ids into top_urls where they make its top `size`.
+
+    Called after apply_click_deltas, in the same transaction. Totals only grow,
+    so a URL can only enter the top K when it is clicked, that is, when it is
+    in a flushed page. Checking just those URLs against the current K-th total
+    keeps top_urls an exact top K without ever sorting urls. The lookups are
+    primary-key IN lists. The table can exceed K rows until trim_top_urls runs.
+    """
+    top_urls, urls = models.TopURL.__table__, models.URL.__table__
+    threshold = await db.scalar(
+        select(top_urls.c.clicks).order_by(top_urls.c.clicks.desc()).offset(size - 1).limit(1)
+    )
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for start in range(0, len(url_ids), chunk_size):
+        query = select(urls.c.id, urls.c.clicks).where(
+            urls.c.id.in_(url_ids[start:start + chunk_size]), urls.c.clicks > 0
+        )
+        if threshold is not None:
+            query = query.where(urls.c.clicks >= threshold)
+        entered = (await db.execute(query)).all()
+        if not entered:
+            continue
+        stmt = dialect.insert(top_urls)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[top_urls.c.url_id], set_={"clicks": stmt.excluded.clicks}
+            ),
+            [{"url_id": url_id, "clicks": clicks} for url_id, clicks in entered],
+        )
+
+
+async def trim_top_urls(db: AsyncSession, size: int):
+    """Delete the top_urls rows that fell out of the top `size`.
+
+    Safe alongside concurrent flushes: a row in the top K of all rows is in the
+    top K of any snapshot that contains it, so a trim never drops a row that
+    belongs; at worst it leaves a few extra for the next one.
+    """
+    top_urls = models.TopURL.__table__
+    keep = select(top_urls.c.url_id).order_by(top_urls.c.clicks.desc()).limit(size)
+    await db.execute(delete(top_urls).where(top_urls.c.url_id.not_in(keep.scalar_subquery())))
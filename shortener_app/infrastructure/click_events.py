@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import re
+import secrets
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+
+logger = logging.getLogger(__name__)
+
+_MAX_REFERRER_LENGTH = 1024
+_PARTITION_PREFIX = "click_events_"
+
+_BOT_RE = re.compile(r"bot|crawl|spider|slurp|preview|fetch|curl|wget|python|http", re.I)
+_TABLET_RE = re.compile(r"ipad|tablet|kindle|silk|playbook|android(?!.*mobile)", re.I)
+_MOBILE_RE = re.compile(r"mobi|iphone|ipod|android|blackberry|opera mini|windows phone", re.I)
+
+
+def classify_user_agent(user_agent: Optional[str]) -> str:
+    """Coarse device class of a User-Agent: bot, tablet, mobile, desktop or unknown."""
+    if not user_agent:
+        return "unknown"
+    if _BOT_RE.search(user_agent):
+        return "bot"
+    if _TABLET_RE.search(user_agent):
+        return "tablet"
+    if _MOBILE_RE.search(user_agent):
+        return "mobile"
+    return "desktop"
+
+
+class ClickEventQueue:
+    """Per-click analytics events, recorded off the redirect path.
+
+    The redirect handler calls offer(), which timestamps the raw request fields
+    and put_nowait()s them on a bounded asyncio queue. It never waits: when the
+    queue is full the event is dropped and counted, so a slow database costs
+    analytics rows, not redirect latency.
+
+    run() is the worker. It takes up to batch_size events, waiting at most
+    max_wait seconds for a batch to fill once the first event arrives,
+    classifies user agents, and writes the batch as one multi-row INSERT into
+    click_events. A failed batch is logged and dropped (counted as failed), so
+    a broken database can't wedge the queue.
+
+    Events are best effort: whatever is still queued at shutdown is written by
+    drain(); a killed process loses its queue.
+    """
+
+    def __init__(self, maxsize: int = 10_000, batch_size: int = 500, max_wait: float = 1.0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # Batch taken off the queue but not yet committed; drain() retries it.
+        self._batch: list[tuple] = []
+        self.enqueued = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.max_batch_seconds = 0.0
+
+    def offer(self, url_id: int, referrer: Optional[str], user_agent: Optional[str]) -> bool:
+        """Queue a click event without blocking. Returns False if it was dropped."""
+        event = (datetime.now(timezone.utc).replace(tzinfo=None), url_id, referrer, user_agent)
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def run(self, session_factory: Callable[[], AsyncSession]):
+        while True:
+            self._batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(self._batch) < self.batch_size:
+                try:
+                    self._batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(session_factory, self._batch)
+            self._batch = []
+
+    async def drain(self, session_factory: Callable[[], AsyncSession]):
+        """Write the interrupted batch and everything still queued (shutdown)."""
+        pending, self._batch = self._batch, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._write(session_factory, pending[start:start + self.batch_size])
+
+    async def _write(self, session_factory: Callable[[], AsyncSession], batch: list[tuple]):
+        started = time.perf_counter()
+        rows = [
+            {
+                # The day-partitioned table needs occurred_at in the key, so the
+                # id can't be a serial column; 63 random bits never collide in a day.
+                "id": secrets.randbits(63),
+                "occurred_at": occurred_at,
+                "url_id": url_id,
+                "referrer": referrer[:_MAX_REFERRER_LENGTH] if referrer else None,
+                "user_agent_class": classify_user_agent(user_agent),
+            }
+            for occurred_at, url_id, referrer, user_agent in batch
+        ]
+        try:
+            async with session_factory() as db:
+                await db.execute(insert(models.ClickEvent.__table__).values(rows))
+                await db.commit()
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Dropped a batch of %d click events", len(batch))
+            return
+        seconds = time.perf_counter() - started
+        self.inserted += len(batch)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_seconds = seconds
+        self.max_batch_seconds = max(self.max_batch_seconds, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_seconds": self.last_batch_seconds,
+            "max_batch_seconds": self.max_batch_seconds,
+        }
+
+
+async def rotate_click_events(db: AsyncSession, today: date, retention_days: int) -> int:
+    """Keep click_events to retention_days days. Returns days (or rows) removed.
+
+    On PostgreSQL click_events is partitioned by day: this creates today's and
+    tomorrow's partitions (plus a DEFAULT one so an insert never fails for
+    lack of a partition) and drops whole partitions older than the retention,
+    which is instant and leaves nothing to vacuum. Other databases delete the
+    expired rows.
+    """
+    cutoff = datetime.combine(today - timedelta(days=retention_days), datetime.min.time())
+    removed = 0
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_PARTITION_PREFIX}default "
+            f"PARTITION OF click_events DEFAULT"
+        ))
+        for day in (today, today + timedelta(days=1)):
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {_PARTITION_PREFIX}{day:%Y%m%d} "
+                f"PARTITION OF click_events FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            ))
+        partitions = await db.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = 'click_events'"
+        ))
+        for (name,) in partitions.all():
+            suffix = name.removeprefix(_PARTITION_PREFIX)
+            if suffix.isdigit() and datetime.strptime(suffix, "%Y%m%d") < cutoff:
+                await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                removed += 1
+    # Everything else: SQLite, or rows that landed in the DEFAULT partition
+    result = await db.execute(
+        delete(models.ClickEvent).where(models.ClickEvent.occurred_at < cutoff)
+    )
+    await db.commit()
+    return removed + result.rowcount
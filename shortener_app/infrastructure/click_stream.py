@@ -0,0 +1,328 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import (
+    ClickBuffer,
+    apply_click_deltas,
+    trim_top_urls,
+    update_top_urls,
+    upsert_rollups,
+)
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, guarded
+from shortener_app.infrastructure.rate_limiter import LIMITER_STEPS
+from shortener_app.infrastructure.visitor_sketches import VisitorSketches
+
+logger = logging.getLogger(__name__)
+
+_STREAM_KEY = "clicks:stream"
+_GROUP = "click-flushers"
+
+# Same as click_buffer._RATE_LIMITED_INCREMENT_SCRIPTS, with XADD in place of
+# ZINCRBY. KEYS: rate limit key, stream key[, sketch key, dirty-set key].
+# ARGV: window seconds, max requests, url_id, 1 to XADD here / 0 when
+# aggregating locally, MAXLEN[, visitor].
+_XADD_CLICK = """
+if count <= tonumber(ARGV[2]) then
+    if ARGV[4] == '1' then
+        redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*', 'u', ARGV[3])
+    end
+    if ARGV[6] and redis.call('PFADD', KEYS[3], ARGV[6]) == 1 then
+        redis.call('SADD', KEYS[4], ARGV[3])
+    end
+end
+return count
+"""
+_RATE_LIMITED_XADD_SCRIPTS = {
+    algorithm: "local cost = 1\n" + step + _XADD_CLICK
+    for algorithm, step in LIMITER_STEPS.items()
+}
+_RATE_LIMITED_XADD_SCRIPT = _RATE_LIMITED_XADD_SCRIPTS["fixed_window"]
+
+
+class StreamClickBuffer(ClickBuffer):
+    """Click buffer backed by a Redis Stream consumed through a consumer group.
+
+    Each click is one compact entry, {u: url_id}; locally aggregated clicks are
+    sent as {u: url_id, n: delta}. XADD trims with MAXLEN ~ maxlen, which bounds
+    memory but drops the oldest entries, consumed or not, if the flushers fall
+    that far behind (counted as "trimmed" once noticed).
+
+    Every worker may consume: the group hands each entry to exactly one
+    consumer, so there is no RENAME handoff and no leader is needed. A
+    consumer's flush reads a batch, sums it per URL, applies it with
+    apply_click_deltas, commits, then XACKs. Entries a dead consumer had read
+    but not acked stay pending; after claim_idle_ms another consumer XCLAIMs
+    them and finishes the batch.
+
+    Exactly-once across a crash between commit and XACK: each batch commits
+    together with a checkpoint row (flush key "clicks:stream:<consumer>")
+    holding the batch's last entry id. A consumer holds at most one batch at a
+    time, so if a pending batch (its own, or one claimed from a dead consumer)
+    ends at its holder's checkpoint id, it was already applied and is only
+    acked.
+
+    The trade-off against the sorted-set backend: buffered clicks are an event
+    log, not per-URL counters, so get_count and get_top_n only see this
+    process's not-yet-sent local deltas (get_counts likewise); admin counts catch
+    up at the next flush.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        aggregate_locally: bool = False,
+        local_max_entries: int = 1000,
+        flush_chunk_size: int = 1000,
+        maxlen: int = 1_000_000,
+        claim_idle_ms: int = 60_000,
+        consumer: Optional[str] = None,
+        record_rollups: bool = True,
+        visitors: Optional[VisitorSketches] = None,
+        top_urls_size: int = 1000,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        super().__init__(
+            redis,
+            aggregate_locally=aggregate_locally,
+            local_max_entries=local_max_entries,
+            flush_chunk_size=flush_chunk_size,
+            record_rollups=record_rollups,
+            visitors=visitors,
+            top_urls_size=top_urls_size,
+            breaker=breaker,
+        )
+        self.maxlen = maxlen
+        self.claim_idle_ms = claim_idle_ms
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._group_ready = False
+        self.claimed = 0
+        self.trimmed = 0
+        self.replayed_batches = 0
+
+    def _live_key(self, url_id: int) -> str:
+        return _STREAM_KEY
+
+    @staticmethod
+    def _checkpoint_key(consumer: str) -> str:
+        return f"{_STREAM_KEY}:{consumer}"
+
+    async def _send_click(self, url_id: int, visitor: Optional[str]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(_STREAM_KEY, {"u": url_id}, maxlen=self.maxlen, approximate=True)
+            if self.visitors is not None and visitor is not None:
+                self.visitors.queue_add(pipe, url_id, [visitor])
+            await pipe.execute()
+
+    async def _send_local_batch(self, key: str, batch: dict[int, int], visitors: dict[int, set[str]]):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for url_id, delta in batch.items():
+                pipe.xadd(key, {"u": url_id, "n": delta}, maxlen=self.maxlen, approximate=True)
+                if url_id in visitors:
+                    self.visitors.queue_add(pipe, url_id, visitors[url_id])
+            await pipe.execute()
+
+    async def increment_rate_limited(
+        self, url_id: int, rate_key: str, max_requests: int, window_seconds: int,
+        visitor: Optional[str] = None, algorithm: str = "fixed_window",
+    ) -> int:
+        keys = [rate_key, _STREAM_KEY]
+        args = [window_seconds, max_requests, url_id, 0 if self.aggregate_locally else 1, self.maxlen]
+        if self.visitors is not None and visitor is not None:
+            keys.extend(self.visitors.keys(url_id))
+            args.append(visitor)
+        count = int(await guarded(
+            self.breaker, self._rate_limited_script(algorithm), keys=keys, args=args
+        ))
+        if self.aggregate_locally and count <= max_requests:
+            await self._increment_local(url_id)
+        return count
+
+    def _rate_limited_script(self, algorithm: str):
+        if algorithm not in self._rate_limited_scripts:
+            self._rate_limited_scripts[algorithm] = self.redis.register_script(
+                _RATE_LIMITED_XADD_SCRIPTS[algorithm]
+            )
+        return self._rate_limited_scripts[algorithm]
+
+    async def get_count(self, url_id: int) -> int:
+        return self._local.get(url_id, 0) + self._sending.get(url_id, 0)
+
+    async def get_counts(self, url_ids) -> dict[int, int]:
+        return {int(url_id): await self.get_count(int(url_id)) for url_id in url_ids}
+
+    async def get_top_n(self, n: int) -> list[tuple[str, float]]:
+        pending = Counter(self._local) + Counter(self._sending)
+        return [(str(url_id), float(delta)) for url_id, delta in pending.most_common(n)]
+
+    async def pending_urls(self) -> int:
+        """Entries not yet delivered to any consumer (the group's lag)."""
+        await self._ensure_group()
+        for group in await self.redis.xinfo_groups(_STREAM_KEY):
+            if group["name"] == _GROUP:
+                return int(group.get("lag") or 0)
+        return 0
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "backend": "stream",
+            "consumer": self.consumer,
+            "maxlen": self.maxlen,
+            "claimed": self.claimed,
+            "trimmed": self.trimmed,
+            "replayed_batches": self.replayed_batches,
+        }
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(_STREAM_KEY, _GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_ready = True
+
+    async def flush_all(
+        self, session_factory: Callable[[], AsyncSession], concurrency: int = 4, fence: int = 0
+    ):
+        """One consumer per process; the group spreads work across processes."""
+        async with session_factory() as db:
+            await self.flush_to_db(db, fence)
+
+    async def flush_to_db(self, db: AsyncSession, fence: int = 0):
+        """Finish this consumer's pending batch, take over dead consumers'
+        batches, then consume new entries until the stream is drained."""
+        await self._ensure_group()
+        started = time.perf_counter()
+        totals = []
+
+        own = await self.redis.xreadgroup(
+            _GROUP, self.consumer, {_STREAM_KEY: "0"}, count=self.flush_chunk_size
+        )
+        if _entries(own):
+            totals.append(await self._apply_batch(db, _entries(own), fence))
+
+        for dead_consumer, pending in await self._idle_consumers():
+            ids = [
+                entry["message_id"] for entry in await self.redis.xpending_range(
+                    _STREAM_KEY, _GROUP, min="-", max="+", count=pending,
+                    consumername=dead_consumer,
+                )
+            ]
+            entries = await self.redis.xclaim(
+                _STREAM_KEY, _GROUP, self.consumer, self.claim_idle_ms, ids
+            ) if ids else []
+            # Redis 7 drops trimmed entries from the PEL on XCLAIM instead of
+            # returning them
+            self.trimmed += len(ids) - len(entries)
+            if entries:
+                self.claimed += len(entries)
+                logger.warning(
+                    "Claimed %d click entries from idle consumer %s", len(entries), dead_consumer
+                )
+                totals.append(await self._apply_batch(db, entries, fence, dead_consumer))
+            # Its pending list is now empty; forget the consumer and its checkpoint
+            await db.execute(delete(models.FlushCheckpoint).where(
+                models.FlushCheckpoint.flush_key == self._checkpoint_key(dead_consumer)
+            ))
+            await db.commit()
+            await self.redis.xgroup_delconsumer(_STREAM_KEY, _GROUP, dead_consumer)
+
+        while True:
+            entries = _entries(await self.redis.xreadgroup(
+                _GROUP, self.consumer, {_STREAM_KEY: ">"}, count=self.flush_chunk_size
+            ))
+            if not entries:
+                break
+            totals.append(await self._apply_batch(db, entries, fence))
+
+        self._record_flush(totals, started)
+
+    async def _idle_consumers(self) -> list[tuple[str, int]]:
+        """(name, pending count) of other consumers that hold unacked entries
+        and haven't been seen for claim_idle_ms."""
+        return [
+            (consumer["name"], int(consumer["pending"]))
+            for consumer in await self.redis.xinfo_consumers(_STREAM_KEY, _GROUP)
+            if consumer["name"] != self.consumer and int(consumer["pending"])
+            and int(consumer["idle"]) >= self.claim_idle_ms
+        ]
+
+    async def _apply_batch(
+        self, db: AsyncSession, entries: list, fence: int, previous_owner: Optional[str] = None
+    ) -> tuple[int, int]:
+        ids = [entry_id for entry_id, _ in entries]
+        last_id = ids[-1]
+        for owner in filter(None, (previous_owner, self.consumer)):
+            checkpoint = await db.get(models.FlushCheckpoint, self._checkpoint_key(owner))
+            if checkpoint is not None and checkpoint.batch_id == last_id:
+                # Committed before the owner crashed (or before our XACK failed).
+                # Adopt the checkpoint first: the batch is in our pending list
+                # now, and a failed XACK below must not make us re-apply it.
+                self.replayed_batches += 1
+                if owner != self.consumer:
+                    await db.merge(models.FlushCheckpoint(
+                        flush_key=self._checkpoint_key(self.consumer),
+                        batch_id=last_id,
+                        position=len(ids),
+                        fence_token=fence,
+                    ))
+                    await db.commit()
+                await self.redis.xack(_STREAM_KEY, _GROUP, *ids)
+                return 0, 0
+
+        deltas: Counter[int] = Counter()
+        buckets: Counter[tuple[int, datetime]] = Counter()
+        for entry_id, fields in entries:
+            if not fields:
+                self.trimmed += 1  # delivered, then trimmed by MAXLEN before we read it
+                continue
+            url_id, clicks = int(fields["u"]), int(fields.get("n", 1))
+            deltas[url_id] += clicks
+            buckets[url_id, _entry_minute(entry_id)] += clicks
+        rows = await apply_click_deltas(db, sorted(deltas.items()), self.flush_chunk_size)
+        if self.record_rollups:
+            await upsert_rollups(
+                db, [(url_id, bucket, clicks) for (url_id, bucket), clicks in buckets.items()],
+                chunk_size=self.flush_chunk_size,
+            )
+        if self.top_urls_size:
+            await update_top_urls(db, sorted(deltas), self.top_urls_size, self.flush_chunk_size)
+            await trim_top_urls(db, self.top_urls_size)
+        await db.merge(models.FlushCheckpoint(
+            flush_key=self._checkpoint_key(self.consumer),
+            batch_id=last_id,
+            position=len(ids),
+            fence_token=fence,
+        ))
+        await db.commit()
+        await self.redis.xack(_STREAM_KEY, _GROUP, *ids)
+        return len(deltas), rows
+
+
+def _entry_minute(entry_id: str) -> datetime:
+    """Stream ids start with the XADD time in ms, so events bucket by click time."""
+    millis = int(entry_id.partition("-")[0])
+    return datetime.fromtimestamp(millis // 60_000 * 60, timezone.utc).replace(tzinfo=None)
+
+
+def _entries(response) -> list:
+    """Entries of the one stream in an XREADGROUP reply (RESP2 list or RESP3 dict)."""
+    if not response:
+        return []
+    if isinstance(response, dict):
+        return next(iter(response.values()))[0]
+    return response[0][1]
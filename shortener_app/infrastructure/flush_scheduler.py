@@ -0,0 +1,114 @@
+import logging
+import time
+from typing import Callable, Optional
+
+from shortener_app.infrastructure.click_buffer import ClickBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class FlushScheduler:
+    """Decides when the click flush loop should flush, instead of a fixed sleep.
+
+    The loop polls every min_interval seconds, and due() answers with a reason
+    or None:
+      - "threshold": at least min_interval since the last flush and the
+        buffer's cardinality (ZCARD over all shards) has reached
+        cardinality_threshold. Spikes flush early in moderate batches instead
+        of one huge batch at the end of the interval.
+      - "interval": the current interval has elapsed.
+    While the database is busy (db_busy() is true) flushes are deferred, but
+    never beyond max_interval.
+
+    After each flush the interval adapts within [base_interval, max_interval].
+    It doubles when the flush was slow (over slow_flush_seconds), failed, or
+    found nothing to do, so a struggling DB gets fewer, larger batches and an
+    idle deployment wakes up less often. Otherwise it halves back toward
+    base_interval. The threshold trigger stays off while backing off; under
+    pressure more frequent flushes are the wrong response.
+    """
+
+    def __init__(
+        self,
+        click_buffer: ClickBuffer,
+        base_interval: float = 30,
+        min_interval: float = 1,
+        max_interval: float = 120,
+        cardinality_threshold: int = 50_000,
+        slow_flush_seconds: float = 5.0,
+        db_busy: Optional[Callable[[], bool]] = None,
+    ):
+        self.click_buffer = click_buffer
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cardinality_threshold = cardinality_threshold
+        self.slow_flush_seconds = slow_flush_seconds
+        self.db_busy = db_busy
+        self.interval = base_interval
+        self.backing_off = False
+        self.last_pending = 0
+        self._last_flush_at = time.monotonic()
+        self.decisions = {"threshold": 0, "interval": 0, "deferred_db_busy": 0}
+        self.adjustments = {"slow": 0, "failed": 0, "idle": 0, "recovered": 0}
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self._last_flush_at
+
+    async def due(self) -> Optional[str]:
+        """Return why a flush should run now, or None to keep waiting."""
+        elapsed = self._elapsed()
+        if elapsed < self.min_interval:
+            return None
+        if self.db_busy is not None and elapsed < self.max_interval and self.db_busy():
+            self.decisions["deferred_db_busy"] += 1
+            return None
+        if elapsed >= self.interval:
+            reason = "interval"
+        else:
+            if self.backing_off:
+                return None
+            self.last_pending = await self.click_buffer.pending_urls()
+            if self.last_pending < self.cardinality_threshold:
+                return None
+            reason = "threshold"
+        self.decisions[reason] += 1
+        return reason
+
+    def record(self, seconds: float, urls: int, failed: bool = False):
+        """Adapt the interval to how the flush just went."""
+        self._last_flush_at = time.monotonic()
+        if failed:
+            cause = "failed"
+        elif seconds > self.slow_flush_seconds:
+            cause = "slow"
+        elif urls == 0:
+            cause = "idle"
+        else:
+            cause = None
+        if cause is not None:
+            self.interval = min(self.max_interval, self.interval * 2)
+            self.backing_off = cause != "idle"
+            self.adjustments[cause] += 1
+            if cause == "slow":
+                logger.warning(
+                    "Click flush took %.1fs; backing off to %.0fs", seconds, self.interval
+                )
+        elif self.interval > self.base_interval or self.backing_off:
+            self.interval = max(self.base_interval, self.interval / 2)
+            self.backing_off = False
+            self.adjustments["recovered"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "base_interval": self.base_interval,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "cardinality_threshold": self.cardinality_threshold,
+            "last_pending_urls": self.last_pending,
+            "seconds_since_flush": self._elapsed(),
+            "backing_off": self.backing_off,
+            "decisions": dict(self.decisions),
+            "adjustments": dict(self.adjustments),
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+from shortener_app.keygen import FeistelPermutation
+
+logger = logging.getLogger(__name__)
+
+_COUNTER_KEY_PREFIX = "urls:key_counter"
+
+
+class FeistelKeyGenerator:
+    """Keys that are unique by construction: a leased counter through a
+    keyed Feistel permutation of the 36**size key space.
+
+    Each worker leases block_size counter values at a time with one INCRBY
+    on urls:key_counter:{size}, so workers never share a value and a create
+    costs no Redis round trip until the block runs out. Each value goes
+    through FeistelPermutation, a bijection, so distinct values give
+    distinct keys, and consecutive values give unrelated-looking keys.
+    Values left in a block when the process exits are skipped, never reused.
+
+    The counter is the only state: it must survive Redis restarts (AOF or
+    RDB), or keys are handed out again and every create collides until it
+    passes them. The secret must never change either, since a different
+    permutation reissues old keys in a new order. Keys issued before the
+    switch by the random generator can still collide; create() skips to the
+    next value when that happens.
+
+    When the key space at this size is used up, the generator moves to the
+    next size (a new permutation and counter) up to max_size. next_key()
+    returns None when Redis is unavailable or max_size is used up too;
+    create() then falls back to random keys.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        secret: bytes,
+        size: int = 6,
+        block_size: int = 1000,
+        breaker: Optional[CircuitBreaker] = None,
+        max_size: Optional[int] = None,
+    ):
+        self.redis = redis
+        self.secret = secret
+        self.block_size = block_size
+        self.breaker = breaker
+        self.max_size = max_size if max_size is not None else size
+        self._use_size(size)
+        self._lease_lock = asyncio.Lock()
+        self.issued = 0
+        self.blocks = 0
+        self.exhausted = False
+
+    def _use_size(self, size: int):
+        self.size = size
+        self.permutation = FeistelPermutation(self.secret, size)
+        self.counter_key = f"{_COUNTER_KEY_PREFIX}:{size}"
+        self._next = self._end = 0
+
+    async def _lease_block(self):
+        end = int(await guarded(self.breaker, self.redis.incrby, self.counter_key, self.block_size))
+        self._next, self._end = end - self.block_size, min(end, self.permutation.domain)
+        self.blocks += 1
+
+    async def next_key(self) -> Optional[str]:
+        if self._next >= self._end:
+            async with self._lease_lock:
+                # Another create may have leased a block while we waited
+                if self._next >= self._end:
+                    while not self.exhausted:
+                        try:
+                            await self._lease_block()
+                        except RedisUnavailableError:
+                            return None
+                        if self._next < self._end:
+                            break
+                        if self.size >= self.max_size:
+                            self.exhausted = True
+                            logger.error("%d-character key space is exhausted", self.size)
+                        else:
+                            logger.warning("%d-character key space is used up; "
+                                           "moving to %d", self.size, self.size + 1)
+                            self._use_size(self.size + 1)
+                    if self.exhausted:
+                        return None
+        value, self._next = self._next, self._next + 1
+        self.issued += 1
+        return self.permutation.key(value)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "issued": self.issued,
+            "blocks": self.blocks,
+            "block_remaining": max(0, self._end - self._next),
+            "exhausted": self.exhausted,
+        }
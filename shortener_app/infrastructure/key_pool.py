@@ -0,0 +1,112 @@
+import logging
+from typing import Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import keygen, models
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+
+logger = logging.getLogger(__name__)
+
+_POOL_KEY = "urls:key_pool"
+
+
+class KeyPool:
+    """Redis set of pre-validated, unused url keys that create() SPOPs from.
+
+    As the urls table fills, random keys collide more often and create() pays
+    for each collision with a rollback and a backoff sleep. The pool moves that
+    work off the request path: refill() generates keys in bulk, drops the ones
+    already in urls with one IN query per batch, and SADDs the rest. SPOP is
+    atomic, so no two creates are handed the same key, and SADD dedupes keys
+    generated twice (by this worker or another).
+
+    A pooled key can still collide if the random fallback path inserted the
+    same key after it was validated; the unique constraint catches that and
+    create() retries as before. An empty pool, or Redis being unavailable,
+    also falls back to random keys, so the pool only ever saves latency.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        key_size: int = 6,
+        low_water: int = 10_000,
+        high_water: int = 50_000,
+        batch_size: int = 5_000,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.redis = redis
+        self.key_size = key_size
+        self.low_water = low_water
+        self.high_water = high_water
+        self.batch_size = batch_size
+        self.breaker = breaker
+        self.taken = 0
+        self.empty = 0
+        self.generated = 0
+        self.rejected = 0
+        self.refills = 0
+
+    async def take(self) -> Optional[str]:
+        """Pop an unused key, or None if the pool is empty or unreachable."""
+        try:
+            key = await guarded(self.breaker, self.redis.spop, _POOL_KEY)
+        except RedisUnavailableError:
+            key = None
+        if key is None:
+            self.empty += 1
+            return None
+        self.taken += 1
+        return key.decode() if isinstance(key, bytes) else key
+
+    async def take_many(self, count: int) -> list[str]:
+        """Pop up to count unused keys in one SPOP; fewer if the pool runs low."""
+        try:
+            keys = await guarded(self.breaker, self.redis.spop, _POOL_KEY, count)
+        except RedisUnavailableError:
+            keys = None
+        keys = [key.decode() if isinstance(key, bytes) else key for key in keys or ()]
+        self.taken += len(keys)
+        if len(keys) < count:
+            self.empty += 1
+        return keys
+
+    async def size(self) -> int:
+        return await self.redis.scard(_POOL_KEY)
+
+    async def refill(self, db: AsyncSession) -> int:
+        """Top the pool up to high_water if it is below low_water. Returns keys added."""
+        size = await self.size()
+        if size >= self.low_water:
+            return 0
+        added = 0
+        while size + added < self.high_water:
+            batch = set(keygen.generate_keys(
+                min(self.batch_size, self.high_water - size - added), self.key_size
+            ))
+            result = await db.execute(select(models.URL.key).where(models.URL.key.in_(batch)))
+            taken = set(result.scalars())
+            fresh = batch - taken
+            self.generated += len(batch)
+            self.rejected += len(taken)
+            new = await self.redis.sadd(_POOL_KEY, *fresh) if fresh else 0
+            if new == 0:
+                break  # Key space nearly exhausted at this size; stop rather than spin
+            added += new
+        # Release the read transaction; refill never writes to the database
+        await db.rollback()
+        self.refills += 1
+        logger.info("Refilled url key pool with %d keys (now ~%d)", added, size + added)
+        return added
+
+    def stats(self) -> dict:
+        return {
+            "taken": self.taken,
+            "empty": self.empty,
+            "generated": self.generated,
+            "rejected": self.rejected,
+            "refills": self.refills,
+        }
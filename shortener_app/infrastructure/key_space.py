@@ -0,0 +1,148 @@
+import logging
+from collections import deque
+from typing import Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+from shortener_app.keygen import ALPHABET
+
+logger = logging.getLogger(__name__)
+
+_STATE_KEY = "urls:key_space"
+
+
+class KeySpaceMonitor:
+    """Tracks how full the random key space is and grows the key length
+    before collisions get expensive.
+
+    A random key of the current size collides with probability equal to the
+    occupancy: issued keys of that size / 36**size. Once that crosses
+    max_collision_rate, size steps up by one character (36 times the room).
+    Keys of different lengths can never collide, so old keys stay valid and
+    workers that step up at slightly different times stay correct.
+
+    Two signals drive the step, whichever crosses first:
+    - refresh() estimates the issued keys of the current size (the lifespan
+      runs it every few minutes on the leader), which gives the expected
+      collision rate;
+    - record() sees every create's attempts. The collision rate over the
+      last `window` attempts catches a fill-up between refreshes, and a
+      create that runs out of attempts steps up at once.
+
+    refresh() never counts keys: urls.id comes from a sequence bumped once
+    per insert, so MAX(id), one index lookup, is an upper bound on the keys
+    of any one size. It overstates occupancy by the keys of shorter sizes,
+    which only ever steps up early. With a Redis client the leader
+    publishes its size and estimate to urls:key_space, and the other
+    workers adopt them with sync() instead of querying.
+
+    Histograms of attempts per create and collisions per key size are kept
+    for capacity planning (stats()).
+    """
+
+    def __init__(
+        self,
+        min_size: int = 6,
+        max_size: int = 20,
+        max_collision_rate: float = 0.01,
+        window: int = 1000,
+        max_attempts: int = 5,
+        redis: Optional[Redis] = None,
+    ):
+        self.redis = redis
+        self.size = min_size
+        self.max_size = max_size
+        self.max_collision_rate = max_collision_rate
+        self.max_attempts = max_attempts
+        self.occupancy = 0.0
+        self.issued = 0  # upper bound on keys of the current size, as of the last refresh
+        # True per attempt that collided, over the last `window` attempts at this size
+        self._recent: deque[bool] = deque(maxlen=window)
+        self.attempts_histogram = [0] * max_attempts  # index i: creates that took i + 1 attempts
+        self.failures = 0
+        self.collisions_by_size: dict[int, int] = {}
+        self.size_steps = 0
+
+    @property
+    def observed_collision_rate(self) -> float:
+        return sum(self._recent) / len(self._recent) if self._recent else 0.0
+
+    def _step_up(self, reason: str):
+        if self.size >= self.max_size:
+            return
+        self.size += 1
+        self.size_steps += 1
+        self._recent.clear()
+        self.occupancy = 0.0
+        self.issued = 0
+        logger.warning("Key length stepped up to %d (%s)", self.size, reason)
+
+    async def refresh(self, db: AsyncSession):
+        """Re-estimate issued keys; step up while too full, then publish.
+
+        Also picks the right size at startup: a worker restarted after a
+        step starts at min_size and steps up until the occupancy fits.
+        """
+        result = await db.execute(select(func.max(models.URL.id)))
+        issued = result.scalar_one() or 0
+        while True:
+            self.issued = issued
+            self.occupancy = self.issued / len(ALPHABET) ** self.size
+            if self.occupancy < self.max_collision_rate or self.size >= self.max_size:
+                break
+            self._step_up(f"occupancy {self.occupancy:.2%}")
+        if self.redis is not None:
+            await self.redis.hset(_STATE_KEY, mapping={"size": self.size, "issued": self.issued})
+
+    async def sync(self) -> bool:
+        """Adopt the leader's published size and estimate. Never steps down.
+        Returns False if nothing has been published yet."""
+        state = await self.redis.hgetall(_STATE_KEY) if self.redis is not None else None
+        if not state:
+            return False
+        size = min(int(state["size"]), self.max_size)
+        if size > self.size:
+            self.size_steps += size - self.size
+            self.size = size
+            self._recent.clear()
+            logger.warning("Key length stepped up to %d (published by the leader)", size)
+        if size == self.size:
+            self.issued = int(state["issued"])
+            self.occupancy = self.issued / len(ALPHABET) ** self.size
+        return True
+
+    def record(self, size: int, attempts: int, succeeded: bool = True):
+        """One create(): its attempts, all but the last (if it succeeded) collided."""
+        collisions = attempts - 1 if succeeded else attempts
+        if succeeded:
+            self.attempts_histogram[min(attempts, self.max_attempts) - 1] += 1
+        else:
+            self.failures += 1
+        if collisions:
+            self.collisions_by_size[size] = self.collisions_by_size.get(size, 0) + collisions
+        if size != self.size:
+            return  # a create that started before a step says nothing about the new size
+        self._recent.extend([True] * collisions + [False] * (attempts - collisions))
+        if (
+            len(self._recent) == self._recent.maxlen
+            and self.observed_collision_rate >= self.max_collision_rate
+        ) or not succeeded:
+            self._step_up(f"observed collision rate {self.observed_collision_rate:.2%}")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "issued": self.issued,
+            "occupancy": self.occupancy,
+            "expected_collision_rate": self.occupancy,
+            "observed_collision_rate": self.observed_collision_rate,
+            "attempts_histogram": {
+                str(i + 1): count for i, count in enumerate(self.attempts_histogram)
+            },
+            "failures": self.failures,
+            "collisions_by_size": {str(size): n for size, n in self.collisions_by_size.items()},
+            "size_steps": self.size_steps,
+        }
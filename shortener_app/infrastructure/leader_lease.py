@@ -0,0 +1,138 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Acquire or renew in one step. The holder renews by extending its own lease;
+# anyone else only gets it once the key has expired. Every fresh acquisition
+# INCRs a fencing counter that never goes backwards, so a deposed leader's
+# writes carry a smaller token than its successor's. Returns the token, or 0
+# if someone else holds the lease.
+_ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return tonumber(redis.call('GET', KEYS[2]))
+end
+if holder then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return redis.call('INCR', KEYS[2])
+"""
+
+# Only the holder may release, so a leader whose lease already expired can't
+# delete its successor's.
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """Redis lease electing one process (across workers and hosts) for a job.
+
+    Every process calls acquire() every ttl_ms / 3. The holder's call renews the
+    lease; the others' calls fail until it lapses. If the leader dies its lease
+    expires within ttl_ms and the next attempt by another process takes over,
+    so failover takes at most ttl_ms plus one renewal period.
+
+    is_leader is judged against a local deadline measured from *before* the
+    acquiring call was sent, so a leader that can't reach Redis steps down no
+    later than Redis expires its key. A paused process (GC, SIGSTOP) can still
+    act after its lease expired; the fencing token is for that case. Writers
+    pass it to the store, which rejects tokens older than the last one seen.
+    """
+
+    def __init__(self, redis: Redis, name: str, ttl_ms: int = 10_000):
+        self.redis = redis
+        self.name = name
+        self.ttl_ms = ttl_ms
+        # {name} is a Redis Cluster hash tag: the script touches both keys.
+        self.key = f"lease:{{{name}}}"
+        self.fence_key = f"{self.key}:fence"
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.fence_token = 0
+        self._valid_until = 0.0
+        self._leader_since: Optional[float] = None
+        self._acquire_script = None
+        self._release_script = None
+        self.acquisitions = 0
+        self.renewals = 0
+        self.losses = 0
+
+    @property
+    def renew_interval(self) -> float:
+        """Seconds between acquire() calls: three attempts per lease lifetime."""
+        return self.ttl_ms / 3000
+
+    @property
+    def is_leader(self) -> bool:
+        return self.fence_token > 0 and time.monotonic() < self._valid_until
+
+    async def acquire(self) -> bool:
+        """Acquire the lease, or renew it if already held. Returns is_leader."""
+        if self._acquire_script is None:
+            self._acquire_script = self.redis.register_script(_ACQUIRE_SCRIPT)
+        was_leader = self.is_leader
+        sent_at = time.monotonic()
+        try:
+            token = int(await self._acquire_script(
+                keys=[self.key, self.fence_key], args=[self.holder_id, self.ttl_ms]
+            ))
+        except Exception:
+            if was_leader and not self.is_leader:
+                self._step_down("could not reach Redis to renew")
+            raise
+        if token:
+            if token == self.fence_token and was_leader:
+                self.renewals += 1
+            else:
+                self.acquisitions += 1
+                self._leader_since = time.time()
+                logger.info("Acquired %s lease (fencing token %d)", self.name, token)
+            self.fence_token = token
+            self._valid_until = sent_at + self.ttl_ms / 1000
+        elif was_leader or self.fence_token:
+            self._step_down("held by another process")
+        return self.is_leader
+
+    async def release(self):
+        """Give up the lease (clean shutdown) so a successor needn't wait out the TTL."""
+        if not self.fence_token:
+            return
+        if self._release_script is None:
+            self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+        await self._release_script(keys=[self.key], args=[self.holder_id])
+        self.fence_token = 0
+        self._valid_until = 0.0
+        self._leader_since = None
+
+    def _step_down(self, reason: str):
+        logger.warning("Lost %s lease (%s)", self.name, reason)
+        self.losses += 1
+        self.fence_token = 0
+        self._valid_until = 0.0
+        self._leader_since = None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "fence_token": self.fence_token,
+            "leader_since": self._leader_since,
+            "ttl_ms": self.ttl_ms,
+            "valid_for_ms": max(0, round((self._valid_until - time.monotonic()) * 1000)),
+            "acquisitions": self.acquisitions,
+            "renewals": self.renewals,
+            "losses": self.losses,
+        }
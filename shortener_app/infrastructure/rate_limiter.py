@@ -1,21 +1,245 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import HTTPException, Request
 from shortener_app.config import get_settings
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+
+# Limiter step shared by the standalone GCRA script below and by the redirect
+# scripts that also count the click (click_buffer, click_stream). Each step
+# sets `count`: the requests in the client's current window, this one
+# included. The request is allowed iff count <= max.
+# KEYS[1]: limiter key. ARGV[1]: window seconds, ARGV[2]: max requests.
+# The composing script defines `cost`, the requests this call counts as
+# (1 on the redirect path, the batch size for bulk creation).
+_FIXED_WINDOW_STEP = """
+local count = redis.call('INCRBY', KEYS[1], cost)
+if count == cost then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+"""
+
+# GCRA (generic cell rate algorithm): a token bucket of max_requests refilled
+# at max_requests per window, stored as one number, the theoretical arrival
+# time (TAT) in microseconds of Redis server time. A request fits if the TAT,
+# pushed one emission interval further, is within a window of now; count is
+# that distance in emission intervals. The new TAT and its TTL are written by
+# one SET ... PX, so there is no window in which the key lacks a TTL.
+# Rejected requests don't move the TAT.
+_GCRA_STEP = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000000 + tonumber(clock[2])
+local interval = tonumber(ARGV[1]) * 1000000 / tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or 0), now)
+local count = math.ceil((tat + cost * interval - now) / interval)
+if count <= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[1], string.format('%.0f', tat + cost * interval),
+               'PX', math.ceil((tat + cost * interval - now) / 1000))
+end
+"""
+
+LIMITER_STEPS = {"fixed_window": _FIXED_WINDOW_STEP, "gcra": _GCRA_STEP}
+
+# ARGV[3]: cost
+_GCRA_SCRIPT = "local cost = tonumber(ARGV[3])\n" + _GCRA_STEP + "return count\n"
+
+# Claim up to ARGV[3] requests of the client's fixed-window budget for one
+# worker's local quota. Same key and window as the fixed-window step, but
+# never grants past the limit. Returns {granted, ms until the window resets}.
+_CLAIM_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or 0)
+local granted = math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) - used)
+if granted <= 0 then
+    return {0, redis.call('PTTL', KEYS[1])}
+end
+redis.call('INCRBY', KEYS[1], granted)
+if used == 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return {granted, redis.call('PTTL', KEYS[1])}
+"""
 
 
 class RateLimiter:
-    def __init__(self, max_requests: int, window_seconds: int = 60):
+    """Per-client request limit, max_requests per window_seconds.
+
+    algorithm chooses how a window is counted:
+      - "fixed_window": INCR a counter that expires window_seconds after the
+        client's first request. Two round trips on a client's first request,
+        and a client can spend its whole budget at the end of one window and
+        again at the start of the next: 2x max_requests within milliseconds.
+      - "gcra": one Lua script, one round trip, one key per client. Allows a
+        burst of max_requests, then one request per window / max_requests, so
+        any interval of d seconds admits at most max + d * max / window.
+
+    With local_quota > 0 (fixed window only) each worker claims the budget
+    from Redis in chunks of local_quota requests and spends them in memory,
+    so a busy client costs one round trip per chunk instead of per request.
+    The chunk is valid until the Redis window resets. When a claim gets
+    nothing, the worker rejects that client locally until the reset.
+    Claims never grant past max_requests, so the global limit is never
+    exceeded. The error is in the other direction: a chunk a worker
+    claimed but didn't use is lost to the other workers. With W workers, a
+    client can be rejected after as few as max_requests - W * (local_quota - 1)
+    requests in a window.
+
+    Redis calls go through breaker (a CircuitBreaker) when there is one. While
+    Redis is unavailable each worker counts fixed windows in process instead
+    (fallback_checks). Each worker then allows max_requests on its own, so
+    the global limit loosens to at most W * max_requests with W workers.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int = 60,
+        algorithm: str = "fixed_window",
+        local_quota: int = 0,
+        local_max_clients: int = 10_000,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        if algorithm not in LIMITER_STEPS:
+            raise ValueError(f"Unknown rate limit algorithm {algorithm!r}")
+        if local_quota and algorithm != "fixed_window":
+            raise ValueError("local_quota needs the fixed_window algorithm")
         self.max_requests = max_requests
         self.window_seconds = window_seconds
+        self.algorithm = algorithm
+        self.local_quota = min(local_quota, max_requests)
+        self.local_max_clients = local_max_clients
+        self.breaker = breaker
+        self._scripts: dict = {}
+        self._scripts_redis = None
+        # key → [requests left in the claimed chunk, monotonic expiry, window exhausted]
+        self._quotas: OrderedDict[str, list] = OrderedDict()
+        self._clock = time.monotonic
+        self.local_allowed = 0
+        self.local_rejected = 0
+        self.claims = 0
+        # key → [requests this window, monotonic window end]; used while Redis is down
+        self._fallback: OrderedDict[str, list] = OrderedDict()
+        self.fallback_checks = 0
+        self.fallback_rejected = 0
 
-    async def check_rate_limit(self, request: Request):
-        if not get_settings().rate_limit_enabled:
-            return
+    def _script(self, redis, source: str):
+        if self._scripts_redis is not redis:
+            self._scripts = {}
+            self._scripts_redis = redis
+        if source not in self._scripts:
+            self._scripts[source] = redis.register_script(source)
+        return self._scripts[source]
 
+    def _key(self, request: Request, path: Optional[str] = None) -> str:
         # IP-based limiting: without auth, the client's IP is the only available identifier.
         # Users behind the same NAT share one bucket — acceptable trade-off for a public API.
+        # GCRA keys hold a timestamp, not a count, so they get their own namespace.
+        prefix = "rate_limit" if self.algorithm == "fixed_window" else f"rate_limit:{self.algorithm}"
+        return f"{prefix}:{request.client.host}:{path or request.url.path}"
+
+    def _raise_if_exceeded(self, count: int):
+        if count > self.max_requests:
+            self._raise_limited()
+
+    def _raise_limited(self):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Max {self.max_requests} requests per {self.window_seconds}s"
+        )
+
+    def _remember(self, entries: OrderedDict, key: str, entry: list):
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.local_max_clients:
+            entries.popitem(last=False)
+
+    def _check_fallback(self, key: str, cost: int = 1):
+        """Count key's request in this process only (Redis is unavailable)."""
+        self.fallback_checks += 1
+        now = self._clock()
+        entry = self._fallback.get(key)
+        if entry is None or entry[1] <= now:
+            entry = [0, now + self.window_seconds]
+        entry[0] += cost
+        self._remember(self._fallback, key, entry)
+        if entry[0] > self.max_requests:
+            self.fallback_rejected += 1
+            self._raise_limited()
+
+    async def _check_local_quota(self, redis, key: str, breaker=None, cost: int = 1):
+        """Spend cost requests of this worker's chunk, claiming more if needed."""
+        now = self._clock()
+        quota = self._quotas.get(key)
+        if quota is not None and quota[1] <= now:
+            quota = None  # the Redis window has reset
+        if quota is not None and (quota[0] >= cost or quota[2]):
+            self._quotas.move_to_end(key)
+            if quota[2]:
+                self.local_rejected += 1
+                self._raise_limited()
+            quota[0] -= cost
+            self.local_allowed += 1
+            return
+        granted, ttl_ms = await guarded(
+            breaker, self._script(redis, _CLAIM_SCRIPT),
+            keys=[key], args=[self.window_seconds, self.max_requests, max(self.local_quota, cost)],
+        )
+        self.claims += 1
+        granted, ttl_ms = int(granted), int(ttl_ms)
+        expires = now + (ttl_ms if ttl_ms > 0 else self.window_seconds * 1000) / 1000
+        # The unspent rest of this window's chunk stays usable. An evicted
+        # chunk's rest is simply lost.
+        left = (quota[0] if quota is not None else 0) + granted
+        if left < cost:
+            # A batch the window can't fit; what was claimed stays for smaller requests
+            self._remember(self._quotas, key, [left, expires, left == 0])
+            self._raise_limited()
+        self._remember(self._quotas, key, [left - cost, expires, False])
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.algorithm,
+            "max_requests": self.max_requests,
+            "window_seconds": self.window_seconds,
+            "local_quota": self.local_quota,
+            "local_clients": len(self._quotas),
+            "local_allowed": self.local_allowed,
+            "local_rejected": self.local_rejected,
+            "claims": self.claims,
+            "fallback_checks": self.fallback_checks,
+            "fallback_rejected": self.fallback_rejected,
+        }
+
+    async def check_rate_limit(self, request: Request, cost: int = 1, path: Optional[str] = None):
+        """Count the request as cost requests (a batch counts its size), in
+        the bucket of path (default: the request's own path)."""
+        if not get_settings().rate_limit_enabled:
+            return
+
         redis = request.app.state.redis
-        key = f"rate_limit:{request.client.host}:{request.url.path}"
+        key = self._key(request, path)
+
+        try:
+            await self._check_redis(redis, key, self.breaker, cost)
+        except RedisUnavailableError:
+            self._check_fallback(key, cost)
+
+    async def _check_redis(self, redis, key: str, breaker, cost: int = 1):
+        if self.local_quota:
+            await self._check_local_quota(redis, key, breaker, cost)
+            return
+
+        if self.algorithm == "gcra":
+            count = int(await guarded(
+                breaker, self._script(redis, _GCRA_SCRIPT),
+                keys=[key], args=[self.window_seconds, self.max_requests, cost],
+            ))
+            self._raise_if_exceeded(count)
+            return
+
+        self._raise_if_exceeded(await guarded(breaker, self._incr_window, redis, key, cost))
 
+    async def _incr_window(self, redis, key: str, cost: int = 1) -> int:
         # INCR is atomic — the returned count is the authoritative gate.
         # The old GET → check → SETEX/INCR pattern had two bugs:
         #   1. Non-atomic: two concurrent requests could both read count=limit-1,
@@ -23,15 +247,40 @@ class RateLimiter:
         #   2. Missing TTL: if the key expired between GET (returned a value)
         #      and INCR, the INCR created a new key with no expiry, permanently
         #      rate-limiting the user.
-        count = await redis.incr(key)
-        if count == 1:
-            # New key — set the expiry window. INCR returning 1 means this is
-            # the first request; the key did not exist before this call.
+        count = await redis.incr(key) if cost == 1 else await redis.incrby(key, cost)
+        if count == cost:
+            # New key — set the expiry window. INCR returning 1 (INCRBY
+            # returning the cost) means the key did not exist before this call.
             # The tiny gap between INCR and EXPIRE (crash = key with no TTL)
-            # is accepted; eliminating it would require a Lua script.
+            # is accepted here; the redirect path below closes it with a script.
             await redis.expire(key, self.window_seconds)
-        if count > self.max_requests:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Rate limit exceeded. Max {self.max_requests} requests per {self.window_seconds}s"
+        return count
+
+    async def check_rate_limit_and_count_click(self, request: Request, click_buffer, url_id: int):
+        """Rate check + click increment in a single Redis round trip.
+
+        Equivalent to check_rate_limit() followed by click_buffer.increment(),
+        but the limiter step (LIMITER_STEPS) and ZINCRBY run as one
+        server-side script instead of up to three sequential round trips. A
+        rejected request is not counted as a click, exactly as before. The
+        client IP doubles as the visitor id for unique-visitor sketches.
+        """
+        if not get_settings().rate_limit_enabled:
+            await click_buffer.increment(url_id, visitor=request.client.host)
+            return
+        if self.local_quota:
+            # Usually no limiter round trip at all; the click is one call
+            await self.check_rate_limit(request)
+            await click_buffer.increment(url_id, visitor=request.client.host)
+            return
+        try:
+            count = await click_buffer.increment_rate_limited(
+                url_id, self._key(request), self.max_requests, self.window_seconds,
+                visitor=request.client.host, algorithm=self.algorithm,
             )
+        except RedisUnavailableError:
+            # The click buffer keeps the click in process until Redis is back
+            self._check_fallback(self._key(request))
+            await click_buffer.increment(url_id, visitor=request.client.host)
+            return
+        self._raise_if_exceeded(count)
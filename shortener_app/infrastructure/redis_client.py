@@ -1,10 +1,18 @@
+from typing import Optional
+
 from redis.asyncio import Redis
 from shortener_app.config import get_settings
 
 
-async def create_redis_client() -> Redis:
+async def create_redis_client(decode_responses: bool = True, url: Optional[str] = None) -> Redis:
+    """decode_responses=False gives a client for binary values (HyperLogLog sketches).
+    url defaults to REDIS_URL."""
     return Redis.from_url(
-        get_settings().redis_url,
+        url or get_settings().redis_url,
         encoding="utf-8",
-        decode_responses=True,
+        decode_responses=decode_responses,
+        # Bounds every call, including the unguarded ones (flush loops,
+        # write-throughs); guarded calls also get the breaker's shorter timeout.
+        socket_timeout=get_settings().redis_socket_timeout,
+        socket_connect_timeout=get_settings().redis_socket_timeout,
     )
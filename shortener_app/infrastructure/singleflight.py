@@ -0,0 +1,51 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Per-process request coalescing: at most one in-flight call per key.
+
+    When a cold key goes viral, every concurrent redirect for it misses the cache
+    at once. Without coalescing each one runs its own SELECT and holds a pool
+    connection; with it, the first caller starts the lookup as a task and every
+    concurrent caller awaits that same task.
+
+    - Errors reach every waiter of that flight, but the flight is forgotten as
+      soon as it finishes, so the next caller retries instead of inheriting a
+      cached failure.
+    - Waiters await through asyncio.shield, so a cancelled waiter (client
+      disconnect, timeout) neither cancels the shared lookup nor the others.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # If every waiter was cancelled nobody retrieves the outcome; mark it
+        # retrieved so asyncio doesn't log "exception was never retrieved".
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
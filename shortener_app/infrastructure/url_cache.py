@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import RedisError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from shortener_app.infrastructure.circuit_breaker import CircuitBreaker, RedisUnavailableError, guarded
+
+logger = logging.getLogger(__name__)
+
+_INVALIDATE_CHANNEL = "urls:invalidate"
+
+
+class CachedURL(NamedTuple):
+    """The subset of a URL row the redirect path needs. Immutable once issued,
+    except is_active — which is why deactivation must invalidate."""
+    id: int
+    target_url: str
+    is_active: bool
+
+
+class URLCache:
+    """Size-bounded, per-process LRU cache of key → CachedURL.
+
+    Keys never change after creation, so the only way an entry goes stale is
+    deactivation. URLService.deactivate calls invalidate(), which evicts locally
+    and publishes the key over Redis pub/sub so every other worker evicts it too.
+    Pub/sub is fire-and-forget, so the TTL is a safety net bounding staleness if
+    a message is lost (e.g. a worker was reconnecting when it was published).
+    """
+
+    def __init__(self, redis: Redis, max_size: int = 10_000, ttl: int = 300):
+        self.redis = redis
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, CachedURL]] = OrderedDict()
+        # Bumped on every eviction by invalidation. A reader captures it before
+        # going to the database and only caches its result if it is unchanged,
+        # so a row read just before a concurrent deactivate can't be cached
+        # after the invalidation message has already been processed.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedURL]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, record = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return record
+
+    def set(self, key: str, record: CachedURL, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return  # An invalidation raced with the read that produced this record
+        self._entries[key] = (time.monotonic() + self.ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def evict(self, key: str):
+        self.generation += 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    async def invalidate(self, key: str):
+        """Evict locally and tell every other worker to do the same."""
+        self.evict(key)
+        await self.redis.publish(_INVALIDATE_CHANNEL, key)
+
+    async def listen(self):
+        """Apply invalidations published by other workers. Runs until cancelled."""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(_INVALIDATE_CHANNEL)
+        # Anything published while we weren't subscribed is gone; start clean
+        # rather than serve entries that may have missed their invalidation.
+        self.clear()
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self.evict(message["data"])
+        finally:
+            await pubsub.unsubscribe(_INVALIDATE_CHANNEL)
+            await pubsub.aclose()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Fill only if absent: a reader that loaded the row before a concurrent
+# deactivate must not overwrite the deactivate's write-through (active=0).
+# Doing EXISTS + HSET + EXPIRE in one script also leaves no TTL-less window.
+_FILL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'id', ARGV[1], 'target', ARGV[2], 'active', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class RedisURLCache:
+    """Shared read-through tier: one hash per URL at url:{key} → id/target/active.
+
+    Sits between the per-process URLCache and the database so a cold worker warms
+    from Redis instead of PostgreSQL. Every entry carries a TTL; the overall size
+    is bounded by the cache's own Redis instance (REDIS_CACHE_URL, maxmemory +
+    allkeys-lru, see docker-compose.yml), so evicting entries never touches the
+    click buffer, rate-limit counters or leases on the main instance.
+
+    get() and fill() sit on the redirect path, so they go through the breaker:
+    when Redis is unavailable, get() is a miss and the caller reads SQL, and
+    fill() is skipped. warm(), the write-through after a create, runs after the
+    commit and is best effort too: a skipped entry is filled on first read.
+    set(), the write-through from deactivate, is strict: a lost write would
+    leave an active entry behind, so it retries and then raises.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = 3600, breaker: Optional[CircuitBreaker] = None):
+        self.redis = redis
+        self.ttl = ttl
+        self.breaker = breaker
+        self._fill_script = None
+        self.hits = 0
+        self.misses = 0
+        self.unavailable = 0
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"url:{key}"
+
+    async def get(self, key: str) -> Optional[CachedURL]:
+        try:
+            fields = await guarded(self.breaker, self.redis.hgetall, self._key(key))
+        except RedisUnavailableError:
+            self.unavailable += 1
+            return None
+        if not fields:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedURL(int(fields["id"]), fields["target"], fields["active"] == "1")
+
+    async def fill(self, key: str, record: CachedURL):
+        """Populate after a database read; never overwrites an existing entry."""
+        if self._fill_script is None:
+            self._fill_script = self.redis.register_script(_FILL_SCRIPT)
+        try:
+            await guarded(
+                self.breaker, self._fill_script,
+                keys=[self._key(key)],
+                args=[record.id, record.target_url, int(record.is_active), self.ttl],
+            )
+        except RedisUnavailableError:
+            self.unavailable += 1
+
+    async def warm(self, key: str, record: CachedURL):
+        """Write-through from create. Never raises: the row is already committed."""
+        try:
+            await guarded(self.breaker, self._write, key, record)
+        except (RedisUnavailableError, RedisError) as exc:
+            self.unavailable += 1
+            logger.warning("Skipped shared cache write for %s: %r", key, exc)
+
+    async def set(self, key: str, record: CachedURL, attempts: int = 3):
+        """Write-through from deactivate: unconditionally overwrite, retrying
+        connection errors and timeouts before raising."""
+        for attempt in range(attempts):
+            try:
+                await self._write(key, record)
+                return
+            except (RedisConnectionError, RedisTimeoutError):
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(0.05 * 2 ** attempt)
+
+    async def _write(self, key: str, record: CachedURL):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(key), mapping={
+                "id": record.id,
+                "target": record.target_url,
+                "active": int(record.is_active),
+            })
+            pipe.expire(self._key(key), self.ttl)
+            await pipe.execute()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "unavailable": self.unavailable,
+        }
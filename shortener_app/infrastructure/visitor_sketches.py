@@ -0,0 +1,138 @@
+import logging
+from typing import Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "visitors"
+
+
+class VisitorSketches:
+    """Approximate unique visitors per URL: one Redis HyperLogLog per URL.
+
+    A HyperLogLog holds 16384 6-bit registers, so a sketch is at most 12 KB
+    however many visitors it has seen (and far smaller while sparse). The
+    standard error is 0.81%. Visitor IPs are hashed into registers and never
+    stored.
+
+    The redirect path PFADDs in the same script as the click increment. When a
+    register changes, PFADD returns 1 and the url_id is added to a dirty set.
+    persist() then drains the dirty set:
+      - The stored sketch is PFMERGEd into the live one. Merging is a
+        register-wise max, so it is idempotent, and it restores history if the
+        Redis key was lost.
+      - The merged sketch is written back to url_visitor_sketches.
+      - Its PFCOUNT is written to urls.unique_visitors.
+      - The live sketch gets a TTL of `ttl` seconds. A URL that keeps gaining
+        visitors is persisted (and its TTL renewed) every run; an idle one
+        expires, and the merge above rebuilds it if it is visited again.
+
+    Sketches are binary, and the app's client decodes replies as UTF-8, so
+    persist() reads them through raw_redis (decode_responses=False).
+    """
+
+    def __init__(
+        self, redis: Redis, raw_redis: Optional[Redis] = None, shards: int = 1, ttl: int = 86400
+    ):
+        self.redis = redis
+        self.raw_redis = raw_redis or redis
+        self.shards = shards
+        self.ttl = ttl
+        self.persisted = 0
+
+    def keys(self, url_id: int) -> tuple[str, str]:
+        """(sketch key, dirty-set key) for a URL, in its click-buffer shard's slot."""
+        return self._sketch_key(url_id), self._dirty_key(int(url_id) % self.shards)
+
+    def _sketch_key(self, url_id: int) -> str:
+        if self.shards == 1:
+            return f"{_KEY_PREFIX}:{url_id}"
+        return f"{_KEY_PREFIX}:{{{int(url_id) % self.shards}}}:{url_id}"
+
+    def _dirty_key(self, shard: int) -> str:
+        return f"{_KEY_PREFIX}:dirty" if self.shards == 1 else f"{_KEY_PREFIX}:dirty:{{{shard}}}"
+
+    def queue_add(self, pipe, url_id: int, visitors):
+        """Queue PFADD (and the dirty mark) for visitors on a pipeline."""
+        sketch_key, dirty_key = self.keys(url_id)
+        pipe.pfadd(sketch_key, *visitors)
+        pipe.sadd(dirty_key, url_id)
+
+    async def add(self, url_id: int, visitor: str):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self.queue_add(pipe, url_id, [visitor])
+            await pipe.execute()
+
+    async def count(self, url_id: int) -> int:
+        return int(await self.redis.pfcount(self._sketch_key(url_id)))
+
+    async def persist(self, db: AsyncSession, batch_size: int = 500) -> int:
+        """Merge and persist every dirty sketch. Returns URLs persisted."""
+        persisted = 0
+        for shard in range(self.shards):
+            dirty_key = self._dirty_key(shard)
+            while url_ids := await self.redis.spop(dirty_key, batch_size):
+                ids = [int(url_id) for url_id in url_ids]
+                try:
+                    await self._persist_batch(db, ids)
+                except Exception:
+                    await self.redis.sadd(dirty_key, *ids)  # retried next run
+                    raise
+                persisted += len(ids)
+        self.persisted += persisted
+        return persisted
+
+    async def _persist_batch(self, db: AsyncSession, url_ids: list[int]):
+        stored = await db.execute(
+            select(models.URLVisitorSketch).where(models.URLVisitorSketch.url_id.in_(url_ids))
+        )
+        async with self.raw_redis.pipeline(transaction=False) as pipe:
+            for row in stored.scalars():
+                key = self._sketch_key(row.url_id)
+                pipe.set(f"{key}:restore", row.sketch)
+                pipe.pfmerge(key, key, f"{key}:restore")
+                pipe.delete(f"{key}:restore")
+            for url_id in url_ids:
+                pipe.get(self._sketch_key(url_id))
+                pipe.pfcount(self._sketch_key(url_id))
+            replies = await pipe.execute()
+        merged = replies[len(replies) - 2 * len(url_ids):]
+        sketches = [
+            (url_id, merged[2 * i], int(merged[2 * i + 1]))
+            for i, url_id in enumerate(url_ids) if merged[2 * i] is not None
+        ]
+        if not sketches:
+            return
+
+        table = models.URLVisitorSketch.__table__
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(table)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.url_id], set_={"sketch": stmt.excluded.sketch}
+            ),
+            [{"url_id": url_id, "sketch": sketch} for url_id, sketch, _ in sketches],
+        )
+        urls = models.URL.__table__
+        await db.execute(
+            urls.update()
+            .where(urls.c.id == bindparam("url_id"))
+            .values(unique_visitors=bindparam("visitors")),
+            [{"url_id": url_id, "visitors": count} for url_id, _, count in sketches],
+        )
+        await db.commit()
+        if self.ttl:
+            # Only once the sketch is safely stored can Redis drop it
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for url_id, _, _ in sketches:
+                    pipe.expire(self._sketch_key(url_id), self.ttl)
+                await pipe.execute()
+
+    def stats(self) -> dict:
+        return {"shards": self.shards, "persisted": self.persisted}
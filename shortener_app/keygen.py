@@ -1,8 +1,132 @@
-import random
+import hashlib
+import os
 import string
+import threading
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+# Random bytes become characters with one bytes.translate call: byte b maps
+# to ALPHABET[b % 36], and the 4 bytes >= 252 are deleted rather than mapped,
+# because 256 % 36 != 0 and keeping them would bias A-D (rejection sampling).
+_UNBIASED_LIMIT = 256 - 256 % len(ALPHABET)
+_BYTE_TO_CHAR = bytes(ord(ALPHABET[b % len(ALPHABET)]) for b in range(256))
+_REJECTED_BYTES = bytes(range(_UNBIASED_LIMIT, 256))
+_REFILL_BYTES = 4096
+
+
+class _RandomChars:
+    """Pre-drawn CSPRNG characters, refilled from os.urandom in bulk.
+
+    Reading 4 KiB at a time costs one system call per ~680 six-character
+    keys instead of one random.choices call per key, and the characters are
+    unpredictable, unlike the Mersenne Twister behind random. The buffer is
+    emptied in a forked child, so worker processes never share characters.
+    """
+
+    def __init__(self):
+        self._chars = ""
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self._chars, self._pos = "", 0
+
+    def take(self, n: int) -> str:
+        with self._lock:
+            if self._pos + n > len(self._chars):
+                chars = self._chars[self._pos:]
+                while len(chars) < n:
+                    # ~1.6% of bytes are rejected; over-draw so one read usually suffices
+                    raw = os.urandom(max(_REFILL_BYTES, (n - len(chars)) * 66 // 64 + 16))
+                    chars += raw.translate(_BYTE_TO_CHAR, _REJECTED_BYTES).decode("ascii")
+                self._chars, self._pos = chars, 0
+            chars = self._chars[self._pos:self._pos + n]
+            self._pos += n
+            return chars
+
+
+_random_chars = _RandomChars()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_random_chars.reset)
 
 
 def generate_random_key(size: int = 6) -> str:
     """Uniqueness enforced by database constraint, not pre-checking (avoids TOCTOU)."""
-    chars = string.ascii_uppercase + string.digits
-    return "".join(random.choices(chars, k=size))
\ No newline at end of file
+    return _random_chars.take(size)
+
+
+def generate_keys(count: int, size: int = 6) -> list[str]:
+    """count random keys from one draw: the bulk form of generate_random_key."""
+    chars = _random_chars.take(count * size)
+    return [chars[i:i + size] for i in range(0, len(chars), size)]
+
+
+def encode_key(value: int, size: int = 6) -> str:
+    """value in [0, 36**size) as a fixed-width key over ALPHABET."""
+    chars = []
+    for _ in range(size):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    if value:
+        raise ValueError(f"value does not fit in {size} characters")
+    return "".join(reversed(chars))
+
+
+def decode_key(key: str) -> int:
+    value = 0
+    for char in key:
+        value = value * len(ALPHABET) + ALPHABET.index(char)
+    return value
+
+
+class FeistelPermutation:
+    """Keyed bijection on [0, 36**size), so counter values become keys that
+    are unique by construction but don't reveal their order.
+
+    A value splits into a high half in Z_a and a low half in Z_b, with
+    a = 36**ceil(size/2) and b = 36**floor(size/2). Each round maps
+    (L, R) → (R, (L + F(round, R)) mod |L|), which is invertible whatever
+    F is, and swaps which modulus is on the left; an even number of rounds
+    lands back in Z_a × Z_b. No cycle-walking is needed because a·b is
+    exactly the key space. F is keyed BLAKE2b, so without the secret the
+    sequence can't be predicted from issued keys.
+    """
+
+    def __init__(self, secret: bytes, size: int = 6, rounds: int = 8):
+        if rounds % 2:
+            raise ValueError("rounds must be even")
+        self.size = size
+        self.rounds = rounds
+        self.domain = len(ALPHABET) ** size
+        self._moduli = (len(ALPHABET) ** ((size + 1) // 2), len(ALPHABET) ** (size // 2))
+        # Different sizes must give unrelated permutations under one secret
+        self._secret = hashlib.blake2b(secret + b":%d" % size, digest_size=32).digest()
+
+    def _round(self, round_: int, half: int, modulus: int) -> int:
+        digest = hashlib.blake2b(
+            round_.to_bytes(1, "big") + half.to_bytes(8, "big"), key=self._secret, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") % modulus
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.domain:
+            raise ValueError(f"{value} is outside [0, {self.domain})")
+        left_mod, right_mod = self._moduli
+        left, right = divmod(value, right_mod)
+        for round_ in range(self.rounds):
+            left, right = right, (left + self._round(round_, right, left_mod)) % left_mod
+            left_mod, right_mod = right_mod, left_mod
+        return left * right_mod + right
+
+    def invert(self, value: int) -> int:
+        if not 0 <= value < self.domain:
+            raise ValueError(f"{value} is outside [0, {self.domain})")
+        left_mod, right_mod = self._moduli  # same as after an even number of rounds
+        left, right = divmod(value, right_mod)
+        for round_ in reversed(range(self.rounds)):
+            left, right = (right - self._round(round_, left, right_mod)) % right_mod, left
+            left_mod, right_mod = right_mod, left_mod
+        return left * right_mod + right
+
+    def key(self, value: int) -> str:
+        return encode_key(self.permute(value), self.size)
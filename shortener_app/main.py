@@ -1,19 +1,26 @@
 import asyncio
 import logging
+import secrets
+import time
 
 from shortener_app import models, schemas
 from shortener_app.database import engine, AsyncSessionLocal
 from shortener_app.config import get_settings
-from shortener_app.services import URLService
-from shortener_app.infrastructure import RateLimiter, create_redis_client, ClickBuffer
+from shortener_app.services import URLService, ClickRollupService, LeaderboardService
+from shortener_app.services.leaderboard_service import SCOPES
+from shortener_app.services.rollup_service import RESOLUTIONS
+from shortener_app.infrastructure import RateLimiter, create_redis_client, ClickBuffer, StreamClickBuffer, URLCache, RedisURLCache, BloomFilter, SingleFlight, LeaderLease, FlushScheduler, VisitorSketches, ClickEventQueue, CircuitBreaker, KeyPool, FeistelKeyGenerator, KeySpaceMonitor
+from shortener_app.infrastructure.click_events import rotate_click_events
 
 import re
 import validators
 from contextlib import asynccontextmanager
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.datastructures import URL
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -34,14 +41,149 @@ def _validate_secret_key(key: str):
     if not _SECRET_KEY_RE.match(key):
         raise HTTPException(status_code=404, detail="URL not found")
 
-async def _flush_loop(click_buffer: ClickBuffer, interval: int):
+async def _flush_loop(
+    click_buffer: ClickBuffer, scheduler: FlushScheduler, lease: Optional[LeaderLease] = None
+):
+    # Every worker runs this loop; with a lease only the current leader flushes.
+    while True:
+        await asyncio.sleep(scheduler.min_interval)
+        if lease is not None and not lease.is_leader:
+            continue
+        try:
+            if await scheduler.due() is None:
+                continue
+        except Exception:
+            logger.exception("Could not read the click buffer size")
+            continue
+        started = time.perf_counter()
+        try:
+            await click_buffer.flush_all(
+                AsyncSessionLocal,
+                concurrency=get_settings().click_flush_concurrency,
+                fence=lease.fence_token if lease is not None else 0,
+            )
+        except Exception:
+            logger.exception("Click flush failed")
+            scheduler.record(time.perf_counter() - started, 0, failed=True)
+        else:
+            scheduler.record(time.perf_counter() - started, click_buffer.last_flush["urls"])
+
+
+def _db_pool_saturated() -> bool:
+    # Every pooled connection checked out: a flush would queue behind requests.
+    pool = engine.pool
+    return hasattr(pool, "size") and pool.checkedout() >= pool.size()
+
+
+async def _rollup_compaction_loop(interval: int, lease: Optional[LeaderLease] = None):
     while True:
         await asyncio.sleep(interval)
+        if lease is not None and not lease.is_leader:
+            continue
         try:
             async with AsyncSessionLocal() as db:
-                await click_buffer.flush_to_db(db)
+                folded = await ClickRollupService(db).compact(
+                    datetime.now(timezone.utc).replace(tzinfo=None),
+                    minute_retention=timedelta(hours=get_settings().click_rollup_minute_retention_hours),
+                    hour_retention=timedelta(days=get_settings().click_rollup_hour_retention_days),
+                )
+            logger.info("Compacted click rollups: %s", folded)
         except Exception:
-            logger.exception("Click flush failed")
+            logger.exception("Click rollup compaction failed")
+
+
+async def _visitor_persist_loop(
+    visitors: VisitorSketches, interval: int, lease: Optional[LeaderLease] = None
+):
+    while True:
+        await asyncio.sleep(interval)
+        if lease is not None and not lease.is_leader:
+            continue
+        try:
+            async with AsyncSessionLocal() as db:
+                await visitors.persist(db)
+        except Exception:
+            logger.exception("Unique visitor persist failed")
+
+
+async def _click_event_rotation_loop(
+    retention_days: int, interval: int = 3600, lease: Optional[LeaderLease] = None
+):
+    # The first run doesn't wait for the lease, so today's partition exists
+    # before the first insert; every statement in it is idempotent.
+    first_run = True
+    while True:
+        if first_run or lease is None or lease.is_leader:
+            first_run = False
+            try:
+                async with AsyncSessionLocal() as db:
+                    await rotate_click_events(db, datetime.now(timezone.utc).date(), retention_days)
+            except Exception:
+                logger.exception("Click event rotation failed")
+        await asyncio.sleep(interval)
+
+
+async def _key_pool_refill_loop(
+    key_pool: KeyPool, interval: int, lease: Optional[LeaderLease] = None
+):
+    while True:
+        if lease is None or lease.is_leader:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await key_pool.refill(db)
+            except Exception:
+                logger.exception("URL key pool refill failed")
+        await asyncio.sleep(interval)
+
+
+async def _key_space_loop(
+    key_space: KeySpaceMonitor,
+    interval: int,
+    key_pool: Optional[KeyPool] = None,
+    lease: Optional[LeaderLease] = None,
+):
+    while True:
+        try:
+            # Until a leader has published (e.g. at startup), estimate locally
+            if lease is None or lease.is_leader or not await key_space.sync():
+                async with AsyncSessionLocal() as db:
+                    await key_space.refresh(db)
+        except Exception:
+            logger.exception("Key space refresh failed")
+        if key_pool is not None:
+            key_pool.key_size = key_space.size  # refill at the current length
+        await asyncio.sleep(interval)
+
+
+async def _lease_loop(lease: LeaderLease):
+    while True:
+        try:
+            await lease.acquire()
+        except Exception:
+            logger.exception("Could not acquire or renew the %s lease", lease.name)
+        await asyncio.sleep(lease.renew_interval)
+
+
+async def _local_click_flush_loop(click_buffer: ClickBuffer, interval_ms: int):
+    while True:
+        await asyncio.sleep(interval_ms / 1000)
+        try:
+            await click_buffer.flush_local()
+        except Exception:
+            logger.exception("Local click flush to Redis failed; will retry")
+
+
+async def _invalidation_loop(url_cache: URLCache, retry_delay: int = 1):
+    # Resubscribe if the pub/sub connection drops; listen() clears the cache on
+    # every (re)subscribe because invalidations sent in the gap were missed.
+    while True:
+        try:
+            await url_cache.listen()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("URL cache invalidation listener failed")
+            await asyncio.sleep(retry_delay)
 
 
 @asynccontextmanager
@@ -52,25 +194,227 @@ async def lifespan(app: FastAPI):
             await conn.run_sync(models.Base.metadata.create_all)
 
     app.state.redis = await create_redis_client()
-    app.state.click_buffer = ClickBuffer(app.state.redis)
-
-    flush_task = asyncio.create_task(
-        _flush_loop(app.state.click_buffer, get_settings().click_flush_interval)
+    app.state.redis_breaker = None
+    if get_settings().redis_breaker_enabled:
+        app.state.redis_breaker = CircuitBreaker(
+            "redis",
+            failure_threshold=get_settings().redis_breaker_failure_threshold,
+            reset_timeout=get_settings().redis_breaker_reset_seconds,
+            call_timeout=get_settings().redis_call_timeout_ms / 1000,
+        )
+    create_rate_limiter.breaker = read_rate_limiter.breaker = app.state.redis_breaker
+    app.state.raw_redis = None
+    app.state.visitor_sketches = None
+    if get_settings().unique_visitors_enabled:
+        app.state.raw_redis = await create_redis_client(decode_responses=False)
+        app.state.visitor_sketches = VisitorSketches(
+            app.state.redis,
+            raw_redis=app.state.raw_redis,
+            # The stream backend isn't sharded
+            shards=get_settings().click_buffer_shards
+            if get_settings().click_buffer_backend != "stream" else 1,
+            ttl=get_settings().unique_visitors_ttl,
+        )
+    if get_settings().click_buffer_backend == "stream":
+        app.state.click_buffer = StreamClickBuffer(
+            app.state.redis,
+            aggregate_locally=get_settings().click_local_aggregation,
+            local_max_entries=get_settings().click_local_max_entries,
+            flush_chunk_size=get_settings().click_flush_chunk_size,
+            maxlen=get_settings().click_stream_maxlen,
+            claim_idle_ms=get_settings().click_stream_claim_idle_ms,
+            record_rollups=get_settings().click_rollup_enabled,
+            visitors=app.state.visitor_sketches,
+            top_urls_size=get_settings().click_leaderboard_size,
+            breaker=app.state.redis_breaker,
+        )
+    else:
+        app.state.click_buffer = ClickBuffer(
+            app.state.redis,
+            aggregate_locally=get_settings().click_local_aggregation,
+            local_max_entries=get_settings().click_local_max_entries,
+            flush_chunk_size=get_settings().click_flush_chunk_size,
+            shards=get_settings().click_buffer_shards,
+            record_rollups=get_settings().click_rollup_enabled,
+            visitors=app.state.visitor_sketches,
+            top_urls_size=get_settings().click_leaderboard_size,
+            breaker=app.state.redis_breaker,
+        )
+    app.state.url_flights = SingleFlight()
+    app.state.leaderboard_cache = {}
+    app.state.bloom_filter = None
+    if get_settings().bloom_filter_enabled:
+        app.state.bloom_filter = BloomFilter(
+            capacity=get_settings().bloom_filter_capacity,
+            error_rate=get_settings().bloom_filter_error_rate,
+            redis=app.state.redis if get_settings().bloom_filter_redis_mirror else None,
+            breaker=app.state.redis_breaker,
+        )
+        async with AsyncSessionLocal() as db:
+            await app.state.bloom_filter.rebuild(db)
+    app.state.key_space = KeySpaceMonitor(
+        min_size=get_settings().key_length,
+        max_size=get_settings().key_max_length,
+        max_collision_rate=get_settings().key_max_collision_rate,
+        window=get_settings().key_space_window,
+        redis=app.state.redis,
+    )
+    app.state.key_generator = None
+    app.state.key_pool = None
+    if get_settings().key_generator == "feistel":
+        if not get_settings().key_feistel_secret:
+            raise ValueError("KEY_FEISTEL_SECRET must be set to use the feistel key generator")
+        app.state.key_generator = FeistelKeyGenerator(
+            app.state.redis,
+            get_settings().key_feistel_secret.encode(),
+            size=get_settings().key_length,
+            block_size=get_settings().key_feistel_block_size,
+            breaker=app.state.redis_breaker,
+            max_size=get_settings().key_max_length,
+        )
+    elif get_settings().key_generator != "random":
+        raise ValueError(f"Unknown key generator {get_settings().key_generator!r}")
+    elif get_settings().key_pool_enabled:
+        app.state.key_pool = KeyPool(
+            app.state.redis,
+            key_size=get_settings().key_length,
+            low_water=get_settings().key_pool_low_water,
+            high_water=get_settings().key_pool_high_water,
+            batch_size=get_settings().key_pool_batch_size,
+            breaker=app.state.redis_breaker,
+        )
+    app.state.url_cache = None
+    app.state.shared_url_cache = None
+    app.state.cache_redis = None
+    app.state.cache_breaker = None
+    if get_settings().redis_url_cache_enabled:
+        cache_breaker = app.state.redis_breaker
+        # The cache may be evicted freely; keep it off the instance that holds
+        # the click buffer, counters and leases when REDIS_CACHE_URL is set.
+        if get_settings().redis_cache_url:
+            app.state.cache_redis = await create_redis_client(url=get_settings().redis_cache_url)
+            if get_settings().redis_breaker_enabled:
+                # A separate server fails separately
+                cache_breaker = app.state.cache_breaker = CircuitBreaker(
+                    "redis_cache",
+                    failure_threshold=get_settings().redis_breaker_failure_threshold,
+                    reset_timeout=get_settings().redis_breaker_reset_seconds,
+                    call_timeout=get_settings().redis_call_timeout_ms / 1000,
+                )
+        app.state.shared_url_cache = RedisURLCache(
+            app.state.cache_redis or app.state.redis,
+            ttl=get_settings().redis_url_cache_ttl,
+            breaker=cache_breaker,
+        )
+    app.state.flush_lease = None
+    background_tasks = []
+    # Also elects the one worker that runs the maintenance loops below
+    # (compaction, sketch persist, partition rotation, key pool refill)
+    if get_settings().click_flush_leader_election:
+        # Lease TTL plus one renewal period (TTL / 3) must fit in a flush
+        # interval for a dead leader to be replaced within one interval.
+        app.state.flush_lease = LeaderLease(
+            app.state.redis,
+            "click_flusher",
+            ttl_ms=min(get_settings().click_flush_lease_ttl_ms,
+                       get_settings().click_flush_interval * 750),
+        )
+        background_tasks.append(asyncio.create_task(_lease_loop(app.state.flush_lease)))
+    # The stream backend's consumer group already splits the click flush
+    # between workers, so only the sorted-set flush is gated on the lease
+    click_flush_lease = (
+        app.state.flush_lease if get_settings().click_buffer_backend != "stream" else None
+    )
+    app.state.flush_scheduler = FlushScheduler(
+        app.state.click_buffer,
+        base_interval=get_settings().click_flush_interval,
+        min_interval=get_settings().click_flush_min_interval,
+        max_interval=get_settings().click_flush_max_interval,
+        cardinality_threshold=get_settings().click_flush_cardinality_threshold,
+        slow_flush_seconds=get_settings().click_flush_slow_seconds,
+        db_busy=_db_pool_saturated,
     )
+    background_tasks.append(asyncio.create_task(
+        _flush_loop(app.state.click_buffer, app.state.flush_scheduler, click_flush_lease)
+    ))
+    if get_settings().click_rollup_enabled:
+        background_tasks.append(asyncio.create_task(_rollup_compaction_loop(
+            get_settings().click_rollup_compaction_interval, app.state.flush_lease
+        )))
+    if app.state.visitor_sketches is not None:
+        background_tasks.append(asyncio.create_task(_visitor_persist_loop(
+            app.state.visitor_sketches,
+            get_settings().unique_visitors_persist_interval,
+            app.state.flush_lease,
+        )))
+    app.state.click_events = None
+    if get_settings().click_events_enabled:
+        app.state.click_events = ClickEventQueue(
+            maxsize=get_settings().click_events_queue_size,
+            batch_size=get_settings().click_events_batch_size,
+            max_wait=get_settings().click_events_max_wait_ms / 1000,
+        )
+        background_tasks.append(asyncio.create_task(
+            app.state.click_events.run(AsyncSessionLocal)
+        ))
+        background_tasks.append(asyncio.create_task(_click_event_rotation_loop(
+            get_settings().click_events_retention_days, lease=app.state.flush_lease
+        )))
+    background_tasks.append(asyncio.create_task(_key_space_loop(
+        app.state.key_space,
+        get_settings().key_space_refresh_interval,
+        app.state.key_pool,
+        app.state.flush_lease,
+    )))
+    if app.state.key_pool is not None:
+        background_tasks.append(asyncio.create_task(_key_pool_refill_loop(
+            app.state.key_pool, get_settings().key_pool_refill_interval, app.state.flush_lease
+        )))
+    # Also reconciles clicks kept in process while the Redis breaker was open
+    if get_settings().click_local_aggregation or app.state.redis_breaker is not None:
+        background_tasks.append(asyncio.create_task(
+            _local_click_flush_loop(
+                app.state.click_buffer, get_settings().click_local_flush_interval_ms
+            )
+        ))
+    if get_settings().url_cache_enabled:
+        app.state.url_cache = URLCache(
+            app.state.redis,
+            max_size=get_settings().url_cache_max_size,
+            ttl=get_settings().url_cache_ttl,
+        )
+        background_tasks.append(asyncio.create_task(_invalidation_loop(app.state.url_cache)))
 
     yield
 
-    flush_task.cancel()
-    try:
-        await flush_task
-    except asyncio.CancelledError:
-        pass
-
-    # Final flush so in-flight counts aren't lost on clean shutdown
-    async with AsyncSessionLocal() as db:
-        await app.state.click_buffer.flush_to_db(db)
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # Final flush so in-flight counts aren't lost on clean shutdown: process-local
+    # deltas go to Redis first so the SQL flush below includes them. Only the
+    # leader flushes to SQL; other workers' deltas wait in Redis for the next one.
+    await app.state.click_buffer.flush_local()
+    if app.state.click_events is not None:
+        await app.state.click_events.drain(AsyncSessionLocal)
+    if click_flush_lease is None or click_flush_lease.is_leader:
+        await app.state.click_buffer.flush_all(
+            AsyncSessionLocal,
+            concurrency=get_settings().click_flush_concurrency,
+            fence=click_flush_lease.fence_token if click_flush_lease is not None else 0,
+        )
+    if app.state.flush_lease is not None:
+        await app.state.flush_lease.release()
 
     await app.state.redis.close()
+    if app.state.raw_redis is not None:
+        await app.state.raw_redis.close()
+    if app.state.cache_redis is not None:
+        await app.state.cache_redis.close()
     await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
@@ -79,12 +423,68 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
-def get_url_service(db: AsyncSession = Depends(get_db)) -> URLService:
-    return URLService(db)
+def get_session_factory() -> Callable[[], AsyncSession]:
+    return AsyncSessionLocal
+
+def _lookup_accelerators(request: Request) -> dict:
+    # Cache tiers, the Bloom filter and miss coalescing are all optional, so
+    # absence means "disabled".
+    return {
+        "cache": getattr(request.app.state, "url_cache", None),
+        "shared_cache": getattr(request.app.state, "shared_url_cache", None),
+        "bloom": getattr(request.app.state, "bloom_filter", None),
+        "flights": getattr(request.app.state, "url_flights", None),
+    }
+
+def get_rollup_service(db: AsyncSession = Depends(get_db)) -> ClickRollupService:
+    return ClickRollupService(db)
+
+def get_leaderboard_service(
+    request: Request, db: AsyncSession = Depends(get_db)
+) -> LeaderboardService:
+    return LeaderboardService(
+        db,
+        request.app.state.click_buffer,
+        cache=getattr(request.app.state, "leaderboard_cache", None),
+        cache_ttl=get_settings().click_leaderboard_cache_ttl,
+    )
+
+def get_url_service(request: Request, db: AsyncSession = Depends(get_db)) -> URLService:
+    return URLService(
+        db,
+        key_pool=getattr(request.app.state, "key_pool", None),
+        key_generator=getattr(request.app.state, "key_generator", None),
+        key_space=getattr(request.app.state, "key_space", None),
+        **_lookup_accelerators(request),
+    )
+
+async def get_lazy_url_service(
+    request: Request,
+    session_factory: Callable[[], AsyncSession] = Depends(get_session_factory),
+):
+    """URLService whose session is only opened if a query actually runs.
+
+    The redirect path is answered from cache most of the time; with
+    get_url_service every one of those requests would still build (and tear
+    down) an AsyncSession it never uses.
+    """
+    service = URLService(session_factory=session_factory, **_lookup_accelerators(request))
+    try:
+        yield service
+    finally:
+        await service.close()
 
 # Rate limiters
-create_rate_limiter = RateLimiter(max_requests=get_settings().rate_limit_create)
-read_rate_limiter = RateLimiter(max_requests=get_settings().rate_limit_read)
+create_rate_limiter = RateLimiter(
+    max_requests=get_settings().rate_limit_create,
+    algorithm=get_settings().rate_limit_create_algorithm,
+    local_quota=get_settings().rate_limit_create_local_quota,
+)
+read_rate_limiter = RateLimiter(
+    max_requests=get_settings().rate_limit_read,
+    algorithm=get_settings().rate_limit_read_algorithm,
+    local_quota=get_settings().rate_limit_read_local_quota,
+)
 
 def raise_bad_request(message):
     raise HTTPException(status_code=400, detail=message)
@@ -93,6 +493,18 @@ def raise_not_found(request):
     message = f"URL '{request.url}' doesn't exist"
     raise HTTPException(status_code=404, detail=message)
 
+def require_admin_token(request: Request):
+    """Site-wide admin endpoints need `Authorization: Bearer <ADMIN_TOKEN>`;
+    without an ADMIN_TOKEN they don't exist."""
+    token = get_settings().admin_token
+    if not token:
+        raise_not_found(request)
+    supplied = request.headers.get("authorization", "")
+    if not secrets.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(
+            status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"}
+        )
+
 
 @app.get("/")
 def read_root():
@@ -100,7 +512,9 @@ def read_root():
     return {"message": "Welcome to the URL shortener API"}
 
 
-def get_admin_info(db_url: models.URL, buffered_clicks: int = 0) -> schemas.URLInfo:
+def get_admin_info(
+    db_url: models.URL, buffered_clicks: int = 0, live_visitors: int = 0
+) -> schemas.URLInfo:
     base_url = URL(get_settings().base_url)
     admin_endpoint = app.url_path_for(
         "admin info", secret_key=db_url.secret_key
@@ -109,6 +523,8 @@ def get_admin_info(db_url: models.URL, buffered_clicks: int = 0) -> schemas.URLI
         target_url=db_url.target_url,
         is_active=db_url.is_active,
         clicks=db_url.clicks + buffered_clicks,
+        # The live sketch already includes the persisted one, unless Redis lost it
+        unique_visitors=max(db_url.unique_visitors or 0, live_visitors),
         url=str(base_url.replace(path=db_url.key)),
         admin_url=str(base_url.replace(path=admin_endpoint))
     )
@@ -123,20 +539,130 @@ async def create_url(request: Request, url: schemas.URLBase, service: URLService
     return get_admin_info(db_url)
 
 
+def _max_batch_size() -> int:
+    """URL_BATCH_MAX_SIZE, capped by the create limit a batch counts against."""
+    if not get_settings().rate_limit_enabled:
+        return get_settings().url_batch_max_size
+    return min(get_settings().url_batch_max_size, create_rate_limiter.max_requests)
+
+
+@app.post("/urls/batch", response_model=list[schemas.URLInfo])
+async def create_urls(
+    request: Request, batch: schemas.URLBatch, service: URLService = Depends(get_url_service)
+):
+    """Create many URLs in one multi-row INSERT. Results are in input order.
+    Each URL counts against the same create limit as POST /url."""
+    if not batch.target_urls:
+        raise_bad_request("No URLs given")
+    if len(batch.target_urls) > _max_batch_size():
+        # Checked before the limiter: a batch the limit can never admit must
+        # not spend the client's window on its way to a 429.
+        raise_bad_request(f"At most {_max_batch_size()} URLs per batch")
+    await create_rate_limiter.check_rate_limit(
+        request, cost=len(batch.target_urls), path=app.url_path_for("create_url")
+    )
+    for index, target_url in enumerate(batch.target_urls):
+        if not validators.url(target_url):
+            raise_bad_request(f"URL {index} is not valid")
+    return [get_admin_info(db_url) for db_url in await service.create_many(batch.target_urls)]
+
+
 @app.get("/{url_key}")
 async def forward_to_target_url(
         url_key: str,
         request: Request,
-        service: URLService = Depends(get_url_service)
+        service: URLService = Depends(get_lazy_url_service)
     ):
     _validate_url_key(url_key)
-    await read_rate_limiter.check_rate_limit(request)
-    db_url = await service.get_by_key(url_key)
-    if db_url:
-        await request.app.state.click_buffer.increment(db_url.id)
-        return RedirectResponse(db_url.target_url)
+    click_buffer = request.app.state.click_buffer
+    # A process-cache hit costs no I/O, so its rate check and click share one
+    # Redis round trip. Anything else is rate checked before the Redis/SQL
+    # lookup: an over-limit client, e.g. a scanner trying unknown keys, must
+    # get its 429 without a query.
+    cached_url = service.get_by_key_local(url_key)
+    if cached_url is not None and cached_url.is_active:
+        await read_rate_limiter.check_rate_limit_and_count_click(request, click_buffer, cached_url.id)
     else:
-        raise_not_found(request)
+        await read_rate_limiter.check_rate_limit(request)
+        if cached_url is None:
+            cached_url = await service.get_by_key_cached(url_key, check_local=False)
+        if cached_url is None or not cached_url.is_active:
+            raise_not_found(request)
+        await click_buffer.increment(cached_url.id, visitor=request.client.host)
+    click_events = getattr(request.app.state, "click_events", None)
+    if click_events is not None:
+        # Never blocks; enrichment and the INSERT happen in the worker
+        click_events.offer(
+            cached_url.id, request.headers.get("referer"), request.headers.get("user-agent")
+        )
+    return RedirectResponse(cached_url.target_url)
+
+
+@app.get("/admin/metrics", dependencies=[Depends(require_admin_token)])
+async def get_metrics(request: Request):
+    """Process-local counters for capacity planning. Declared before
+    /admin/{secret_key}; secret keys are uppercase, so they never collide."""
+    url_cache = getattr(request.app.state, "url_cache", None)
+    shared_url_cache = getattr(request.app.state, "shared_url_cache", None)
+    bloom_filter = getattr(request.app.state, "bloom_filter", None)
+    url_flights = getattr(request.app.state, "url_flights", None)
+    flush_lease = getattr(request.app.state, "flush_lease", None)
+    flush_scheduler = getattr(request.app.state, "flush_scheduler", None)
+    visitor_sketches = getattr(request.app.state, "visitor_sketches", None)
+    click_events = getattr(request.app.state, "click_events", None)
+    redis_breaker = getattr(request.app.state, "redis_breaker", None)
+    cache_breaker = getattr(request.app.state, "cache_breaker", None)
+    key_pool = getattr(request.app.state, "key_pool", None)
+    key_generator = getattr(request.app.state, "key_generator", None)
+    key_space = getattr(request.app.state, "key_space", None)
+    return {
+        "click_buffer": request.app.state.click_buffer.stats(),
+        "url_cache": url_cache.stats() if url_cache is not None else None,
+        "redis_url_cache": shared_url_cache.stats() if shared_url_cache is not None else None,
+        "bloom_filter": bloom_filter.stats() if bloom_filter is not None else None,
+        "url_lookup_singleflight": url_flights.stats() if url_flights is not None else None,
+        "click_flush_lease": flush_lease.stats() if flush_lease is not None else None,
+        "click_flush_scheduler": flush_scheduler.stats() if flush_scheduler is not None else None,
+        "visitor_sketches": visitor_sketches.stats() if visitor_sketches is not None else None,
+        "click_events": click_events.stats() if click_events is not None else None,
+        "redis_breaker": redis_breaker.stats() if redis_breaker is not None else None,
+        "redis_cache_breaker": cache_breaker.stats() if cache_breaker is not None else None,
+        "key_pool": key_pool.stats() if key_pool is not None else None,
+        "key_generator": key_generator.stats() if key_generator is not None else None,
+        "key_space": key_space.stats() if key_space is not None else None,
+        "rate_limiters": {
+            "create": create_rate_limiter.stats(),
+            "read": read_rate_limiter.stats(),
+        },
+    }
+
+
+@app.get(
+    "/admin/leaderboard",
+    response_model=schemas.Leaderboard,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_leaderboard(
+    n: int = Query(10, ge=1),
+    scope: str = "live",
+    leaderboard: LeaderboardService = Depends(get_leaderboard_service),
+):
+    """Most clicked URLs. "live" adds still-buffered clicks to the flushed
+    totals; "all-time" is flushed totals only. Declared before /admin/{secret_key}."""
+    if scope not in SCOPES:
+        raise_bad_request(f"scope must be one of: {', '.join(SCOPES)}")
+    if n > get_settings().click_leaderboard_size:
+        raise_bad_request(f"n must be at most {get_settings().click_leaderboard_size}")
+    base_url = URL(get_settings().base_url)
+    return schemas.Leaderboard(
+        scope=scope,
+        entries=[
+            schemas.LeaderboardEntry(
+                url=str(base_url.replace(path=key)), target_url=target_url, clicks=clicks
+            )
+            for key, target_url, clicks in await leaderboard.top(n, scope)
+        ],
+    )
 
 
 @app.get(
@@ -150,11 +676,63 @@ async def get_url_info(
     _validate_secret_key(secret_key)
     if db_url := await service.get_by_secret_key(secret_key):
         buffered = await request.app.state.click_buffer.get_count(db_url.id)
-        return get_admin_info(db_url, buffered_clicks=buffered)
+        visitors = getattr(request.app.state, "visitor_sketches", None)
+        live_visitors = await visitors.count(db_url.id) if visitors is not None else 0
+        return get_admin_info(db_url, buffered_clicks=buffered, live_visitors=live_visitors)
     else:
         raise_not_found(request)
 
 
+# Most points a single timeseries request may return
+_MAX_TIMESERIES_POINTS = 10_000
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+@app.get("/admin/{secret_key}/timeseries", response_model=schemas.ClickTimeseries)
+async def get_url_timeseries(
+    secret_key: str,
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "hour",
+    service: URLService = Depends(get_url_service),
+    rollups: ClickRollupService = Depends(get_rollup_service),
+):
+    """Flushed clicks per time bucket over [start, end), from the rollup table.
+    Defaults to the last 24 hours by hour; times are UTC. resolution=minute
+    needs the stream backend: the zset backend files each flush batch under
+    its handoff minute, so its minutes lump up to two minutes together."""
+    _validate_secret_key(secret_key)
+    if resolution not in RESOLUTIONS:
+        raise_bad_request(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+    if resolution == "minute" and get_settings().click_buffer_backend != "stream":
+        raise_bad_request("resolution=minute needs CLICK_BUFFER_BACKEND=stream")
+    end = _naive_utc(end) if end else datetime.now(timezone.utc).replace(tzinfo=None)
+    start = _naive_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise_bad_request("start must be before end")
+    if (end - start) / RESOLUTIONS[resolution] > _MAX_TIMESERIES_POINTS:
+        raise_bad_request("Range too large for this resolution; use a coarser one")
+    db_url = await service.get_by_secret_key(secret_key)
+    if db_url is None:
+        raise_not_found(request)
+    points = await rollups.timeseries(db_url.id, start, end, resolution)
+    return schemas.ClickTimeseries(
+        start=start,
+        end=end,
+        resolution=resolution,
+        buckets=[
+            schemas.ClickBucket(bucket_start=bucket, resolution=res, clicks=clicks)
+            for bucket, res, clicks in points
+        ],
+    )
+
+
 @app.delete("/admin/{secret_key}")
 async def delete_url(
     secret_key: str, request: Request, service: URLService = Depends(get_url_service)
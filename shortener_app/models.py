@@ -1,4 +1,8 @@
-from sqlalchemy import Boolean, Integer, String
+from datetime import datetime
+
+from typing import Optional
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, LargeBinary, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from shortener_app.database import Base
@@ -11,4 +15,78 @@ class URL(Base):
     secret_key: Mapped[str] = mapped_column(String, unique=True, index=True)
     target_url: Mapped[str] = mapped_column(String, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
-    clicks: Mapped[int] = mapped_column(Integer, default=0)
\ No newline at end of file
+    clicks: Mapped[int] = mapped_column(Integer, default=0)
+    # Last persisted HyperLogLog estimate (see VisitorSketches)
+    unique_visitors: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class URLVisitorSketch(Base):
+    """Persisted copy of a URL's unique-visitor HyperLogLog (raw Redis bytes, <= 12 KB)."""
+    __tablename__ = "url_visitor_sketches"
+
+    url_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sketch: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class FlushCheckpoint(Base):
+    """How far the click drain of one flushing key has got.
+
+    Written in the same transaction as each chunk of click deltas, so after a
+    crash the drain resumes exactly where the last commit left off.
+    Advancing it is conditional on (position, fence_token), so two flushers can
+    never both apply the same chunk.
+    """
+    __tablename__ = "click_flush_checkpoints"
+
+    flush_key: Mapped[str] = mapped_column(String, primary_key=True)
+    batch_id: Mapped[str] = mapped_column(String)
+    position: Mapped[int] = mapped_column(Integer, default=0)
+    # Fencing token of the flusher that last advanced it; older tokens are refused.
+    fence_token: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ClickRollup(Base):
+    """Clicks per URL per time bucket, written by the click flush.
+
+    Buckets start as minutes and are compacted into hours, then days, as they
+    age (see ClickRollupService.compact). bucket_start is naive UTC.
+    """
+    __tablename__ = "click_rollups"
+
+    url_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    resolution: Mapped[str] = mapped_column(String, primary_key=True)  # minute / hour / day
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    clicks: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class TopURL(Base):
+    """The most clicked URLs and their flushed totals, kept by the click flush.
+
+    A materialized top-K of urls.clicks (K = click_leaderboard_size, with some
+    slack between trims), so the leaderboard never sorts the urls table.
+    """
+    __tablename__ = "top_urls"
+
+    url_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    clicks: Mapped[int] = mapped_column(Integer, index=True)
+
+
+class ClickEvent(Base):
+    """One redirect, with the request details analytics want. Written in
+    batches by ClickEventQueue, off the redirect path.
+
+    On PostgreSQL the table is range-partitioned by day on occurred_at (which
+    is why it is part of the key), and old days are dropped whole; see
+    rotate_click_events. occurred_at is naive UTC.
+    """
+    __tablename__ = "click_events"
+    __table_args__ = (
+        Index("ix_click_events_url_id_occurred_at", "url_id", "occurred_at"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+    occurred_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    url_id: Mapped[int] = mapped_column(Integer)
+    referrer: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    user_agent_class: Mapped[str] = mapped_column(String)  # bot / tablet / mobile / desktop / unknown
@@ -1,14 +1,40 @@
+from datetime import datetime
+
 from pydantic import BaseModel, ConfigDict
 
 class URLBase(BaseModel):
     target_url: str
 
+class URLBatch(BaseModel):
+    target_urls: list[str]
+
 class URLInDB(URLBase):
     model_config = ConfigDict(from_attributes=True)
 
     is_active: bool
     clicks: int
+    unique_visitors: int = 0  # HyperLogLog estimate, ~0.81% standard error
 
 class URLInfo(URLInDB):
     url: str
-    admin_url: str
\ No newline at end of file
+    admin_url: str
+
+class ClickBucket(BaseModel):
+    bucket_start: datetime
+    resolution: str
+    clicks: int
+
+class ClickTimeseries(BaseModel):
+    start: datetime
+    end: datetime
+    resolution: str
+    buckets: list[ClickBucket]
+
+class LeaderboardEntry(BaseModel):
+    url: str
+    target_url: str
+    clicks: int
+
+class Leaderboard(BaseModel):
+    scope: str
+    entries: list[LeaderboardEntry]
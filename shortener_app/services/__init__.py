@@ -1,3 +1,5 @@
 from shortener_app.services.url_service import URLService
+from shortener_app.services.rollup_service import ClickRollupService
+from shortener_app.services.leaderboard_service import LeaderboardService
 
-__all__ = ["URLService"]
+__all__ = ["URLService", "ClickRollupService", "LeaderboardService"]
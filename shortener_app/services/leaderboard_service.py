@@ -0,0 +1,83 @@
+import time
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import ClickBuffer
+
+SCOPES = ("live", "all-time")
+
+
+class LeaderboardService:
+    """Top-N URLs by clicks, without sorting the urls table.
+
+    - "all-time": flushed totals, read from top_urls, which every click flush
+      keeps current. No Redis round trip.
+    - "live": flushed totals plus what is still buffered. Candidates are the
+      top N of top_urls and the top N buffered deltas (ClickBuffer.get_top_n);
+      their buffered counts come from one pipelined get_counts. A URL outside
+      both lists would need a large flushed total *and* a large unflushed delta
+      to place, which a flush interval rarely allows, so this is exact in
+      practice, not by construction.
+    Either way the ids resolve to key and target in one IN query, with
+    deactivated URLs dropped.
+
+    Results are cached for cache_ttl seconds in `cache`, a dict shared across
+    requests (app.state.leaderboard_cache), so polling dashboards cost one
+    computation per TTL per worker. Without one, nothing is cached.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        click_buffer: ClickBuffer,
+        cache: Optional[dict] = None,
+        cache_ttl: float = 5.0,
+    ):
+        self.db = db
+        self.click_buffer = click_buffer
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+
+    async def top(self, n: int, scope: str = "live") -> list[tuple[str, str, int]]:
+        """(key, target_url, clicks) of the n most clicked active URLs."""
+        if self.cache is not None:
+            cached = self.cache.get((scope, n))
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+        entries = await (self._live(n) if scope == "live" else self._all_time(n))
+        if self.cache is not None:
+            self.cache[scope, n] = (time.monotonic() + self.cache_ttl, entries)
+        return entries
+
+    async def _all_time(self, n: int) -> list[tuple[str, str, int]]:
+        result = await self.db.execute(
+            select(models.URL.key, models.URL.target_url, models.TopURL.clicks)
+            .join(models.URL, models.URL.id == models.TopURL.url_id)
+            .where(models.URL.is_active)
+            .order_by(models.TopURL.clicks.desc())
+            .limit(n)
+        )
+        return [tuple(row) for row in result]
+
+    async def _live(self, n: int) -> list[tuple[str, str, int]]:
+        flushed = await self.db.execute(
+            select(models.TopURL.url_id).order_by(models.TopURL.clicks.desc()).limit(n)
+        )
+        buffered = await self.click_buffer.get_top_n(n)
+        candidates = set(flushed.scalars()) | {int(url_id) for url_id, _ in buffered}
+        if not candidates:
+            return []
+        deltas = await self.click_buffer.get_counts(candidates)
+        result = await self.db.execute(
+            select(models.URL.id, models.URL.key, models.URL.target_url, models.URL.clicks)
+            .where(models.URL.id.in_(candidates), models.URL.is_active)
+        )
+        entries = [
+            (key, target_url, clicks + deltas.get(url_id, 0))
+            for url_id, key, target_url, clicks in result
+        ]
+        entries.sort(key=lambda entry: entry[2], reverse=True)
+        return entries[:n]
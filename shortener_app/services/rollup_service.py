@@ -0,0 +1,100 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import upsert_rollups
+
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def truncate(moment: datetime, resolution: str) -> datetime:
+    """Start of the bucket containing moment."""
+    moment = moment.replace(second=0, microsecond=0)
+    if resolution in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if resolution == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _coarser(a: str, b: str) -> str:
+    return a if RESOLUTIONS[a] >= RESOLUTIONS[b] else b
+
+
+class ClickRollupService:
+    """Reads and compacts click_rollups, which the click flush writes in minute buckets."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def timeseries(
+        self, url_id: int, start: datetime, end: datetime, resolution: str = "hour"
+    ) -> list[tuple[datetime, str, int]]:
+        """(bucket_start, resolution, clicks) for buckets overlapping [start, end).
+
+        Rows are summed up to the requested resolution. Older data may have
+        been compacted past it; those points keep their coarser resolution.
+        """
+        result = await self.db.execute(
+            select(models.ClickRollup).where(
+                models.ClickRollup.url_id == url_id,
+                # A day bucket starting before `start` can still overlap it
+                models.ClickRollup.bucket_start >= truncate(start, "day"),
+                models.ClickRollup.bucket_start < end,
+            )
+        )
+        totals: Counter[tuple[datetime, str]] = Counter()
+        for row in result.scalars():
+            point_resolution = _coarser(resolution, row.resolution)
+            bucket = truncate(row.bucket_start, point_resolution)
+            if bucket + RESOLUTIONS[point_resolution] > start:
+                totals[bucket, point_resolution] += row.clicks
+        return sorted((bucket, res, clicks) for (bucket, res), clicks in totals.items())
+
+    async def compact(
+        self, now: datetime, minute_retention: timedelta, hour_retention: timedelta
+    ) -> dict:
+        """Fold minute buckets older than minute_retention into hours, and hour
+        buckets older than hour_retention into days. Returns rows folded per step."""
+        return {
+            "minute_to_hour": await self._roll_up("minute", "hour", now - minute_retention),
+            "hour_to_day": await self._roll_up("hour", "day", now - hour_retention),
+        }
+
+    async def _roll_up(self, source: str, target: str, older_than: datetime) -> int:
+        # Only whole target buckets, so an hour is never half minutes, half hour row.
+        cutoff = truncate(older_than, target)
+        # DELETE ... RETURNING, then upsert, in one transaction: a concurrent
+        # compaction blocks on the same rows and then finds them gone, so no
+        # bucket is folded twice.
+        result = await self.db.execute(
+            delete(models.ClickRollup)
+            .where(
+                models.ClickRollup.resolution == source,
+                models.ClickRollup.bucket_start < cutoff,
+            )
+            .returning(
+                models.ClickRollup.url_id,
+                models.ClickRollup.bucket_start,
+                models.ClickRollup.clicks,
+            )
+        )
+        folded = 0
+        totals: Counter[tuple[int, datetime]] = Counter()
+        for url_id, bucket_start, clicks in result:
+            totals[url_id, truncate(bucket_start, target)] += clicks
+            folded += 1
+        await upsert_rollups(
+            self.db,
+            [(url_id, bucket, clicks) for (url_id, bucket), clicks in totals.items()],
+            resolution=target,
+        )
+        await self.db.commit()
+        return folded
@@ -1,16 +1,65 @@
 import asyncio
-from typing import Optional
+from typing import Callable, Optional
 
 from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from shortener_app import keygen, models
+from shortener_app.infrastructure.bloom_filter import BloomFilter
+from shortener_app.infrastructure.key_blocks import FeistelKeyGenerator
+from shortener_app.infrastructure.key_pool import KeyPool
+from shortener_app.infrastructure.key_space import KeySpaceMonitor
+from shortener_app.infrastructure.singleflight import SingleFlight
+from shortener_app.infrastructure.url_cache import CachedURL, URLCache, RedisURLCache
 
 
 class URLService:
-    def __init__(self, db: AsyncSession):
-        self.db = db
+    def __init__(
+        self,
+        db: Optional[AsyncSession] = None,
+        cache: Optional[URLCache] = None,
+        shared_cache: Optional[RedisURLCache] = None,
+        bloom: Optional[BloomFilter] = None,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        flights: Optional[SingleFlight] = None,
+        key_pool: Optional[KeyPool] = None,
+        key_generator: Optional[FeistelKeyGenerator] = None,
+        key_space: Optional[KeySpaceMonitor] = None,
+    ):
+        if db is None and session_factory is None:
+            raise ValueError("URLService needs a session or a session_factory")
+        self._db = db
+        self._session_factory = session_factory
+        self.cache = cache
+        self.shared_cache = shared_cache
+        self.bloom = bloom
+        self.flights = flights
+        self.key_pool = key_pool
+        self.key_generator = key_generator
+        self.key_space = key_space
+
+    @property
+    def db(self) -> AsyncSession:
+        """The session, opened on first use when built with a session_factory.
+
+        Lets the redirect path skip session setup entirely when the answer
+        comes from a cache tier or the Bloom filter.
+        """
+        if self._db is None:
+            self._db = self._session_factory()
+        return self._db
+
+    @property
+    def has_session(self) -> bool:
+        return self._db is not None
+
+    async def close(self):
+        """Close the session if this service opened it lazily."""
+        if self._session_factory is not None and self._db is not None:
+            await self._db.close()
+            self._db = None
 
     async def get_by_key(self, key: str, active_only: bool = True) -> Optional[models.URL]:
         stmt = select(models.URL).where(models.URL.key == key)
@@ -19,6 +68,54 @@ class URLService:
         result = await self.db.execute(stmt)
         return result.scalars().first()
 
+    def get_by_key_local(self, key: str) -> Optional[CachedURL]:
+        """Process cache only, no I/O. Returns inactive records too; None on a miss."""
+        return self.cache.get(key) if self.cache is not None else None
+
+    async def get_by_key_cached(self, key: str, check_local: bool = True) -> Optional[CachedURL]:
+        """Read-through lookup for the redirect path: process cache → Redis → SQL.
+
+        Inactive rows are cached too (is_active=False), so a deactivated key keeps
+        returning 404 without a query. Unknown keys are not cached: the key space is
+        huge and caching misses would let a scanner evict every real entry. Instead,
+        the Bloom filter answers "never issued" for them before any lookup.
+        check_local=False skips the process cache for a caller that just missed it.
+        """
+        if check_local and (record := self.get_by_key_local(key)) is not None:
+            return record if record.is_active else None
+        if self.bloom is not None and not await self.bloom.might_contain(key):
+            return None
+
+        if self.flights is None:
+            record = await self._load_record(key)
+        else:
+            record = await self.flights.do(key, lambda: self._load_record(key))
+        return record if record is not None and record.is_active else None
+
+    async def _load_record(self, key: str) -> Optional[CachedURL]:
+        """Cache-miss path: Redis tier → SQL, then fill both cache tiers."""
+        generation = self.cache.generation if self.cache is not None else None
+        record = None
+        if self.shared_cache is not None:
+            record = await self.shared_cache.get(key)
+        if record is None:
+            if self.flights is not None and self._session_factory is not None:
+                # Shared by every coalesced waiter, so it must not borrow this
+                # request's session: if this request is cancelled, its session
+                # is closed while the other waiters are still on the query.
+                async with self._session_factory() as db:
+                    db_url = await URLService(db).get_by_key(key, active_only=False)
+            else:
+                db_url = await self.get_by_key(key, active_only=False)
+            if db_url is None:
+                return None
+            record = CachedURL(db_url.id, db_url.target_url, db_url.is_active)
+            if self.shared_cache is not None:
+                await self.shared_cache.fill(key, record)
+        if self.cache is not None:
+            self.cache.set(key, record, generation)
+        return record
+
     async def get_by_key_with_lock(self, key: str, active_only: bool = True) -> Optional[models.URL]:
         """SELECT FOR UPDATE locks the row to prevent concurrent modifications.
 
@@ -46,23 +143,119 @@ class URLService:
         Avoids TOCTOU race: checking if key exists, then inserting it, leaves a gap
         where another request can insert the same key. Instead, we try to insert
         and catch IntegrityError, retrying with exponential backoff on collision.
+
+        With a key pool, the first attempt takes a pre-validated key from it,
+        which almost never collides; an empty pool or a collision falls back
+        to random keys. With a key generator, every attempt takes its next
+        key, which collides only with keys issued before it was enabled, so
+        there is no backoff.
+
+        With a key space monitor, random keys use its current length, and
+        every create reports its attempts to it.
         """
         for attempt in range(max_retries):
             try:
-                key = keygen.generate_random_key(size=6)
+                key = await self._next_key(attempt)
                 secret_key = f"{key}_{keygen.generate_random_key(size=8)}"
                 db_url = models.URL(target_url=target_url, key=key, secret_key=secret_key)
                 self.db.add(db_url)
                 await self.db.commit()
                 await self.db.refresh(db_url)
+                if self.bloom is not None:
+                    await self.bloom.add(key)
+                if self.shared_cache is not None:
+                    await self.shared_cache.warm(
+                        key, CachedURL(db_url.id, db_url.target_url, db_url.is_active)
+                    )
+                if self.key_space is not None:
+                    self.key_space.record(len(key), attempt + 1)
                 return db_url
             except IntegrityError:
                 await self.db.rollback()
                 if attempt == max_retries - 1:
+                    if self.key_space is not None:
+                        self.key_space.record(len(key), max_retries, succeeded=False)
                     raise ValueError("Failed to generate unique key after retries")
-                await asyncio.sleep(0.01 * (2 ** attempt))  # exponential backoff
+                if self.key_generator is None:
+                    await asyncio.sleep(0.01 * (2 ** attempt))  # exponential backoff
         raise RuntimeError("Failed to generate unique key")
 
+    async def _next_key(self, attempt: int) -> str:
+        key = None
+        if self.key_generator is not None:
+            key = await self.key_generator.next_key()
+        elif attempt == 0 and self.key_pool is not None:
+            key = await self.key_pool.take()
+        if key is not None:
+            return key
+        return keygen.generate_random_key(
+            size=self.key_space.size if self.key_space is not None else 6
+        )
+
+    async def create_many(self, target_urls: list[str], max_retries: int = 5) -> list[models.URL]:
+        """create() for many URLs: one multi-row INSERT per round, one commit.
+
+        Every pending row gets a key, and INSERT ... ON CONFLICT DO NOTHING
+        RETURNING reports which ones went in. Rows whose key (or secret)
+        collided, with a stored URL or with another row of the batch, simply
+        aren't returned; only they get new keys in the next round. A conflict
+        doesn't abort the transaction, so the batch commits once. Results are
+        in input order.
+        """
+        dialect = postgresql if self.db.get_bind().dialect.name == "postgresql" else sqlite
+        created: list[Optional[models.URL]] = [None] * len(target_urls)
+        pending = list(range(len(target_urls)))
+        attempts = [0] * len(target_urls)
+        for attempt in range(max_retries):
+            keys = await self._next_keys(len(pending), attempt)
+            suffixes = keygen.generate_keys(len(pending), 8)
+            by_key: dict[str, int] = {}
+            rows = []
+            for index, key, suffix in zip(pending, keys, suffixes):
+                attempts[index] += 1
+                if key in by_key:
+                    continue  # same key twice in one round: only the first can win
+                by_key[key] = index
+                rows.append(
+                    {"target_url": target_urls[index], "key": key, "secret_key": f"{key}_{suffix}"}
+                )
+            result = await self.db.scalars(
+                dialect.insert(models.URL).values(rows).on_conflict_do_nothing()
+                .returning(models.URL)
+            )
+            for db_url in result.all():
+                created[by_key[db_url.key]] = db_url
+            pending = [index for index in pending if created[index] is None]
+            if not pending:
+                break
+        if pending:
+            await self.db.rollback()
+            if self.key_space is not None:
+                self.key_space.record(len(keys[0]), max_retries, succeeded=False)
+            raise ValueError("Failed to generate unique keys after retries")
+        await self.db.commit()
+        for index, db_url in enumerate(created):
+            if self.bloom is not None:
+                await self.bloom.add(db_url.key)
+            if self.shared_cache is not None:
+                await self.shared_cache.warm(
+                    db_url.key, CachedURL(db_url.id, db_url.target_url, db_url.is_active)
+                )
+            if self.key_space is not None:
+                self.key_space.record(len(db_url.key), attempts[index])
+        return created
+
+    async def _next_keys(self, count: int, attempt: int) -> list[str]:
+        """_next_key for count rows at once."""
+        keys: list[str] = []
+        if self.key_generator is not None:
+            while len(keys) < count and (key := await self.key_generator.next_key()) is not None:
+                keys.append(key)
+        elif attempt == 0 and self.key_pool is not None:
+            keys = await self.key_pool.take_many(count)
+        size = self.key_space.size if self.key_space is not None else 6
+        return keys + keygen.generate_keys(count - len(keys), size)
+
     async def increment_clicks(self, url_id: int) -> models.URL:
         """Atomic SQL increment prevents lost updates.
 
@@ -85,4 +278,12 @@ class URLService:
             db_url.is_active = False
             await self.db.commit()
             await self.db.refresh(db_url)
+            # Shared tier first: a worker that evicts on the invalidation below
+            # must not re-warm itself from a still-active Redis entry.
+            if self.shared_cache is not None:
+                await self.shared_cache.set(
+                    db_url.key, CachedURL(db_url.id, db_url.target_url, False)
+                )
+            if self.cache is not None:
+                await self.cache.invalidate(db_url.key)
         return db_url
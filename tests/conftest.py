@@ -1,24 +1,115 @@
+import asyncio
+import math
+import time
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from typing import Callable
 
-from shortener_app.main import app, get_db
+from shortener_app.main import app, get_db, get_session_factory
 from shortener_app.database import Base
-from shortener_app.infrastructure import ClickBuffer
+from shortener_app.infrastructure import ClickBuffer, SingleFlight, URLCache
+from shortener_app.infrastructure import click_buffer, click_stream, leader_lease, rate_limiter, url_cache
+
+
+class FakePubSub:
+    """In-memory stand-in for redis.asyncio.client.PubSub, fed by FakeRedis.publish."""
+
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.channels: set[str] = set()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.channels.add(channel)
+            self._redis._subscribers.setdefault(channel, []).append(self)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or tuple(self.channels):
+            self.channels.discard(channel)
+            subscribers = self._redis._subscribers.get(channel, [])
+            if self in subscribers:
+                subscribers.remove(self)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self):
+        await self.unsubscribe()
+
+
+class FakePipeline:
+    """Queues FakeRedis calls and runs them in order on execute(), like MULTI/EXEC."""
+
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        return [await method(*args, **kwargs) for method, args, kwargs in calls]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._calls = []
+
+
+def _stream_id(entry_id: str) -> tuple[int, int]:
+    ms, seq = entry_id.split("-")
+    return int(ms), int(seq)
 
 
 class FakeRedis:
-    """Minimal stateful Redis fake. Implements only the subset used by RateLimiter and ClickBuffer."""
+    """Minimal stateful Redis fake. Implements only the subset used by the infrastructure layer.
+
+    Lua scripts can't run here; register_script() returns a Python emulation
+    looked up in SCRIPT_EMULATIONS by the script's source text.
+    """
 
     def __init__(self):
         self._strings: dict[str, str] = {}
         self._zsets: dict[str, dict[str, float]] = {}
+        self._hashes: dict[str, dict[str, str]] = {}
+        self._bitmaps: dict[str, bytearray] = {}
+        self._streams: dict[str, list[tuple[str, dict]]] = {}
+        self._sets: dict[str, set[str]] = {}
+        # HyperLogLogs are emulated as exact sets; get() serializes them to bytes
+        self._hlls: dict[str, set[str]] = {}
+        # (stream, group) → {"last": int, "pel": {id: [consumer, delivered_at]}, "seen": {consumer: t}}
+        self._groups: dict[tuple[str, str], dict] = {}
+        self._last_stream_id = (0, 0)
+        self._subscribers: dict[str, list[FakePubSub]] = {}
+
+    def _all_keyspaces(self):
+        return (self._strings, self._zsets, self._hashes, self._bitmaps, self._streams,
+                self._sets, self._hlls)
+
+    async def get(self, key: str):
+        if key in self._hlls:
+            return "\n".join(sorted(self._hlls[key])).encode()
+        return self._strings.get(key)
 
     # Rate-limiter methods are no-ops so general tests never hit a rate limit.
     # Rate limiting behaviour is tested separately in test_rate_limit.py.
-    async def get(self, key: str):
-        return None
+
+    async def time(self) -> tuple[int, int]:
+        """Server clock as (seconds, microseconds), like TIME. Tests may replace it."""
+        seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+        return seconds, nanos // 1000
 
     async def setex(self, key: str, ttl: int, value):
         pass
@@ -26,11 +117,19 @@ class FakeRedis:
     async def incr(self, key: str) -> int:
         return 1
 
+    async def incrby(self, key: str, amount: int) -> int:
+        value = int(self._strings.get(key, 0)) + amount
+        self._strings[key] = str(value)
+        return value
+
     async def zincrby(self, key: str, amount: float, member) -> float:
         zset = self._zsets.setdefault(key, {})
         zset[str(member)] = zset.get(str(member), 0.0) + float(amount)
         return zset[str(member)]
 
+    async def zcard(self, key: str) -> int:
+        return len(self._zsets.get(key, {}))
+
     async def zscore(self, key: str, member):
         return self._zsets.get(key, {}).get(str(member))
 
@@ -47,29 +146,354 @@ class FakeRedis:
         items = items[start:] if end == -1 else items[start:end + 1]
         return items if withscores else [k for k, _ in items]
 
+    async def set(self, key: str, value, nx: bool = False, **kwargs):
+        if nx and await self.exists(key):
+            return None
+        if isinstance(value, bytes):
+            self._bitmaps[key] = bytearray(value)
+        else:
+            self._strings[key] = str(value)
+        return True
+
+    async def setbit(self, key: str, offset: int, value: int) -> int:
+        bitmap = self._bitmaps.setdefault(key, bytearray())
+        if len(bitmap) <= offset >> 3:
+            bitmap.extend(bytes((offset >> 3) + 1 - len(bitmap)))
+        mask = 0x80 >> (offset & 7)
+        previous = int(bool(bitmap[offset >> 3] & mask))
+        bitmap[offset >> 3] = bitmap[offset >> 3] | mask if value else bitmap[offset >> 3] & ~mask
+        return previous
+
+    async def getbit(self, key: str, offset: int) -> int:
+        bitmap = self._bitmaps.get(key, bytearray())
+        if len(bitmap) <= offset >> 3:
+            return 0
+        return int(bool(bitmap[offset >> 3] & (0x80 >> (offset & 7))))
+
+    async def bitop(self, operation: str, dest: str, *keys: str) -> int:
+        assert operation == "OR", "only BITOP OR is emulated"
+        sources = [self._bitmaps.get(k, bytearray()) for k in keys]
+        result = bytearray(max(len(b) for b in sources))
+        for bitmap in sources:
+            for i, byte in enumerate(bitmap):
+                result[i] |= byte
+        self._bitmaps[dest] = result
+        return len(result)
+
+    async def hgetall(self, key: str) -> dict:
+        return dict(self._hashes.get(key, {}))
+
+    async def hset(self, key: str, field=None, value=None, mapping: dict = None) -> int:
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        hash_ = self._hashes.setdefault(key, {})
+        added = sum(1 for f in fields if f not in hash_)
+        hash_.update({str(f): str(v) for f, v in fields.items()})
+        return added
+
+    async def sadd(self, key: str, *members) -> int:
+        members = {str(m) for m in members}
+        target = self._sets.setdefault(key, set())
+        added = len(members - target)
+        target |= members
+        return added
+
+    async def spop(self, key: str, count: int = None):
+        target = self._sets.get(key, set())
+        popped = [target.pop() for _ in range(min(count or 1, len(target)))]
+        if not target:
+            self._sets.pop(key, None)
+        return popped if count is not None else (popped[0] if popped else None)
+
+    async def scard(self, key: str) -> int:
+        return len(self._sets.get(key, ()))
+
+    async def pfadd(self, key: str, *values) -> int:
+        sketch = self._hlls.setdefault(key, set())
+        before = len(sketch)
+        sketch |= {str(v) for v in values}
+        return int(len(sketch) > before)
+
+    async def pfcount(self, key: str) -> int:
+        return len(self._hlls.get(key, set()))
+
+    async def pfmerge(self, dest: str, *sources: str) -> bool:
+        merged = set()
+        for source in sources:
+            if source in self._hlls:
+                merged |= self._hlls[source]
+            elif source in self._bitmaps:  # sketch bytes restored with SET
+                merged |= set(filter(None, self._bitmaps[source].decode().split("\n")))
+        self._hlls[dest] = merged
+        return True
+
     async def rename(self, src: str, dst: str):
-        if src not in self._zsets and src not in self._strings:
+        if not await self.exists(src):
             raise Exception("ERR no such key")
-        if src in self._zsets:
-            self._zsets[dst] = self._zsets.pop(src)
-        if src in self._strings:
-            self._strings[dst] = self._strings.pop(src)
+        for keyspace in self._all_keyspaces():
+            if src in keyspace:
+                keyspace[dst] = keyspace.pop(src)
+
+    async def renamenx(self, src: str, dst: str) -> bool:
+        if await self.exists(dst):
+            if not await self.exists(src):
+                raise Exception("ERR no such key")
+            return False
+        await self.rename(src, dst)
+        return True
 
     async def exists(self, *keys: str) -> int:
-        return sum(1 for k in keys if k in self._zsets or k in self._strings)
+        return sum(1 for k in keys if any(k in ks for ks in self._all_keyspaces()))
 
     async def expire(self, key: str, seconds: int) -> bool:
         # TTL tracking not needed for tests; just acknowledge the call.
-        return key in self._zsets or key in self._strings
+        return bool(await self.exists(key))
 
     async def delete(self, *keys: str):
         for key in keys:
-            self._zsets.pop(key, None)
-            self._strings.pop(key, None)
+            for keyspace in self._all_keyspaces():
+                keyspace.pop(key, None)
+
+    async def unlink(self, *keys: str):
+        await self.delete(*keys)
+
+    # Streams: ids are "<unix ms>-<seq>" like Redis's, compared via _stream_id().
+
+    async def xadd(self, name: str, fields: dict, maxlen: int = None, approximate: bool = True):
+        now_ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last_stream_id
+        self._last_stream_id = (now_ms, 0) if now_ms > last_ms else (last_ms, last_seq + 1)
+        entry_id = "%d-%d" % self._last_stream_id
+        entries = self._streams.setdefault(name, [])
+        entries.append((entry_id, {str(k): str(v) for k, v in fields.items()}))
+        if maxlen is not None and len(entries) > maxlen:
+            del entries[:len(entries) - maxlen]
+        return entry_id
+
+    async def xlen(self, name: str) -> int:
+        return len(self._streams.get(name, []))
+
+    async def xgroup_create(self, name: str, groupname: str, id: str = "$", mkstream: bool = False):
+        from redis.exceptions import ResponseError
+        if (name, groupname) in self._groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self._streams.setdefault(name, [])
+        self._groups[(name, groupname)] = {"last": (0, 0), "pel": {}, "seen": {}}
+        return True
+
+    def _stream_entry(self, name: str, entry_id: str):
+        return next((fields for i, fields in self._streams.get(name, []) if i == entry_id), None)
+
+    async def xreadgroup(self, groupname: str, consumername: str, streams: dict, count: int = None):
+        (name, start), = streams.items()
+        group = self._groups[(name, groupname)]
+        group["seen"][consumername] = time.monotonic()
+        if start == ">":
+            fresh = [(i, f) for i, f in self._streams.get(name, [])
+                     if _stream_id(i) > group["last"]][:count]
+            if not fresh:
+                return []
+            group["last"] = _stream_id(fresh[-1][0])
+            for entry_id, _ in fresh:
+                group["pel"][entry_id] = [consumername, time.monotonic()]
+            return [[name, fresh]]
+        own = sorted((i for i, (c, _) in group["pel"].items() if c == consumername),
+                     key=_stream_id)[:count]
+        return [[name, [(i, self._stream_entry(name, i)) for i in own]]]
+
+    async def xpending_range(self, name: str, groupname: str, min: str, max: str, count: int,
+                             consumername: str = None):
+        pel = self._groups[(name, groupname)]["pel"]
+        return [
+            {"message_id": i, "consumer": c, "time_since_delivered": 0, "times_delivered": 1}
+            for i, (c, _) in sorted(pel.items(), key=lambda item: _stream_id(item[0]))
+            if consumername is None or c == consumername
+        ][:count]
+
+    async def xclaim(self, name: str, groupname: str, consumername: str, min_idle_time: int,
+                     message_ids: list):
+        group = self._groups[(name, groupname)]
+        group["seen"][consumername] = time.monotonic()
+        claimed = []
+        for entry_id in message_ids:
+            pending = group["pel"].get(entry_id)
+            if pending is None or (time.monotonic() - pending[1]) * 1000 < min_idle_time:
+                continue
+            fields = self._stream_entry(name, entry_id)
+            if fields is None:  # trimmed: Redis 7 drops it from the PEL
+                del group["pel"][entry_id]
+                continue
+            group["pel"][entry_id] = [consumername, time.monotonic()]
+            claimed.append((entry_id, fields))
+        return claimed
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        pel = self._groups[(name, groupname)]["pel"]
+        return sum(1 for i in ids if pel.pop(i, None) is not None)
+
+    async def xinfo_groups(self, name: str) -> list[dict]:
+        return [
+            {
+                "name": group_name,
+                "pending": len(group["pel"]),
+                "lag": sum(1 for i, _ in self._streams.get(name, [])
+                           if _stream_id(i) > group["last"]),
+            }
+            for (stream, group_name), group in self._groups.items() if stream == name
+        ]
+
+    async def xinfo_consumers(self, name: str, groupname: str) -> list[dict]:
+        group = self._groups[(name, groupname)]
+        now = time.monotonic()
+        return [
+            {
+                "name": consumer,
+                "pending": sum(1 for c, _ in group["pel"].values() if c == consumer),
+                "idle": int((now - seen) * 1000),
+            }
+            for consumer, seen in group["seen"].items()
+        ]
+
+    async def xgroup_delconsumer(self, name: str, groupname: str, consumername: str) -> int:
+        group = self._groups[(name, groupname)]
+        group["seen"].pop(consumername, None)
+        dropped = [i for i, (c, _) in group["pel"].items() if c == consumername]
+        for entry_id in dropped:
+            del group["pel"][entry_id]
+        return len(dropped)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def register_script(self, script: str):
+        emulation = SCRIPT_EMULATIONS[script]
+
+        async def run(keys=(), args=(), client=None):
+            return await emulation(self, list(keys), list(args))
+
+        return run
+
+    async def publish(self, channel: str, message) -> int:
+        subscribers = self._subscribers.get(channel, [])
+        for pubsub in subscribers:
+            pubsub._queue.put_nowait({"type": "message", "channel": channel, "data": str(message)})
+        return len(subscribers)
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self)
 
     async def close(self):
         pass
 
+async def _fill_url_cache(redis: FakeRedis, keys, args):
+    if await redis.exists(keys[0]):
+        return 0
+    await redis.hset(keys[0], mapping={"id": args[0], "target": args[1], "active": args[2]})
+    return 1
+
+
+async def _fixed_window_step(redis: FakeRedis, keys, args) -> int:
+    count = await redis.incr(keys[0])
+    if count == 1:
+        await redis.expire(keys[0], int(args[0]))
+    return count
+
+
+async def _gcra_step(redis: FakeRedis, keys, args, cost: int = 1) -> int:
+    seconds, micros = await redis.time()
+    now = seconds * 1_000_000 + micros
+    interval = int(args[0]) * 1_000_000 / int(args[1])
+    tat = max(float(redis._strings.get(keys[0], 0)), now)
+    count = math.ceil((tat + cost * interval - now) / interval)
+    if count <= int(args[1]):
+        redis._strings[keys[0]] = f"{tat + cost * interval:.0f}"
+    return count
+
+
+async def _gcra_script(redis: FakeRedis, keys, args) -> int:
+    return await _gcra_step(redis, keys, args, cost=int(args[2]))
+
+
+async def _claim_quota(redis: FakeRedis, keys, args):
+    # No TTLs here: every claim reports a full window left.
+    used = int(redis._strings.get(keys[0], 0))
+    granted = min(int(args[2]), int(args[1]) - used)
+    if granted > 0:
+        redis._strings[keys[0]] = str(used + granted)
+    return [max(0, granted), int(args[0]) * 1000]
+
+
+LIMITER_STEP_EMULATIONS = {"fixed_window": _fixed_window_step, "gcra": _gcra_step}
+
+
+def _rate_limited_increment(step):
+    async def run(redis: FakeRedis, keys, args):
+        count = await step(redis, keys, args)
+        if count <= int(args[1]):
+            if str(args[3]) == "1":
+                await redis.zincrby(keys[1], 1, args[2])
+            if len(args) > 4 and await redis.pfadd(keys[2], args[4]):
+                await redis.sadd(keys[3], args[2])
+        return count
+    return run
+
+
+def _rate_limited_xadd(step):
+    async def run(redis: FakeRedis, keys, args):
+        count = await step(redis, keys, args)
+        if count <= int(args[1]):
+            if str(args[3]) == "1":
+                await redis.xadd(keys[1], {"u": args[2]}, maxlen=int(args[4]))
+            if len(args) > 5 and await redis.pfadd(keys[2], args[5]):
+                await redis.sadd(keys[3], args[2])
+        return count
+    return run
+
+
+async def _acquire_lease(redis: FakeRedis, keys, args):
+    # No TTLs here: tests simulate expiry by deleting the lease key.
+    holder = redis._strings.get(keys[0])
+    if holder == str(args[0]):
+        return int(redis._strings[keys[1]])
+    if holder is not None:
+        return 0
+    redis._strings[keys[0]] = str(args[0])
+    redis._strings[keys[1]] = str(int(redis._strings.get(keys[1], 0)) + 1)
+    return int(redis._strings[keys[1]])
+
+
+async def _release_lease(redis: FakeRedis, keys, args):
+    if redis._strings.get(keys[0]) == str(args[0]):
+        del redis._strings[keys[0]]
+        return 1
+    return 0
+
+
+async def _unlink_batch(redis: FakeRedis, keys, args):
+    if redis._strings.get(keys[1]) == str(args[0]):
+        await redis.unlink(*keys)
+        return 2
+    return 0
+
+
+SCRIPT_EMULATIONS = {
+    url_cache._FILL_SCRIPT: _fill_url_cache,
+    rate_limiter._GCRA_SCRIPT: _gcra_script,
+    rate_limiter._CLAIM_SCRIPT: _claim_quota,
+    leader_lease._ACQUIRE_SCRIPT: _acquire_lease,
+    leader_lease._RELEASE_SCRIPT: _release_lease,
+    click_buffer._UNLINK_BATCH_SCRIPT: _unlink_batch,
+    **{
+        script: _rate_limited_increment(LIMITER_STEP_EMULATIONS[algorithm])
+        for algorithm, script in click_buffer._RATE_LIMITED_INCREMENT_SCRIPTS.items()
+    },
+    **{
+        script: _rate_limited_xadd(LIMITER_STEP_EMULATIONS[algorithm])
+        for algorithm, script in click_stream._RATE_LIMITED_XADD_SCRIPTS.items()
+    },
+}
+
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 
@@ -106,12 +530,15 @@ async def client(test_db):
     fake_redis = FakeRedis()
     app.state.redis = fake_redis
     app.state.click_buffer = ClickBuffer(fake_redis)
+    app.state.url_cache = URLCache(fake_redis)
+    app.state.url_flights = SingleFlight()
 
     async def override_get_db():
         async with test_db() as session:
             yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: test_db
 
     async with AsyncClient(
         transport=ASGITransport(app=app),
@@ -122,3 +549,14 @@ async def client(test_db):
     app.dependency_overrides.clear()
     del app.state.redis
     del app.state.click_buffer
+    del app.state.url_cache
+    del app.state.url_flights
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Configure an ADMIN_TOKEN and return the headers that present it."""
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "admin_token", "test-admin-token")
+    return {"Authorization": "Bearer test-admin-token"}
+
@@ -0,0 +1,79 @@
+import pytest
+
+from shortener_app.infrastructure.bloom_filter import BloomFilter
+from shortener_app.keygen import generate_random_key
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+def test_sizing_follows_capacity_and_error_rate():
+    """m = -n·ln(p)/ln(2)² ≈ 9.59 bits per key and k ≈ 7 hashes at p = 1%."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    assert bloom.num_bits == 9586
+    assert bloom.num_hashes == 7
+    assert bloom.stats()["memory_bytes"] == 1199
+
+
+@pytest.mark.asyncio
+async def test_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    issued = {generate_random_key() for _ in range(2000)}
+    for key in issued:
+        await bloom.add(key)
+
+    assert all([await bloom.might_contain(key) for key in issued])
+
+    probes = [f"{i:08d}" for i in range(10_000)]  # 8 chars: never issued
+    false_positives = sum([await bloom.might_contain(key) for key in probes])
+    # Expected ~1%; allow generous slack so the test isn't flaky
+    assert false_positives / len(probes) < 0.02
+    assert bloom.stats()["estimated_error_rate"] == pytest.approx(0.01, rel=0.2)
+
+
+@pytest.mark.asyncio
+async def test_mirror_sees_keys_added_by_other_workers():
+    """A key created on another worker is missing from this worker's local bits;
+    the Redis bitmap must still report it, and the bits are learned locally."""
+    redis = FakeRedis()
+    worker_a = BloomFilter(capacity=1000, error_rate=0.01, redis=redis)
+    worker_b = BloomFilter(capacity=1000, error_rate=0.01, redis=redis)
+
+    await worker_a.add("ABC123")
+
+    assert await worker_b.might_contain("ABC123")
+    assert worker_b.stats()["redis_checks"] == 1
+    assert await worker_b.might_contain("ABC123")
+    assert worker_b.stats()["redis_checks"] == 1  # second hit served locally
+
+
+@pytest.mark.asyncio
+async def test_rebuild_loads_existing_keys_and_merges_mirror(test_db):
+    redis = FakeRedis()
+    async with test_db() as db:
+        created = [await URLService(db).create(f"https://example{i}.com") for i in range(5)]
+
+    other_worker = BloomFilter(capacity=1000, error_rate=0.01, redis=redis)
+    await other_worker.add("ZZZ999")  # created elsewhere while we rebuild
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01, redis=redis)
+    async with test_db() as db:
+        await bloom.rebuild(db)
+
+    assert bloom.items == 5
+    for url in created:
+        assert await bloom.might_contain(url.key)
+    assert await BloomFilter(capacity=1000, error_rate=0.01, redis=redis).might_contain("ZZZ999")
+
+
+@pytest.mark.asyncio
+async def test_definite_miss_skips_database(test_db):
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    async with test_db() as db:
+        service = URLService(db, bloom=bloom)
+        created = await service.create("https://example.com")
+
+        assert (await service.get_by_key_cached(created.key)).target_url == "https://example.com"
+
+        service.get_by_key = None  # any database access would now raise
+        assert await service.get_by_key_cached("NOTEXIST") is None
+        assert bloom.stats()["definite_misses"] == 1
@@ -0,0 +1,345 @@
+"""
+Tests for the Redis circuit breaker and the local fallbacks behind it.
+
+FlakyRedis is a FakeRedis that can be taken down (every call raises
+ConnectionError) or made slow (every call sleeps past the call timeout).
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError
+from unittest.mock import MagicMock
+
+from shortener_app.infrastructure import BloomFilter, CachedURL, CircuitBreaker, ClickBuffer, RateLimiter, RedisURLCache
+from shortener_app.infrastructure.circuit_breaker import CircuitOpenError, RedisUnavailableError
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+class FlakyRedis(FakeRedis):
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.delay = 0.0
+        self.calls = 0
+
+    async def _outage(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.down:
+            raise RedisConnectionError("Connection refused")
+
+    async def zincrby(self, key, amount, member):
+        await self._outage()
+        return await super().zincrby(key, amount, member)
+
+    async def incr(self, key):
+        await self._outage()
+        return await super().incr(key)
+
+    async def hgetall(self, key):
+        await self._outage()
+        return await super().hgetall(key)
+
+    async def getbit(self, key, offset):
+        await self._outage()
+        return await super().getbit(key, offset)
+
+    async def setbit(self, key, offset, value):
+        await self._outage()
+        return await super().setbit(key, offset, value)
+
+    def register_script(self, script):
+        run = super().register_script(script)
+
+        async def flaky_run(keys=(), args=(), client=None):
+            await self._outage()
+            return await run(keys=keys, args=args, client=client)
+
+        return flaky_run
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(**kwargs) -> tuple[CircuitBreaker, _Clock]:
+    breaker = CircuitBreaker(**{"failure_threshold": 3, "reset_timeout": 5.0, **kwargs})
+    clock = _Clock()
+    breaker._clock = clock
+    return breaker, clock
+
+
+def _request(redis, ip="10.0.0.1", path="/abc"):
+    request = MagicMock()
+    request.app.state.redis = redis
+    request.client.host = ip
+    request.url.path = path
+    return request
+
+
+async def _fail():
+    raise RedisConnectionError("Connection refused")
+
+
+async def _ok():
+    return "ok"
+
+
+# ── CircuitBreaker ────────────────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker, _ = _breaker()
+    for _ in range(3):
+        with pytest.raises(RedisUnavailableError):
+            await breaker.call(_fail)
+    assert breaker.state == "open"
+
+    called = False
+
+    async def probe():
+        nonlocal called
+        called = True
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(probe)
+    assert not called
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["opened"] == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_success_resets_consecutive_failures():
+    breaker, _ = _breaker()
+    for _ in range(2):
+        with pytest.raises(RedisUnavailableError):
+            await breaker.call(_fail)
+    assert await breaker.call(_ok) == "ok"
+    with pytest.raises(RedisUnavailableError):
+        await breaker.call(_fail)
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_trial_closes_or_reopens():
+    breaker, clock = _breaker()
+    for _ in range(3):
+        with pytest.raises(RedisUnavailableError):
+            await breaker.call(_fail)
+
+    clock.now += 5.0
+    assert breaker.stats()["state"] == "half_open"
+    with pytest.raises(RedisUnavailableError):
+        await breaker.call(_fail)  # the trial fails: straight back to open
+    assert breaker.is_open
+    assert breaker.stats()["opened"] == 2
+
+    clock.now += 5.0
+    assert await breaker.call(_ok) == "ok"
+    assert breaker.state == "closed"
+    assert breaker.consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_lets_one_trial_through():
+    breaker, clock = _breaker()
+    for _ in range(3):
+        with pytest.raises(RedisUnavailableError):
+            await breaker.call(_fail)
+    clock.now += 5.0
+
+    release = asyncio.Event()
+
+    async def slow_trial():
+        await release.wait()
+        return "ok"
+
+    trial = asyncio.create_task(breaker.call(slow_trial))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(_ok)
+    release.set()
+    assert await trial == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_breaker_counts_timeouts_as_failures():
+    breaker, _ = _breaker(failure_threshold=1, call_timeout=0.01)
+
+    async def stall():
+        await asyncio.sleep(1)
+
+    with pytest.raises(RedisUnavailableError):
+        await breaker.call(stall)
+    assert breaker.stats()["timeouts"] == 1
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_breaker_does_not_trip_on_command_errors():
+    """A ResponseError is a bug in the command, not an outage: raised as is."""
+    breaker, _ = _breaker(failure_threshold=1)
+
+    async def bad_command():
+        raise ResponseError("WRONGTYPE")
+
+    with pytest.raises(ResponseError):
+        await breaker.call(bad_command)
+    assert breaker.state == "closed"
+
+
+# ── ClickBuffer fallback ──────────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_click_buffer_keeps_clicks_locally_while_redis_is_down():
+    redis = FlakyRedis()
+    breaker, clock = _breaker()
+    buffer = ClickBuffer(redis, breaker=breaker)
+
+    redis.down = True
+    for _ in range(10):
+        await buffer.increment(1)
+    # Only the first failure_threshold clicks reached Redis; the rest failed fast
+    assert redis.calls == 3
+    assert buffer.fallback_clicks == 10
+    assert await buffer.get_count(1) == 10
+
+    # Still open: flush_local doesn't even try
+    await buffer.flush_local()
+    assert redis.calls == 3
+
+    redis.down = False
+    clock.now += 5.0
+    await buffer.flush_local()
+    assert breaker.state == "closed"
+    assert buffer.stats()["local_pending_clicks"] == 0
+    assert await redis.zscore(buffer._live_key(1), 1) == 10
+    assert await buffer.get_count(1) == 10
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_failed_trial_keeps_clicks():
+    redis = FlakyRedis()
+    breaker, clock = _breaker()
+    buffer = ClickBuffer(redis, breaker=breaker)
+
+    redis.down = True
+    for _ in range(5):
+        await buffer.increment(1)
+    clock.now += 5.0
+    with pytest.raises(RedisUnavailableError):
+        await buffer.flush_local()  # the trial fails; deltas are merged back
+    assert breaker.is_open
+    assert await buffer.get_count(1) == 5
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_times_out_slow_redis():
+    redis = FlakyRedis()
+    redis.delay = 0.2
+    breaker, _ = _breaker(call_timeout=0.01)
+    buffer = ClickBuffer(redis, breaker=breaker)
+
+    await buffer.increment(1)
+    assert breaker.timeouts == 1
+    assert buffer.fallback_clicks == 1
+
+
+# ── RateLimiter fallback ──────────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_rate_limiter_falls_back_to_local_windows(monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+
+    redis = FlakyRedis()
+    redis.down = True
+    breaker, _ = _breaker()
+    limiter = RateLimiter(max_requests=5, breaker=breaker)
+
+    for _ in range(5):
+        await limiter.check_rate_limit(_request(redis))
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check_rate_limit(_request(redis))
+    assert exc_info.value.status_code == 429
+    # Another client has its own window
+    await limiter.check_rate_limit(_request(redis, ip="10.0.0.2"))
+    assert limiter.stats()["fallback_checks"] == 7
+    assert limiter.stats()["fallback_rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_redirect_falls_back_and_counts_click(monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+
+    redis = FlakyRedis()
+    redis.down = True
+    breaker, _ = _breaker()
+    buffer = ClickBuffer(redis, breaker=breaker)
+    limiter = RateLimiter(max_requests=3, breaker=breaker)
+
+    for _ in range(3):
+        await limiter.check_rate_limit_and_count_click(_request(redis), buffer, 7)
+    with pytest.raises(HTTPException):
+        await limiter.check_rate_limit_and_count_click(_request(redis), buffer, 7)
+    # Rejected requests are not counted as clicks, exactly as with Redis up
+    assert await buffer.get_count(7) == 3
+
+
+# ── URL lookups ───────────────────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_shared_cache_outage_falls_through_to_sql(test_db):
+    async with test_db() as db:
+        url = await URLService(db).create("https://example.com")
+    redis = FlakyRedis()
+    redis.down = True
+    breaker, _ = _breaker()
+    shared_cache = RedisURLCache(redis, breaker=breaker)
+
+    async with test_db() as db:
+        record = await URLService(db, shared_cache=shared_cache).get_by_key_cached(url.key)
+
+    assert record == CachedURL(url.id, "https://example.com", True)
+    assert shared_cache.stats()["unavailable"] == 2  # the read and the fill
+    assert breaker.failures == 2
+
+
+@pytest.mark.asyncio
+async def test_bloom_mirror_outage_means_maybe_present():
+    """A key another worker issued may be missing locally; with the mirror
+    unreachable it must not be reported as never issued."""
+    redis = FlakyRedis()
+    bloom = BloomFilter(capacity=1000, redis=redis, breaker=_breaker()[0])
+    await BloomFilter(capacity=1000, redis=redis).add("OTHER1")
+    redis.down = True
+
+    assert await bloom.might_contain("OTHER1")
+    assert bloom.stats()["redis_unavailable"] == 1
+    assert bloom.stats()["definite_misses"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bloom_add_survives_a_mirror_outage(test_db):
+    """add() runs after the create commits, so a failed mirror write is
+    skipped instead of failing the request."""
+    redis = FlakyRedis()
+    redis.down = True
+    bloom = BloomFilter(capacity=1000, redis=redis, breaker=_breaker()[0])
+
+    async with test_db() as db:
+        url = await URLService(db, bloom=bloom).create("https://example.com")
+
+    assert await bloom.might_contain(url.key)  # set locally
+    assert bloom.stats()["redis_unavailable"] == 1
+
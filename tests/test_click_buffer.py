@@ -143,3 +143,235 @@ async def test_flush_recovers_stale_flush_key(test_db):
 
     assert await redis.exists(_FLUSH_KEY) == 0
     assert await redis.exists(_LEADERBOARD_KEY) == 0
+
+
+@pytest.mark.asyncio
+async def test_local_aggregation_sends_one_batch(test_db):
+    """Many clicks on a few URLs become one ZINCRBY per URL, sent together."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, aggregate_locally=True)
+    url_a, url_b = await _create_url(test_db), await _create_url(test_db)
+
+    for _ in range(5):
+        await buffer.increment(url_a.id)
+    await buffer.increment(url_b.id)
+
+    assert await redis.exists(_LEADERBOARD_KEY) == 0  # nothing sent yet
+    assert await buffer.get_count(url_a.id) == 5  # but already visible
+
+    await buffer.flush_local()
+
+    assert await redis.zscore(_LEADERBOARD_KEY, url_a.id) == 5
+    assert await redis.zscore(_LEADERBOARD_KEY, url_b.id) == 1
+    assert await buffer.get_count(url_a.id) == 5  # no double counting
+    assert buffer.stats()["local_pending_urls"] == 0
+
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+        assert (await db.get(models.URL, url_a.id)).clicks == 5
+
+
+@pytest.mark.asyncio
+async def test_local_aggregation_flushes_early_at_max_entries():
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, aggregate_locally=True, local_max_entries=3)
+
+    for url_id in (1, 2, 3):
+        await buffer.increment(url_id)
+
+    assert await redis.zscore(_LEADERBOARD_KEY, 1) == 1
+    assert buffer.stats()["local_flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_flush_failure_keeps_deltas():
+    """A failed pipeline must not drop the batch; it is merged back and retried."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, aggregate_locally=True)
+    await buffer.increment(7)
+    await buffer.increment(7)
+
+    real_pipeline = redis.pipeline
+    failing_pipeline = real_pipeline()
+    failing_pipeline.execute = AsyncMock(side_effect=ConnectionError("Redis down"))
+    redis.pipeline = lambda transaction=True: failing_pipeline
+    with pytest.raises(ConnectionError):
+        await buffer.flush_local()
+    await buffer.increment(7)  # arrives while Redis is down
+
+    redis.pipeline = real_pipeline
+    await buffer.flush_local()
+
+    assert await redis.zscore(_LEADERBOARD_KEY, 7) == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_applies_deltas_in_chunks_and_reports(test_db):
+    """Deltas for many URLs are applied chunk by chunk with correct totals, and
+    the flush reports how many rows it touched. A click buffered for a URL that
+    has since been hard-deleted is applied to no row."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, flush_chunk_size=2)
+    urls = [await _create_url(test_db) for _ in range(5)]
+
+    for i, url in enumerate(urls):
+        for _ in range(i + 1):
+            await buffer.increment(url.id)
+    await buffer.increment(9999)  # no such row
+
+    statements = []
+    async with test_db() as db:
+        real_execute = db.execute
+
+        async def counting_execute(*args, **kwargs):
+            statements.append(args[0])
+            return await real_execute(*args, **kwargs)
+
+        db.execute = counting_execute
+        await buffer.flush_to_db(db)
+
+    url_updates = [stmt for stmt in statements if stmt.is_update and stmt.table.name == "urls"]
+    assert len(url_updates) == 3  # 6 URLs in chunks of 2
+    assert buffer.last_flush["urls"] == 6
+    assert buffer.last_flush["rows"] == 5
+    assert buffer.last_flush["seconds"] >= 0
+
+    async with test_db() as db:
+        for i, url in enumerate(urls):
+            assert (await db.get(models.URL, url.id)).clicks == i + 1
+
+
+@pytest.mark.asyncio
+async def test_drain_streams_in_pages(test_db):
+    """The flushing set is read in flush_chunk_size pages, never all at once."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, flush_chunk_size=2)
+    for url in [await _create_url(test_db) for _ in range(5)]:
+        await buffer.increment(url.id)
+
+    ranges = []
+    real_zrange = redis.zrange
+
+    async def recording_zrange(key, start, end, withscores=False):
+        ranges.append((start, end))
+        return await real_zrange(key, start, end, withscores=withscores)
+
+    redis.zrange = recording_zrange
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    assert ranges == [(0, 1), (2, 3), (4, 5), (5, 6)]
+    assert buffer.last_flush["urls"] == 5
+
+
+@pytest.mark.asyncio
+async def test_drain_resumes_after_crash_without_double_counting(test_db):
+    """
+    Crash mid-drain: the first chunk is committed, the second chunk's commit
+    fails. With a single end-of-drain commit the retry was all-or-nothing; with
+    per-chunk commits, a retry that restarted from entry 0 would re-apply the
+    first chunk. The checkpoint committed alongside each chunk prevents that.
+    """
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, flush_chunk_size=2)
+    urls = [await _create_url(test_db) for _ in range(5)]
+    for url in urls:
+        await buffer.increment(url.id)
+        await buffer.increment(url.id)
+
+    async with test_db() as db:
+        real_commit = db.commit
+        commits = 0
+
+        async def crash_on_second_chunk():
+            nonlocal commits
+            commits += 1
+            if commits == 2:
+                raise Exception("Simulated crash")
+            await real_commit()
+
+        db.commit = crash_on_second_chunk
+        with pytest.raises(Exception, match="Simulated crash"):
+            await buffer.flush_to_db(db)
+
+    assert await redis.exists(_FLUSH_KEY) == 1
+
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    assert buffer.last_flush["urls"] == 3  # resumed after the committed chunk
+    async with test_db() as db:
+        for url in urls:
+            assert (await db.get(models.URL, url.id)).clicks == 2
+
+
+@pytest.mark.asyncio
+async def test_sharded_reads_span_every_shard():
+    """Each URL lands in shard url_id % shards; per-URL counts and the top-N
+    merge must give the same answers as a single leaderboard key."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, shards=4)
+    for url_id, clicks in [(1, 5), (2, 1), (3, 7), (4, 3), (5, 2), (8, 6)]:
+        for _ in range(clicks):
+            await buffer.increment(url_id)
+
+    assert await redis.zscore("clicks:leaderboard:{1}", "5") == 2
+    assert await redis.zscore("clicks:leaderboard:{0}", "8") == 6
+    assert await redis.exists(_LEADERBOARD_KEY) == 0
+    assert await buffer.get_count(3) == 7
+    assert [(int(url_id), score) for url_id, score in await buffer.get_top_n(3)] == [
+        (3, 7.0), (8, 6.0), (1, 5.0),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flush_all_drains_shards_on_separate_sessions(test_db):
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, shards=3)
+    urls = [await _create_url(test_db) for _ in range(6)]
+    for url in urls:
+        for _ in range(url.id):
+            await buffer.increment(url.id)
+
+    sessions = 0
+
+    def counting_factory():
+        nonlocal sessions
+        sessions += 1
+        return test_db()
+
+    await buffer.flush_all(counting_factory, concurrency=2)
+
+    assert sessions == 3
+    assert buffer.last_flush["urls"] == 6
+    for shard in range(3):
+        assert await redis.exists(f"clicks:leaderboard:{{{shard}}}") == 0
+    async with test_db() as db:
+        for url in urls:
+            assert (await db.get(models.URL, url.id)).clicks == url.id
+
+
+@pytest.mark.asyncio
+async def test_failed_shard_does_not_block_the_others(test_db):
+    """One shard's DB failure leaves its clicks buffered; the rest still flush."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, shards=2)
+    urls = [await _create_url(test_db) for _ in range(2)]
+    for url in urls:
+        await buffer.increment(url.id)
+    failing_shard = urls[0].id % 2
+
+    real_flush_shard = buffer._flush_shard
+
+    async def flaky_flush_shard(shard, db, fence):
+        if shard == failing_shard:
+            raise Exception("DB connection lost")
+        return await real_flush_shard(shard, db, fence)
+
+    buffer._flush_shard = flaky_flush_shard
+    with pytest.raises(Exception, match="DB connection lost"):
+        await buffer.flush_all(test_db)
+
+    assert await buffer.get_count(urls[0].id) == 1
+    async with test_db() as db:
+        assert (await db.get(models.URL, urls[1].id)).clicks == 1
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from shortener_app import models
+from shortener_app.infrastructure import ClickEventQueue
+from shortener_app.infrastructure.click_events import classify_user_agent, rotate_click_events
+from shortener_app.main import app
+
+
+async def _events(factory) -> list[models.ClickEvent]:
+    async with factory() as db:
+        result = await db.execute(select(models.ClickEvent).order_by(models.ClickEvent.occurred_at))
+        return list(result.scalars())
+
+
+@pytest.mark.parametrize("user_agent, expected", [
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0", "desktop"),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148", "mobile"),
+    ("Mozilla/5.0 (Linux; Android 14; Pixel 8) Chrome/120.0 Mobile Safari/537.36", "mobile"),
+    ("Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X)", "tablet"),
+    ("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)", "bot"),
+    ("curl/8.4.0", "bot"),
+    (None, "unknown"),
+])
+def test_classify_user_agent(user_agent, expected):
+    assert classify_user_agent(user_agent) == expected
+
+
+@pytest.mark.asyncio
+async def test_offer_drops_when_full_instead_of_blocking():
+    events = ClickEventQueue(maxsize=2)
+
+    assert events.offer(1, None, None)
+    assert events.offer(1, None, None)
+    assert not events.offer(1, None, None)
+
+    assert events.stats()["depth"] == 2
+    assert events.stats()["enqueued"] == 2
+    assert events.stats()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_writes_batches(test_db):
+    events = ClickEventQueue(batch_size=3, max_wait=0.01)
+    for i in range(5):
+        events.offer(i, "https://news.example.com/" if i else None, "curl/8.4.0")
+
+    worker = asyncio.create_task(events.run(test_db))
+    for _ in range(100):
+        if events.inserted == 5:
+            break
+        await asyncio.sleep(0.01)
+    worker.cancel()
+
+    rows = await _events(test_db)
+    assert sorted(row.url_id for row in rows) == [0, 1, 2, 3, 4]
+    assert {row.user_agent_class for row in rows} == {"bot"}
+    assert sum(row.referrer is None for row in rows) == 1
+    assert events.batches == 2  # 3 + 2
+    assert events.stats()["depth"] == 0
+    assert events.stats()["last_batch_seconds"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_drain_writes_whatever_is_queued(test_db):
+    events = ClickEventQueue(batch_size=2)
+    for i in range(3):
+        events.offer(i, None, None)
+
+    await events.drain(test_db)
+
+    assert len(await _events(test_db)) == 3
+    assert events.inserted == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_counted_and_dropped(test_db):
+    events = ClickEventQueue()
+    events.offer(1, None, None)
+
+    def broken_session():
+        raise RuntimeError("database down")
+
+    await events.drain(broken_session)
+
+    assert events.failed == 1
+    assert events.inserted == 0
+
+
+@pytest.mark.asyncio
+async def test_rotation_deletes_expired_days(test_db):
+    async with test_db() as db:
+        for day, event_id in ((1, 1), (9, 2), (10, 3)):
+            db.add(models.ClickEvent(
+                id=event_id, occurred_at=datetime(2026, 3, day, 12), url_id=1,
+                user_agent_class="desktop",
+            ))
+        await db.commit()
+
+    async with test_db() as db:
+        removed = await rotate_click_events(db, date(2026, 3, 10), retention_days=1)
+
+    assert removed == 1
+    assert [row.id for row in await _events(test_db)] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_redirect_offers_a_click_event(client, admin_headers):
+    app.state.click_events = ClickEventQueue()
+    try:
+        response = await client.post("/url", json={"target_url": "https://example.com"})
+        url_key = response.json()["url"].split("/")[-1]
+        await client.get(f"/{url_key}", follow_redirects=False, headers={
+            "referer": "https://news.example.com/", "user-agent": "Mozilla/5.0 (iPad)",
+        })
+
+        occurred_at, url_id, referrer, user_agent = app.state.click_events.queue.get_nowait()
+        assert referrer == "https://news.example.com/"
+        assert user_agent == "Mozilla/5.0 (iPad)"
+        assert (await client.get("/admin/metrics", headers=admin_headers)).json()["click_events"]["enqueued"] == 1
+    finally:
+        del app.state.click_events
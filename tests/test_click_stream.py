@@ -0,0 +1,103 @@
+import pytest
+
+from shortener_app.infrastructure.click_stream import StreamClickBuffer, _GROUP, _STREAM_KEY
+from shortener_app.services import URLService
+from shortener_app import models
+from tests.conftest import FakeRedis
+
+
+async def _create_urls(factory, count: int) -> list[models.URL]:
+    async with factory() as db:
+        return [await URLService(db).create("https://example.com") for _ in range(count)]
+
+
+async def _clicks(factory, urls) -> list[int]:
+    async with factory() as db:
+        return [(await db.get(models.URL, url.id)).clicks for url in urls]
+
+
+@pytest.mark.asyncio
+async def test_flush_aggregates_events_and_acks(test_db):
+    redis = FakeRedis()
+    buffer = StreamClickBuffer(redis, flush_chunk_size=2)
+    urls = await _create_urls(test_db, 2)
+    for _ in range(3):
+        await buffer.increment(urls[0].id)
+    await buffer.increment(urls[1].id)
+    assert await buffer.pending_urls() == 4
+
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    assert await _clicks(test_db, urls) == [3, 1]
+    assert (await redis.xinfo_groups(_STREAM_KEY))[0]["pending"] == 0
+    assert await buffer.pending_urls() == 0
+
+
+@pytest.mark.asyncio
+async def test_local_aggregation_sends_compact_deltas(test_db):
+    redis = FakeRedis()
+    buffer = StreamClickBuffer(redis, aggregate_locally=True)
+    urls = await _create_urls(test_db, 1)
+    for _ in range(5):
+        await buffer.increment(urls[0].id)
+    assert await buffer.get_count(urls[0].id) == 5
+
+    await buffer.flush_local()
+    assert await redis.xlen(_STREAM_KEY) == 1  # one {u, n: 5} entry
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    assert await _clicks(test_db, urls) == [5]
+
+
+@pytest.mark.asyncio
+async def test_dead_consumers_batch_is_claimed(test_db):
+    """A worker reads a batch and dies before committing; another worker's
+    next flush claims the pending entries and applies them."""
+    redis = FakeRedis()
+    dead = StreamClickBuffer(redis, consumer="dead", claim_idle_ms=0)
+    survivor = StreamClickBuffer(redis, consumer="survivor", claim_idle_ms=0)
+    urls = await _create_urls(test_db, 1)
+    for _ in range(3):
+        await dead.increment(urls[0].id)
+
+    async with test_db() as db:
+        db.commit = None  # the dead worker never gets to commit
+        with pytest.raises(TypeError):
+            await dead.flush_to_db(db)
+
+    async with test_db() as db:
+        await survivor.flush_to_db(db)
+
+    assert await _clicks(test_db, urls) == [3]
+    assert survivor.stats()["claimed"] == 3
+    assert [c["name"] for c in await redis.xinfo_consumers(_STREAM_KEY, _GROUP)] == ["survivor"]
+
+
+@pytest.mark.asyncio
+async def test_batch_committed_before_crash_is_not_reapplied(test_db):
+    """Crash between the DB commit and XACK: the claimer finds the dead
+    consumer's checkpoint covering the batch and only acks it."""
+    redis = FakeRedis()
+    dead = StreamClickBuffer(redis, consumer="dead", claim_idle_ms=0)
+    survivor = StreamClickBuffer(redis, consumer="survivor", claim_idle_ms=0)
+    urls = await _create_urls(test_db, 1)
+    for _ in range(3):
+        await dead.increment(urls[0].id)
+
+    async def crash(*args):
+        raise ConnectionError("Simulated crash")
+
+    redis.xack, real_xack = crash, redis.xack
+    async with test_db() as db:
+        with pytest.raises(ConnectionError):
+            await dead.flush_to_db(db)
+    redis.xack = real_xack
+
+    async with test_db() as db:
+        await survivor.flush_to_db(db)
+
+    assert await _clicks(test_db, urls) == [3]
+    assert survivor.stats()["replayed_batches"] == 1
+    assert (await redis.xinfo_groups(_STREAM_KEY))[0]["pending"] == 0
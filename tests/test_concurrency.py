@@ -219,4 +219,37 @@ async def test_database_connection_cleanup(test_db):
     # If connections leak, this will exhaust the pool
     async with test_db() as db:
         result = await db.get(models.URL, 1)
-        assert result is not None
\ No newline at end of file
+        assert result is not None
+
+@pytest.mark.asyncio
+async def test_concurrent_cold_misses_run_one_select(test_engine, test_db):
+    """N concurrent cache misses for the same cold key must coalesce into one SELECT."""
+    from sqlalchemy import event
+    from shortener_app.infrastructure import SingleFlight, URLCache
+    from shortener_app.services import URLService
+    from tests.conftest import FakeRedis
+
+    async with test_db() as db:
+        created = await URLService(db).create("https://www.example.com")
+
+    selects = []
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count_selects)
+    try:
+        cache, flights = URLCache(FakeRedis()), SingleFlight()
+        num_requests = 50
+        results = await asyncio.gather(*[
+            URLService(session_factory=test_db, cache=cache, flights=flights)
+            .get_by_key_cached(created.key)
+            for _ in range(num_requests)
+        ])
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_selects)
+
+    assert all(r is not None and r.id == created.id for r in results)
+    assert len(selects) == 1, f"Expected 1 SELECT for {num_requests} misses, got {len(selects)}"
+    assert flights.stats()["coalesced"] == num_requests - 1
@@ -0,0 +1,82 @@
+import pytest
+
+from shortener_app.infrastructure.click_buffer import ClickBuffer
+from shortener_app.infrastructure.flush_scheduler import FlushScheduler
+from tests.conftest import FakeRedis
+
+
+def _rewind(scheduler: FlushScheduler, seconds: float):
+    """Pretend the last flush happened `seconds` earlier."""
+    scheduler._last_flush_at -= seconds
+
+
+@pytest.mark.asyncio
+async def test_flushes_early_when_cardinality_crosses_threshold():
+    buffer = ClickBuffer(FakeRedis(), shards=2)
+    scheduler = FlushScheduler(buffer, base_interval=30, min_interval=1, cardinality_threshold=3)
+    _rewind(scheduler, 2)
+
+    await buffer.increment(1)
+    await buffer.increment(2)
+    assert await scheduler.due() is None
+
+    await buffer.increment(3)
+    assert await scheduler.due() == "threshold"
+    assert scheduler.stats()["last_pending_urls"] == 3
+
+
+@pytest.mark.asyncio
+async def test_never_flushes_before_min_interval():
+    buffer = ClickBuffer(FakeRedis())
+    scheduler = FlushScheduler(buffer, min_interval=1, cardinality_threshold=1)
+    await buffer.increment(1)
+
+    assert await scheduler.due() is None
+
+
+@pytest.mark.asyncio
+async def test_slow_flush_backs_off_and_fast_flush_recovers():
+    buffer = ClickBuffer(FakeRedis())
+    scheduler = FlushScheduler(
+        buffer, base_interval=30, max_interval=100, cardinality_threshold=1, slow_flush_seconds=5
+    )
+
+    scheduler.record(seconds=8, urls=500)
+    assert scheduler.interval == 60
+    scheduler.record(seconds=8, urls=500)
+    assert scheduler.interval == 100  # capped at max_interval
+
+    # While backing off, a full buffer doesn't trigger an early flush
+    await buffer.increment(1)
+    _rewind(scheduler, 40)
+    assert await scheduler.due() is None
+
+    scheduler.record(seconds=0.2, urls=500)
+    assert scheduler.interval == 50
+    assert not scheduler.backing_off
+    assert scheduler.stats()["adjustments"] == {"slow": 2, "failed": 0, "idle": 0, "recovered": 1}
+
+
+@pytest.mark.asyncio
+async def test_idle_flushes_stretch_the_interval():
+    scheduler = FlushScheduler(ClickBuffer(FakeRedis()), base_interval=30, max_interval=120)
+    scheduler.record(seconds=0.01, urls=0)
+    scheduler.record(seconds=0.01, urls=0)
+
+    assert scheduler.interval == 120
+    _rewind(scheduler, 60)
+    assert await scheduler.due() is None
+
+
+@pytest.mark.asyncio
+async def test_busy_database_defers_until_max_interval():
+    busy = True
+    scheduler = FlushScheduler(
+        ClickBuffer(FakeRedis()), base_interval=30, max_interval=120, db_busy=lambda: busy
+    )
+
+    _rewind(scheduler, 31)
+    assert await scheduler.due() is None
+    _rewind(scheduler, 90)
+    assert await scheduler.due() == "interval"  # max_interval overrides the deferral
+    assert scheduler.stats()["decisions"] == {"threshold": 0, "interval": 1, "deferred_db_busy": 1}
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from shortener_app import models
+from shortener_app.infrastructure.key_blocks import FeistelKeyGenerator
+from shortener_app.keygen import decode_key
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_workers_lease_disjoint_blocks():
+    redis = FakeRedis()
+    workers = [FeistelKeyGenerator(redis, b"secret", block_size=10) for _ in range(3)]
+
+    keys = []
+    for _ in range(25):
+        for worker in workers:
+            keys.append(await worker.next_key())
+
+    assert len(set(keys)) == 75
+    assert await redis.get("urls:key_counter:6") == "90"  # 3 blocks each
+    assert workers[0].stats()["blocks"] == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_creates_share_one_block_lease():
+    redis = FakeRedis()
+    generator = FeistelKeyGenerator(redis, b"secret", block_size=100)
+    keys = await asyncio.gather(*[generator.next_key() for _ in range(50)])
+    assert len(set(keys)) == 50
+    assert generator.stats()["blocks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_are_the_permuted_counter():
+    generator = FeistelKeyGenerator(FakeRedis(), b"secret", block_size=5)
+    keys = [await generator.next_key() for _ in range(5)]
+    assert [generator.permutation.invert(decode_key(key)) for key in keys] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_generator_stops_at_the_end_of_the_key_space():
+    """Size 1 has 36 keys: all of them are issued once, then None."""
+    generator = FeistelKeyGenerator(FakeRedis(), b"secret", size=1, block_size=16)
+    keys = [await generator.next_key() for _ in range(36)]
+    assert len(set(keys)) == 36
+    assert await generator.next_key() is None
+    assert generator.stats()["exhausted"]
+
+
+@pytest.mark.asyncio
+async def test_create_uses_the_generator_and_skips_collisions(test_db):
+    """A key issued earlier by the random generator is skipped: the next
+    counter value is tried at once."""
+    redis = FakeRedis()
+    generator = FeistelKeyGenerator(redis, b"secret", block_size=10)
+    first = generator.permutation.key(0)
+    async with test_db() as db:
+        db.add(models.URL(target_url="https://example.com", key=first, secret_key=f"{first}_s"))
+        await db.commit()
+
+    async with test_db() as db:
+        url = await URLService(db, key_generator=generator).create("https://example.com/2")
+    assert url.key == generator.permutation.key(1)
@@ -0,0 +1,88 @@
+import itertools
+
+import pytest
+
+from shortener_app import keygen, models
+from shortener_app.infrastructure.key_pool import KeyPool, _POOL_KEY
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_refill_tops_up_to_high_water_only_below_low_water(test_db):
+    redis = FakeRedis()
+    pool = KeyPool(redis, low_water=50, high_water=200, batch_size=64)
+
+    async with test_db() as db:
+        assert await pool.refill(db) == 200
+        assert await pool.size() == 200
+        for _ in range(100):
+            await pool.take()
+        assert await pool.refill(db) == 0  # 100 left, still above low water
+        for _ in range(60):
+            await pool.take()
+        assert await pool.refill(db) == 160
+    assert await pool.size() == 200
+    assert pool.stats()["refills"] == 2
+
+
+@pytest.mark.asyncio
+async def test_refill_skips_keys_already_issued(test_db, monkeypatch):
+    """Keys already in urls never enter the pool."""
+    async with test_db() as db:
+        for key in ("AAAAAA", "BBBBBB"):
+            db.add(models.URL(target_url="https://example.com", key=key, secret_key=f"{key}_s"))
+        await db.commit()
+
+    candidates = itertools.chain(["AAAAAA", "BBBBBB", "CCCCCC", "DDDDDD"], itertools.repeat("CCCCCC"))
+    monkeypatch.setattr(
+        keygen, "generate_keys", lambda count, size=6: [next(candidates) for _ in range(count)]
+    )
+    redis = FakeRedis()
+    pool = KeyPool(redis, low_water=2, high_water=4, batch_size=4)
+
+    async with test_db() as db:
+        assert await pool.refill(db) == 2
+    assert redis._sets[_POOL_KEY] == {"CCCCCC", "DDDDDD"}
+    assert pool.stats()["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_refill_stops_when_key_space_is_exhausted(test_db, monkeypatch):
+    monkeypatch.setattr(keygen, "generate_keys", lambda count, size=6: ["ZZZZZZ"] * count)
+    pool = KeyPool(FakeRedis(), low_water=10, high_water=100)
+    async with test_db() as db:
+        assert await pool.refill(db) == 1
+
+
+@pytest.mark.asyncio
+async def test_create_takes_keys_from_the_pool(test_db):
+    redis = FakeRedis()
+    await redis.sadd(_POOL_KEY, "POOLED")
+    pool = KeyPool(redis)
+
+    async with test_db() as db:
+        service = URLService(db, key_pool=pool)
+        first = await service.create("https://example.com/1")
+        second = await service.create("https://example.com/2")  # pool is now empty
+
+    assert first.key == "POOLED"
+    assert first.secret_key.startswith("POOLED_")
+    assert second.key != "POOLED" and len(second.key) == 6
+    assert pool.stats()["taken"] == 1
+    assert pool.stats()["empty"] == 1
+
+
+@pytest.mark.asyncio
+async def test_create_falls_back_when_a_pooled_key_collides(test_db):
+    """A pooled key issued meanwhile by the random path is caught by the unique
+    constraint and the retry uses a random key."""
+    async with test_db() as db:
+        db.add(models.URL(target_url="https://example.com", key="TAKEN1", secret_key="TAKEN1_s"))
+        await db.commit()
+    redis = FakeRedis()
+    await redis.sadd(_POOL_KEY, "TAKEN1")
+
+    async with test_db() as db:
+        url = await URLService(db, key_pool=KeyPool(redis)).create("https://example.com/2")
+    assert url.key != "TAKEN1"
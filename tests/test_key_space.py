@@ -0,0 +1,126 @@
+import pytest
+
+from shortener_app import keygen, models
+from shortener_app.infrastructure.key_blocks import FeistelKeyGenerator
+from shortener_app.infrastructure.key_space import KeySpaceMonitor
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+async def _issue(factory, keys):
+    async with factory() as db:
+        for key in keys:
+            db.add(models.URL(target_url="https://example.com", key=key, secret_key=f"{key}_s"))
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_refresh_steps_up_while_occupancy_is_too_high(test_db):
+    """136 keys issued: over a 5% threshold at 1 and 2 characters (136/36,
+    136/1296), so the monitor settles on 3 characters."""
+    await _issue(test_db, keygen.ALPHABET)
+    await _issue(test_db, [keygen.encode_key(i, 2) for i in range(100)])
+    monitor = KeySpaceMonitor(min_size=1, max_collision_rate=0.05)
+
+    async with test_db() as db:
+        await monitor.refresh(db)
+    assert monitor.size == 3
+    assert monitor.stats()["size_steps"] == 2
+    assert monitor.occupancy == pytest.approx(136 / 36 ** 3)
+
+
+@pytest.mark.asyncio
+async def test_workers_adopt_the_published_size(test_db):
+    await _issue(test_db, [keygen.encode_key(i, 2) for i in range(100)])
+    redis = FakeRedis()
+    leader = KeySpaceMonitor(min_size=2, max_collision_rate=0.05, redis=redis)
+    follower = KeySpaceMonitor(min_size=2, max_collision_rate=0.05, redis=redis)
+    assert not await follower.sync()  # nothing published yet
+
+    async with test_db() as db:
+        await leader.refresh(db)
+    assert await follower.sync()
+    assert follower.size == leader.size == 3
+    assert follower.issued == 100
+
+    follower.record(3, 5, succeeded=False)  # stepped up locally meanwhile
+    assert await follower.sync()
+    assert follower.size == 4  # never steps back down
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_size_below_threshold(test_db):
+    await _issue(test_db, [keygen.encode_key(i, 2) for i in range(10)])
+    monitor = KeySpaceMonitor(min_size=2, max_collision_rate=0.05)
+    async with test_db() as db:
+        await monitor.refresh(db)
+    assert monitor.size == 2
+    assert monitor.stats()["expected_collision_rate"] == pytest.approx(10 / 1296)
+
+
+def test_observed_collision_rate_steps_up_once_the_window_fills():
+    monitor = KeySpaceMonitor(min_size=6, max_collision_rate=0.1, window=20)
+    for _ in range(9):
+        monitor.record(6, 1)
+    monitor.record(6, 2)  # 1 collision in 11 attempts, but the window isn't full
+    assert monitor.size == 6
+    for _ in range(8):
+        monitor.record(6, 1)
+    monitor.record(6, 2)  # 2 in 21 → window of 20 holds 2 collisions: 10%
+    assert monitor.size == 7
+    assert monitor.stats()["collisions_by_size"] == {"6": 2}
+    assert monitor.stats()["attempts_histogram"]["2"] == 2
+
+
+def test_stale_records_do_not_count_against_the_new_size():
+    monitor = KeySpaceMonitor(min_size=6, max_collision_rate=0.1, window=4)
+    monitor.record(6, 5, succeeded=False)  # ran out of attempts: step up at once
+    assert monitor.size == 7
+    monitor.record(6, 4)  # started before the step
+    assert monitor.observed_collision_rate == 0
+    assert monitor.stats()["failures"] == 1
+    assert monitor.stats()["collisions_by_size"] == {"6": 8}
+
+
+def test_size_never_exceeds_max():
+    monitor = KeySpaceMonitor(min_size=19, max_size=20, window=1)
+    for _ in range(3):
+        monitor.record(monitor.size, 5, succeeded=False)
+    assert monitor.size == 20
+
+
+@pytest.mark.asyncio
+async def test_create_uses_and_reports_to_the_monitor(test_db):
+    monitor = KeySpaceMonitor(min_size=8)
+    async with test_db() as db:
+        url = await URLService(db, key_space=monitor).create("https://example.com")
+    assert len(url.key) == 8
+    assert monitor.stats()["attempts_histogram"]["1"] == 1
+
+
+@pytest.mark.asyncio
+async def test_create_steps_up_when_the_key_space_is_full(test_db, monkeypatch):
+    """Every 1-character key is taken: the create runs out of attempts and
+    fails, and the next one gets a 2-character key."""
+    await _issue(test_db, keygen.ALPHABET)
+    monkeypatch.setattr("shortener_app.services.url_service.asyncio.sleep", _no_sleep)
+    monitor = KeySpaceMonitor(min_size=1)
+
+    async with test_db() as db:
+        with pytest.raises(ValueError):
+            await URLService(db, key_space=monitor).create("https://example.com")
+        url = await URLService(db, key_space=monitor).create("https://example.com")
+    assert len(url.key) == 2
+
+
+async def _no_sleep(_seconds):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_feistel_generator_grows_when_a_size_is_used_up():
+    generator = FeistelKeyGenerator(FakeRedis(), b"secret", size=1, block_size=16, max_size=2)
+    keys = [await generator.next_key() for _ in range(40)]
+    assert len(set(keys)) == 40
+    assert [len(key) for key in keys] == [1] * 36 + [2] * 4
+    assert generator.stats()["size"] == 2
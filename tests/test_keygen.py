@@ -1,5 +1,12 @@
+import random
 import string
-from shortener_app.keygen import generate_random_key
+
+import pytest
+
+from shortener_app import keygen as keygen_module
+from shortener_app.keygen import (
+    ALPHABET, FeistelPermutation, decode_key, encode_key, generate_keys, generate_random_key,
+)
 
 
 def test_generate_random_key_length():
@@ -26,3 +33,93 @@ def test_generate_random_key_uniqueness():
     # With 36^6 possibilities, 100 keys should be unique
     assert len(set(keys)) == 100
 
+
+
+# ── Feistel permutation ───────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("size", [1, 2, 3])
+@pytest.mark.parametrize("secret", [b"", b"secret", b"another secret"])
+def test_feistel_is_a_bijection(size, secret):
+    """Exhaustive over small key spaces, odd and even sizes: every value maps
+    to a distinct value in range, and invert() undoes permute()."""
+    permutation = FeistelPermutation(secret, size)
+    images = [permutation.permute(value) for value in range(permutation.domain)]
+    assert sorted(images) == list(range(permutation.domain))
+    assert [permutation.invert(image) for image in images] == list(range(permutation.domain))
+
+
+@pytest.mark.parametrize("size", [4, 6, 7, 8])
+def test_feistel_round_trips_on_full_size_spaces(size):
+    rng = random.Random(size)
+    permutation = FeistelPermutation(b"secret", size)
+    values = [rng.randrange(permutation.domain) for _ in range(2000)] + [0, permutation.domain - 1]
+    for value in values:
+        image = permutation.permute(value)
+        assert 0 <= image < permutation.domain
+        assert permutation.invert(image) == value
+    # Injective on the sample, so distinct counter values give distinct keys
+    assert len({permutation.key(value) for value in values}) == len(set(values))
+
+
+def test_feistel_keys_look_random():
+    """Consecutive counter values share no prefix structure, and different
+    secrets (or sizes) give different permutations."""
+    permutation = FeistelPermutation(b"secret")
+    keys = [permutation.key(value) for value in range(1000)]
+    assert all(len(key) == 6 and set(key) <= set(ALPHABET) for key in keys)
+    assert len({key[:2] for key in keys}) > 500
+    assert keys != [FeistelPermutation(b"other").key(value) for value in range(1000)]
+
+
+def test_feistel_rejects_out_of_range_values():
+    permutation = FeistelPermutation(b"secret", 2)
+    with pytest.raises(ValueError):
+        permutation.permute(36 ** 2)
+    with pytest.raises(ValueError):
+        FeistelPermutation(b"secret", rounds=3)
+
+
+def test_encode_key_round_trips():
+    assert encode_key(0) == "AAAAAA"
+    assert encode_key(36 ** 6 - 1) == "999999"
+    assert decode_key(encode_key(123456789)) == 123456789
+    with pytest.raises(ValueError):
+        encode_key(36 ** 6)
+
+
+# ── Batched CSPRNG keys ───────────────────────────────────────────────────────
+
+def test_generate_keys_returns_count_keys_of_size():
+    keys = generate_keys(5000, size=7)
+    assert len(keys) == 5000
+    assert all(len(key) == 7 and set(key) <= set(ALPHABET) for key in keys)
+    assert len(set(keys)) == 5000
+
+
+def test_characters_are_unbiased():
+    """Rejection sampling keeps every character at 1/36. A chi-square over
+    360k characters (35 degrees of freedom) stays far below 100 unless the
+    four bytes >= 252 leaked in as extra A-D."""
+    chars = "".join(generate_keys(60_000))
+    expected = len(chars) / len(ALPHABET)
+    chi_square = sum((chars.count(c) - expected) ** 2 / expected for c in ALPHABET)
+    assert chi_square < 100
+
+
+def test_buffer_spans_refills_and_resets_after_fork(monkeypatch):
+    draws = []
+    real_urandom = keygen_module.os.urandom
+
+    def counting_urandom(n):
+        draws.append(n)
+        return real_urandom(n)
+
+    monkeypatch.setattr(keygen_module.os, "urandom", counting_urandom)
+    keygen_module._random_chars.reset()
+    keys = [generate_random_key() for _ in range(1000)]  # 6000 chars: two 4 KiB reads
+    assert len(set(keys)) == 1000
+    assert len(draws) == 2
+
+    keygen_module._random_chars.reset()  # what a forked child runs
+    generate_random_key()
+    assert len(draws) == 3
@@ -0,0 +1,128 @@
+import pytest
+
+from shortener_app.infrastructure.click_buffer import ClickBuffer, StaleFlushError, _FLUSH_KEY
+from shortener_app.infrastructure.leader_lease import LeaderLease
+from shortener_app.services import URLService
+from shortener_app import models
+from tests.conftest import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_only_one_process_leads():
+    redis = FakeRedis()
+    worker_a = LeaderLease(redis, "click_flusher")
+    worker_b = LeaderLease(redis, "click_flusher")
+
+    assert await worker_a.acquire()
+    assert not await worker_b.acquire()
+    assert await worker_a.acquire()  # renewal keeps the same token
+
+    assert worker_a.stats()["fence_token"] == 1
+    assert worker_a.stats()["renewals"] == 1
+    assert worker_b.stats()["is_leader"] is False
+
+
+@pytest.mark.asyncio
+async def test_failover_issues_a_newer_fencing_token():
+    """When the leader's lease expires, the next process to try takes over with
+    a larger token, and the old leader steps down on its next attempt."""
+    redis = FakeRedis()
+    old_leader = LeaderLease(redis, "click_flusher")
+    successor = LeaderLease(redis, "click_flusher")
+    await old_leader.acquire()
+
+    await redis.delete(old_leader.key)  # leader stalled past its TTL
+    assert await successor.acquire()
+    assert not await old_leader.acquire()
+
+    assert successor.fence_token == 2
+    assert old_leader.stats()["losses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_release_only_drops_own_lease():
+    redis = FakeRedis()
+    old_leader = LeaderLease(redis, "click_flusher")
+    successor = LeaderLease(redis, "click_flusher")
+    await old_leader.acquire()
+    await redis.delete(old_leader.key)
+    await successor.acquire()
+
+    await old_leader.release()
+
+    assert await successor.acquire()
+    assert await redis.get(successor.key) == successor.holder_id
+
+
+@pytest.mark.asyncio
+async def test_deposed_leader_cannot_apply_a_chunk_twice(test_db):
+    """
+    A leader pauses mid-drain, loses its lease, and the successor (newer token)
+    advances the same batch. When the old leader wakes up and applies its next
+    chunk, the fenced checkpoint update must reject it, rolling the chunk back.
+    """
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis, flush_chunk_size=2)
+    async with test_db() as db:
+        urls = [await URLService(db).create("https://example.com") for _ in range(4)]
+    for url in urls:
+        await buffer.increment(url.id)
+
+    # Successor (token 2) applies the first chunk, then crashes on the second.
+    async with test_db() as db:
+        real_commit = db.commit
+        commits = 0
+
+        async def crash_on_second_chunk():
+            nonlocal commits
+            commits += 1
+            if commits == 2:
+                raise Exception("Simulated crash")
+            await real_commit()
+
+        db.commit = crash_on_second_chunk
+        with pytest.raises(Exception, match="Simulated crash"):
+            await buffer.flush_to_db(db, fence=2)
+
+    # Deposed leader (token 1) resumes the same batch and is turned away.
+    async with test_db() as db:
+        with pytest.raises(StaleFlushError):
+            await buffer.flush_to_db(db, fence=1)
+    assert await redis.exists(_FLUSH_KEY) == 1
+
+    async with test_db() as db:
+        await buffer.flush_to_db(db, fence=2)
+    async with test_db() as db:
+        for url in urls:
+            assert (await db.get(models.URL, url.id)).clicks == 1
+
+
+@pytest.mark.asyncio
+async def test_deposed_leader_does_not_delete_the_next_batch(test_db):
+    """A drain that finishes after its batch was completed and replaced by the
+    next handoff must leave the new batch alone."""
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis)
+    async with test_db() as db:
+        url = await URLService(db).create("https://example.com")
+    await buffer.increment(url.id)
+
+    async with test_db() as db:
+        real_commit = db.commit
+        commits = 0
+
+        async def next_batch_on_final_commit():
+            nonlocal commits
+            commits += 1
+            if commits == 2:
+                # Meanwhile the successor finished this batch and handed off the next
+                redis._zsets[_FLUSH_KEY] = {str(url.id): 5.0}
+                redis._strings[f"{_FLUSH_KEY}:batch"] = "next-batch"
+            await real_commit()
+
+        db.commit = next_batch_on_final_commit
+        await buffer.flush_to_db(db, fence=1)
+
+    assert await redis.exists(_FLUSH_KEY) == 1
+    assert await redis.get(f"{_FLUSH_KEY}:batch") == "next-batch"
+
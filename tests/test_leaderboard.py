@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import select
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import ClickBuffer
+from shortener_app.main import app
+from shortener_app.services import LeaderboardService, URLService
+from tests.conftest import FakeRedis
+
+
+async def _top_urls(factory) -> dict[int, int]:
+    async with factory() as db:
+        result = await db.execute(select(models.TopURL))
+        return {row.url_id: row.clicks for row in result.scalars()}
+
+
+async def _click(buffer: ClickBuffer, url_id: int, times: int):
+    for _ in range(times):
+        await buffer.increment(url_id)
+
+
+@pytest.mark.asyncio
+async def test_flush_keeps_top_urls_an_exact_top_k(test_db):
+    buffer = ClickBuffer(FakeRedis(), top_urls_size=2, flush_chunk_size=2)
+    async with test_db() as db:
+        a, b, c = [await URLService(db).create(f"https://{n}.example.com") for n in "abc"]
+
+    for url, clicks in ((a, 5), (b, 3), (c, 1)):
+        await _click(buffer, url.id, clicks)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+    assert await _top_urls(test_db) == {a.id: 5, b.id: 3}
+
+    # c overtakes b over two flushes; only clicked URLs are ever looked at
+    await _click(buffer, c.id, 1)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+    assert await _top_urls(test_db) == {a.id: 5, b.id: 3}
+    await _click(buffer, c.id, 4)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+    assert await _top_urls(test_db) == {a.id: 5, c.id: 6}
+
+
+@pytest.mark.asyncio
+async def test_live_leaderboard_merges_buffered_clicks(test_db):
+    buffer = ClickBuffer(FakeRedis())
+    async with test_db() as db:
+        a, b, c = [await URLService(db).create(f"https://{n}.example.com") for n in "abc"]
+    await _click(buffer, a.id, 5)
+    await _click(buffer, b.id, 4)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+    await _click(buffer, b.id, 2)  # flushed 4 + buffered 2 passes a
+    await _click(buffer, c.id, 1)  # only buffered so far
+
+    async with test_db() as db:
+        service = LeaderboardService(db, buffer)
+        assert await service.top(3) == [
+            (b.key, b.target_url, 6), (a.key, a.target_url, 5), (c.key, c.target_url, 1),
+        ]
+        assert await service.top(3, "all-time") == [
+            (a.key, a.target_url, 5), (b.key, b.target_url, 4),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_cache_and_inactive_urls(test_db):
+    buffer = ClickBuffer(FakeRedis())
+    async with test_db() as db:
+        a = await URLService(db).create("https://a.example.com")
+        b = await URLService(db).create("https://b.example.com")
+    await _click(buffer, a.id, 2)
+    await _click(buffer, b.id, 1)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    cache = {}
+    async with test_db() as db:
+        service = LeaderboardService(db, buffer, cache=cache, cache_ttl=60)
+        first = await service.top(5)
+        await _click(buffer, b.id, 5)
+        assert await service.top(5) == first  # served from cache
+
+        await URLService(db).deactivate(a.secret_key)
+        cache.clear()
+        assert await service.top(5) == [(b.key, b.target_url, 6)]
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_endpoint(client, test_db, admin_headers):
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    url_key = response.json()["url"].split("/")[-1]
+    for _ in range(3):
+        await client.get(f"/{url_key}", follow_redirects=False)
+
+    response = await client.get("/admin/leaderboard", headers=admin_headers, params={"n": 5})
+    assert response.status_code == 200
+    assert response.json()["scope"] == "live"
+    assert [(e["url"].split("/")[-1], e["clicks"]) for e in response.json()["entries"]] == [
+        (url_key, 3)
+    ]
+
+    async with test_db() as db:
+        await app.state.click_buffer.flush_to_db(db)
+    response = await client.get("/admin/leaderboard", headers=admin_headers, params={"scope": "all-time"})
+    assert [e["clicks"] for e in response.json()["entries"]] == [3]
+
+    assert (await client.get("/admin/leaderboard", headers=admin_headers, params={"scope": "week"})).status_code == 400
+    assert (await client.get("/admin/leaderboard", headers=admin_headers, params={"n": 0})).status_code == 422
+    assert (await client.get("/admin/leaderboard", headers=admin_headers, params={"n": 100_000})).status_code == 400
@@ -1,3 +1,5 @@
+import random
+
 import pytest
 from fastapi import HTTPException
 from httpx import AsyncClient, ASGITransport
@@ -5,9 +7,10 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from unittest.mock import AsyncMock, MagicMock
 from typing import Callable
 
-from shortener_app.main import app, get_db
+from shortener_app.main import app, get_db, get_session_factory
 from shortener_app.database import Base
 from shortener_app.infrastructure import ClickBuffer
+from shortener_app.infrastructure import rate_limiter as rate_limiter_module
 from shortener_app.infrastructure.rate_limiter import RateLimiter
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -52,8 +55,15 @@ async def mock_redis_with_rate_limit():
     async def mock_expire(key, ttl):
         return True
 
+    async def mock_rate_limited_increment(keys, args):
+        # Stands in for the redirect Lua script: same INCR gate, click skipped.
+        return await mock_incr(keys[0])
+
     mock_redis.incr.side_effect = mock_incr
     mock_redis.expire.side_effect = mock_expire
+    mock_redis.register_script = MagicMock(
+        return_value=AsyncMock(side_effect=mock_rate_limited_increment)
+    )
 
     return mock_redis
 
@@ -75,6 +85,7 @@ async def rate_limited_client(test_db, monkeypatch, mock_redis_with_rate_limit):
             yield session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: test_db
 
     async with AsyncClient(
         transport=ASGITransport(app=app),
@@ -339,3 +350,319 @@ async def test_rate_limit_overflow_impossible_with_atomic_incr(monkeypatch):
     # Verify the INCR-first pattern: INCR was called, GET was not.
     mock_redis.incr.assert_called_once()
     mock_redis.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redirect_rate_check_and_click_in_one_round_trip(monkeypatch):
+    """
+    The redirect path used to do INCR, then EXPIRE (first hit), then ZINCRBY:
+    up to three sequential round trips. check_rate_limit_and_count_click must
+    issue exactly one script call and nothing else.
+    """
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+
+    redis = FakeRedis()
+    redis.incr = AsyncMock(return_value=1)
+    redis.expire = AsyncMock(return_value=True)
+    redis.zincrby = AsyncMock(return_value=1.0)
+    script = AsyncMock(return_value=1)
+    redis.register_script = MagicMock(return_value=script)
+    buffer = ClickBuffer(redis)
+
+    limiter = RateLimiter(max_requests=10)
+    await limiter.check_rate_limit_and_count_click(_make_mock_request(redis, path="/ABC123"), buffer, 42)
+
+    script.assert_awaited_once_with(
+        keys=["rate_limit:127.0.0.1:/ABC123", "clicks:leaderboard"], args=[60, 10, 42, 1]
+    )
+    redis.incr.assert_not_called()
+    redis.expire.assert_not_called()
+    redis.zincrby.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redirect_over_limit_is_rejected_and_not_counted(monkeypatch):
+    """Same semantics as check_rate_limit + increment: the request that crosses
+    the limit gets a 429 and its click is not buffered."""
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+
+    redis = FakeRedis()
+    counts = {}
+
+    async def incr(key):
+        counts[key] = counts.get(key, 0) + 1
+        return counts[key]
+
+    redis.incr = incr
+    buffer = ClickBuffer(redis)
+    limiter = RateLimiter(max_requests=2)
+    request = _make_mock_request(redis, path="/ABC123")
+
+    await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+    await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+
+    assert exc_info.value.status_code == 429
+    assert await buffer.get_count(42) == 2
+
+
+# ── GCRA limiter ──────────────────────────────────────────────────────────────
+
+def _clocked_redis():
+    """FakeRedis whose TIME the test controls; returns (redis, set_clock)."""
+    from tests.conftest import FakeRedis
+    redis = FakeRedis()
+    clock = {"now": 1_000_000.0}
+
+    async def server_time():
+        seconds, fraction = divmod(clock["now"], 1)
+        return int(seconds), int(round(fraction * 1_000_000))
+
+    redis.time = server_time
+    return redis, clock
+
+
+async def _allowed(limiter: RateLimiter, request, attempts: int) -> int:
+    allowed = 0
+    for _ in range(attempts):
+        try:
+            await limiter.check_rate_limit(request)
+            allowed += 1
+        except HTTPException as exc:
+            assert exc.status_code == 429
+    return allowed
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_a_burst_then_the_steady_rate(monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis, clock = _clocked_redis()
+    limiter = RateLimiter(max_requests=10, window_seconds=60, algorithm="gcra")
+    request = _make_mock_request(redis)
+
+    assert await _allowed(limiter, request, 15) == 10
+    clock["now"] += 5.9  # less than one emission interval (6s): nothing back
+    assert await _allowed(limiter, request, 1) == 0
+    clock["now"] += 0.1
+    assert await _allowed(limiter, request, 3) == 1
+    clock["now"] += 60  # a full window refills the whole burst
+    assert await _allowed(limiter, request, 15) == 10
+
+
+@pytest.mark.asyncio
+async def test_gcra_has_no_window_boundary_burst(monkeypatch):
+    """A fixed window lets a client spend its budget at the end of one window
+    and again at the start of the next. GCRA admits max + elapsed / interval."""
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis, clock = _clocked_redis()
+    limiter = RateLimiter(max_requests=10, window_seconds=60, algorithm="gcra")
+    request = _make_mock_request(redis)
+
+    assert await _allowed(limiter, request, 1) == 1
+    clock["now"] += 59.9
+    assert await _allowed(limiter, request, 10) == 10  # the first token came back long ago
+    clock["now"] += 0.2  # a fixed window would have reset here
+    assert await _allowed(limiter, request, 10) == 0
+
+
+@pytest.mark.asyncio
+async def test_gcra_is_one_round_trip_and_sets_no_separate_ttl(monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    mock_redis = AsyncMock()
+    script = AsyncMock(return_value=1)
+    mock_redis.register_script = MagicMock(return_value=script)
+    limiter = RateLimiter(max_requests=10, algorithm="gcra")
+
+    await limiter.check_rate_limit(_make_mock_request(mock_redis))
+    await limiter.check_rate_limit(_make_mock_request(mock_redis))
+
+    mock_redis.register_script.assert_called_once()
+    script.assert_awaited_with(keys=["rate_limit:gcra:127.0.0.1:/url"], args=[60, 10, 1])
+    mock_redis.incr.assert_not_called()
+    mock_redis.expire.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_gcra_redirect_counts_only_allowed_clicks(monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis, _ = _clocked_redis()
+    buffer = ClickBuffer(redis)
+    limiter = RateLimiter(max_requests=2, algorithm="gcra")
+    request = _make_mock_request(redis, path="/ABC123")
+
+    await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+    await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+    with pytest.raises(HTTPException):
+        await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+
+    assert await buffer.get_count(42) == 2
+
+
+def test_unknown_algorithm_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(max_requests=10, algorithm="leaky")
+
+
+# ── Local quota (two-tier) limiter ────────────────────────────────────────────
+
+def _workers(redis, count: int, max_requests: int, local_quota: int):
+    """One RateLimiter per simulated worker process, all sharing one Redis,
+    and a dict counting claim round trips."""
+    workers = [
+        RateLimiter(max_requests=max_requests, local_quota=local_quota) for _ in range(count)
+    ]
+    calls = {"claims": 0}
+    run_claim = redis.register_script(rate_limiter_module._CLAIM_SCRIPT)
+
+    async def counted_claim(keys, args):
+        calls["claims"] += 1
+        return await run_claim(keys=keys, args=args)
+
+    redis.register_script = MagicMock(return_value=counted_claim)
+    return workers, calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers, local_quota", [(1, 10), (4, 10), (8, 7), (3, 1)])
+async def test_local_quota_never_exceeds_the_global_limit(monkeypatch, workers, local_quota):
+    """Random traffic over several workers, far more than the limit: the total
+    admitted stays within [max - W * (quota - 1), max] and Redis sees one call
+    per claimed chunk, not one per request."""
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    limiters, calls = _workers(redis, workers, max_requests=100, local_quota=local_quota)
+    request = _make_mock_request(redis)
+    rng = random.Random(workers * 100 + local_quota)
+
+    admitted = 0
+    for _ in range(1_000):
+        admitted += await _allowed(rng.choice(limiters), request, 1)
+
+    assert 100 - workers * (local_quota - 1) <= admitted <= 100
+    # At most one successful claim per chunk, plus one empty claim per worker
+    # (after which it rejects locally until the window resets)
+    assert calls["claims"] <= -(-100 // local_quota) + workers + workers
+    assert sum(limiter.local_rejected for limiter in limiters) >= 1_000 - admitted - workers
+
+
+@pytest.mark.asyncio
+async def test_local_quota_one_worker_is_exact_and_mostly_local(monkeypatch):
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    limiter = RateLimiter(max_requests=100, local_quota=20)
+    request = _make_mock_request(redis)
+
+    assert await _allowed(limiter, request, 150) == 100
+    assert limiter.claims == 6  # 5 chunks of 20, then one that comes back empty
+    assert limiter.local_allowed == 95
+    assert limiter.local_rejected == 49
+
+
+@pytest.mark.asyncio
+async def test_local_quota_expires_with_the_redis_window(monkeypatch):
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    limiter = RateLimiter(max_requests=10, window_seconds=60, local_quota=5)
+    clock = {"now": 0.0}
+    limiter._clock = lambda: clock["now"]
+    request = _make_mock_request(redis)
+
+    assert await _allowed(limiter, request, 12) == 10
+    redis._strings.clear()  # Redis expired the window's counter
+    clock["now"] = 59.0
+    assert await _allowed(limiter, request, 1) == 0  # still rejected locally
+    clock["now"] = 60.0
+    assert await _allowed(limiter, request, 12) == 10
+
+
+@pytest.mark.asyncio
+async def test_local_quota_redirect_counts_clicks(monkeypatch):
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    buffer = ClickBuffer(redis)
+    limiter = RateLimiter(max_requests=3, local_quota=2)
+    request = _make_mock_request(redis, path="/ABC123")
+
+    for _ in range(3):
+        await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+    with pytest.raises(HTTPException):
+        await limiter.check_rate_limit_and_count_click(request, buffer, 42)
+
+    assert await buffer.get_count(42) == 3
+    assert limiter.claims == 3  # 2, then 1, then 0
+
+
+def test_local_quota_requires_fixed_window():
+    with pytest.raises(ValueError):
+        RateLimiter(max_requests=10, algorithm="gcra", local_quota=5)
+
+
+# ── Request cost (bulk creation) ──────────────────────────────────────────────
+
+async def _allowed_cost(limiter, request, cost) -> bool:
+    try:
+        await limiter.check_rate_limit(request, cost=cost)
+    except HTTPException:
+        return False
+    return True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "gcra"])
+async def test_cost_counts_a_batch_by_its_size(monkeypatch, algorithm):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis, _ = _clocked_redis()
+    redis.incr = lambda key: redis.incrby(key, 1)  # a real counter, for this test
+    limiter = RateLimiter(max_requests=10, algorithm=algorithm)
+    request = _make_mock_request(redis)
+
+    assert await _allowed_cost(limiter, request, 7)
+    assert not await _allowed_cost(limiter, request, 4)
+    # A rejected GCRA batch doesn't spend anything; a fixed window counts it
+    assert await _allowed_cost(limiter, request, 3) == (algorithm == "gcra")
+
+
+@pytest.mark.asyncio
+async def test_cost_with_local_quota_keeps_the_unspent_claim(monkeypatch):
+    """A batch bigger than the chunk claims exactly what it needs; one the
+    window can't fit is rejected, and what it claimed serves later requests."""
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    limiter = RateLimiter(max_requests=10, local_quota=2)
+    request = _make_mock_request(redis)
+
+    assert await _allowed_cost(limiter, request, 6)
+    assert not await _allowed_cost(limiter, request, 5)  # claims the last 4, can't fit 5
+    assert await _allowed(limiter, request, 5) == 4
+    assert redis._strings["rate_limit:127.0.0.1:/url"] == "10"
+
+
+@pytest.mark.asyncio
+async def test_cost_shares_the_bucket_of_path(monkeypatch):
+    from shortener_app.config import get_settings
+    from tests.conftest import FakeRedis
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    redis = FakeRedis()
+    limiter = RateLimiter(max_requests=10, local_quota=1)
+    await limiter.check_rate_limit(_make_mock_request(redis, path="/urls/batch"), cost=4, path="/url")
+    assert redis._strings == {"rate_limit:127.0.0.1:/url": "4"}
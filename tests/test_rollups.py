@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import ClickBuffer, upsert_rollups
+from shortener_app.main import app
+from shortener_app.services import ClickRollupService, URLService
+from tests.conftest import FakeRedis
+
+NOON = datetime(2026, 3, 14, 12, 0)
+
+
+async def _rollups(factory) -> list[tuple[int, str, datetime, int]]:
+    async with factory() as db:
+        result = await db.execute(select(models.ClickRollup).order_by(
+            models.ClickRollup.resolution, models.ClickRollup.bucket_start
+        ))
+        return [(r.url_id, r.resolution, r.bucket_start, r.clicks) for r in result.scalars()]
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_minute_buckets(test_db):
+    buffer = ClickBuffer(FakeRedis())
+    async with test_db() as db:
+        url = await URLService(db).create("https://example.com")
+    for _ in range(3):
+        await buffer.increment(url.id)
+
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+    for _ in range(2):
+        await buffer.increment(url.id)
+    async with test_db() as db:
+        await buffer.flush_to_db(db)
+
+    rows = await _rollups(test_db)
+    assert sum(clicks for *_, clicks in rows) == 5
+    assert all(res == "minute" and bucket.second == 0 for _, res, bucket, _ in rows)
+
+
+@pytest.mark.asyncio
+async def test_compaction_folds_minutes_into_hours_into_days(test_db):
+    async with test_db() as db:
+        await upsert_rollups(db, [
+            (1, NOON - timedelta(days=3, minutes=50), 2),   # 3 days old
+            (1, NOON - timedelta(days=3, minutes=10), 3),
+            (1, NOON - timedelta(hours=5, minutes=30), 4),  # hours old
+            (1, NOON - timedelta(minutes=5), 1),            # recent: stays a minute
+        ])
+        await db.commit()
+
+    async with test_db() as db:
+        folded = await ClickRollupService(db).compact(
+            NOON, minute_retention=timedelta(hours=1), hour_retention=timedelta(days=1)
+        )
+    assert folded == {"minute_to_hour": 3, "hour_to_day": 1}
+    assert await _rollups(test_db) == [
+        (1, "day", datetime(2026, 3, 11), 5),
+        (1, "hour", datetime(2026, 3, 14, 6), 4),
+        (1, "minute", datetime(2026, 3, 14, 11, 55), 1),
+    ]
+
+    async with test_db() as db:  # nothing left to fold
+        assert await ClickRollupService(db).compact(
+            NOON, minute_retention=timedelta(hours=1), hour_retention=timedelta(days=1)
+        ) == {"minute_to_hour": 0, "hour_to_day": 0}
+
+
+@pytest.mark.asyncio
+async def test_timeseries_sums_to_resolution_and_keeps_coarser_points(test_db):
+    async with test_db() as db:
+        await upsert_rollups(db, [(1, datetime(2026, 3, 13), 7)], resolution="day")
+        await upsert_rollups(db, [
+            (1, NOON + timedelta(minutes=1), 1),
+            (1, NOON + timedelta(minutes=2), 2),
+            (1, NOON + timedelta(hours=1), 3),
+            (2, NOON, 100),  # another URL
+        ])
+        await db.commit()
+
+        points = await ClickRollupService(db).timeseries(
+            1, start=datetime(2026, 3, 13, 18), end=NOON + timedelta(hours=2), resolution="hour"
+        )
+
+    assert points == [
+        (datetime(2026, 3, 13), "day", 7),
+        (NOON, "hour", 3),
+        (NOON + timedelta(hours=1), "hour", 3),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_timeseries_endpoint(client, test_db):
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    url_key = response.json()["url"].split("/")[-1]
+    secret_key = response.json()["admin_url"].split("/")[-1]
+    for _ in range(4):
+        await client.get(f"/{url_key}", follow_redirects=False)
+    async with test_db() as db:
+        await app.state.click_buffer.flush_to_db(db)
+
+    response = await client.get(f"/admin/{secret_key}/timeseries")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["resolution"] == "hour"
+    assert [(b["resolution"], b["clicks"]) for b in data["buckets"]] == [("hour", 4)]
+
+
+@pytest.mark.asyncio
+async def test_timeseries_endpoint_validates_range(client):
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    secret_key = response.json()["admin_url"].split("/")[-1]
+
+    assert (await client.get(
+        f"/admin/{secret_key}/timeseries", params={"resolution": "week"}
+    )).status_code == 400
+    assert (await client.get(f"/admin/{secret_key}/timeseries", params={
+        "start": "2026-03-14T12:00:00", "end": "2026-03-14T11:00:00",
+    })).status_code == 400
+    assert (await client.get(f"/admin/{secret_key}/timeseries", params={
+        "start": "2020-01-01T00:00:00", "end": "2026-01-01T00:00:00", "resolution": "hour",
+    })).status_code == 400
+    assert (await client.get("/admin/NOTEXIST_SECRET/timeseries")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_minute_resolution_needs_the_stream_backend(client, monkeypatch):
+    """The zset backend buckets whole flush batches, too coarse for minutes."""
+    from shortener_app.config import get_settings
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    secret_key = response.json()["admin_url"].split("/")[-1]
+    params = {"resolution": "minute"}
+
+    response = await client.get(f"/admin/{secret_key}/timeseries", params=params)
+    assert response.status_code == 400
+    assert "stream" in response.json()["detail"]
+
+    monkeypatch.setattr(get_settings(), "click_buffer_backend", "stream")
+    response = await client.get(f"/admin/{secret_key}/timeseries", params=params)
+    assert response.status_code == 200
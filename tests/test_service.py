@@ -81,3 +81,15 @@ async def test_deactivate_nonexistent(test_db):
         service = URLService(db)
         result = await service.deactivate("NOTEXIST")
         assert result is None
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_opened_on_first_query(test_db):
+    service = URLService(session_factory=test_db)
+    assert service.has_session is False
+
+    assert await service.get_by_key("NOTEXIST") is None
+    assert service.has_session is True
+
+    await service.close()
+    assert service.has_session is False
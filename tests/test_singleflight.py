@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from shortener_app.infrastructure import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+
+    async def lookup():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*[flights.do("KEY", lookup) for _ in range(10)])
+
+    assert results == ["result"] * 10
+    assert calls == 1
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "coalesced": 9}
+
+
+@pytest.mark.asyncio
+async def test_error_reaches_waiters_but_is_not_cached():
+    """Every waiter of a failed flight sees the error; the next call retries."""
+    flights = SingleFlight()
+    attempts = 0
+
+    async def flaky_lookup():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise ConnectionError("pool exhausted")
+        return "recovered"
+
+    results = await asyncio.gather(
+        *[flights.do("KEY", flaky_lookup) for _ in range(5)], return_exceptions=True
+    )
+    assert all(isinstance(r, ConnectionError) for r in results)
+
+    assert await flights.do("KEY", flaky_lookup) == "recovered"
+    assert attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_the_flight():
+    """The caller that started the lookup is cancelled (e.g. client disconnect);
+    the other waiters must still get the result."""
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def slow_lookup():
+        await release.wait()
+        return "result"
+
+    leader = asyncio.create_task(flights.do("KEY", slow_lookup))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("KEY", slow_lookup))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+    release.set()
+    assert await follower == "result"
@@ -0,0 +1,128 @@
+import pytest
+
+from shortener_app import keygen, models
+from shortener_app.main import app
+from shortener_app.services import URLService
+
+
+@pytest.mark.asyncio
+async def test_batch_create_returns_urls_in_input_order(client):
+    targets = [f"https://example.com/{i}" for i in range(5)]
+    response = await client.post("/urls/batch", json={"target_urls": targets})
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["target_url"] for item in data] == targets
+    assert len({item["url"] for item in data}) == 5
+
+    # Every created URL redirects
+    key = data[3]["url"].split("/")[-1]
+    redirect = await client.get(f"/{key}", follow_redirects=False)
+    assert redirect.headers["location"] == "https://example.com/3"
+
+
+@pytest.mark.asyncio
+async def test_batch_create_rejects_invalid_urls_and_creates_nothing(client, test_db):
+    response = await client.post(
+        "/urls/batch", json={"target_urls": ["https://example.com", "not-a-url"]}
+    )
+    assert response.status_code == 400
+    assert "URL 1" in response.json()["detail"]
+    async with test_db() as db:
+        assert (await db.execute(models.URL.__table__.select())).first() is None
+
+
+@pytest.mark.asyncio
+async def test_batch_create_size_limits(client, monkeypatch):
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "url_batch_max_size", 3)
+    assert (await client.post("/urls/batch", json={"target_urls": []})).status_code == 400
+    too_many = {"target_urls": [f"https://example.com/{i}" for i in range(4)]}
+    assert (await client.post("/urls/batch", json=too_many)).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_batch_counts_its_size_against_the_create_limit(client, monkeypatch):
+    """RATE_LIMIT_CREATE is 10: a batch of 8 leaves room for 2 more URLs,
+    single or batched, in the same bucket as POST /url."""
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    targets = [f"https://example.com/{i}" for i in range(8)]
+    assert (await client.post("/urls/batch", json={"target_urls": targets})).status_code == 200
+    response = await client.post("/urls/batch", json={"target_urls": targets[:3]})
+    assert response.status_code == 429
+    assert await app.state.redis.get("rate_limit:127.0.0.1:/url") == "11"
+
+
+@pytest.mark.asyncio
+async def test_batch_larger_than_the_create_limit_is_rejected_up_front(client, monkeypatch):
+    """With the default limit of 10, 11 URLs could never be admitted: a 400,
+    and the client's window is left untouched."""
+    from shortener_app.config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    too_many = {"target_urls": [f"https://example.com/{i}" for i in range(11)]}
+    response = await client.post("/urls/batch", json=too_many)
+    assert response.status_code == 400
+    assert "At most 10" in response.json()["detail"]
+    assert await app.state.redis.get("rate_limit:127.0.0.1:/url") is None
+
+    ok = await client.post("/urls/batch", json={"target_urls": too_many["target_urls"][:10]})
+    assert ok.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_only_colliding_rows_are_retried(test_db, monkeypatch):
+    """Row 1 draws a stored key and row 2 repeats row 0's key: both go to a
+    second round, and only they do."""
+    async with test_db() as db:
+        db.add(models.URL(target_url="https://example.com", key="TAKEN1", secret_key="TAKEN1_s"))
+        await db.commit()
+
+    real_generate_keys = keygen.generate_keys
+    rounds = []
+
+    def scripted_keys(count, size=6):
+        if size != 6:
+            return real_generate_keys(count, size)
+        rounds.append(count)
+        return ["FRESH1", "TAKEN1", "FRESH1"] if len(rounds) == 1 else ["RETRY1", "RETRY2"]
+
+    monkeypatch.setattr(keygen, "generate_keys", scripted_keys)
+    async with test_db() as db:
+        created = await URLService(db).create_many(
+            ["https://a.example", "https://b.example", "https://c.example"]
+        )
+
+    assert rounds == [3, 2]
+    assert [url.key for url in created] == ["FRESH1", "RETRY1", "RETRY2"]
+    assert [url.target_url for url in created] == [
+        "https://a.example", "https://b.example", "https://c.example"
+    ]
+    assert all(url.secret_key.startswith(f"{url.key}_") for url in created)
+
+
+@pytest.mark.asyncio
+async def test_batch_fails_whole_when_keys_keep_colliding(test_db, monkeypatch):
+    async with test_db() as db:
+        db.add(models.URL(target_url="https://example.com", key="TAKEN1", secret_key="TAKEN1_s"))
+        await db.commit()
+    real_generate_keys = keygen.generate_keys
+    monkeypatch.setattr(
+        keygen, "generate_keys",
+        lambda count, size=6: ["TAKEN1"] * count if size == 6 else real_generate_keys(count, size),
+    )
+    async with test_db() as db:
+        with pytest.raises(ValueError):
+            await URLService(db).create_many(["https://a.example"])
+        assert len((await db.execute(models.URL.__table__.select())).all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_uses_the_feistel_generator(test_db):
+    from shortener_app.infrastructure.key_blocks import FeistelKeyGenerator
+    from tests.conftest import FakeRedis
+    generator = FeistelKeyGenerator(FakeRedis(), b"secret", block_size=2)
+    async with test_db() as db:
+        created = await URLService(db, key_generator=generator).create_many(
+            [f"https://example.com/{i}" for i in range(5)]
+        )
+    assert [url.key for url in created] == [generator.permutation.key(i) for i in range(5)]
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from shortener_app.infrastructure.url_cache import CachedURL, URLCache, RedisURLCache
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+def test_lru_eviction_respects_max_size():
+    """The least recently used entry is evicted once max_size is exceeded."""
+    cache = URLCache(FakeRedis(), max_size=2)
+    cache.set("AAAAAA", CachedURL(1, "https://a.com", True))
+    cache.set("BBBBBB", CachedURL(2, "https://b.com", True))
+    cache.get("AAAAAA")  # touch A so B becomes the LRU entry
+    cache.set("CCCCCC", CachedURL(3, "https://c.com", True))
+
+    assert cache.get("BBBBBB") is None
+    assert cache.get("AAAAAA") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_expired_entries_are_misses():
+    cache = URLCache(FakeRedis(), ttl=0)
+    cache.set("AAAAAA", CachedURL(1, "https://a.com", True))
+
+    assert cache.get("AAAAAA") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] == 0
+
+
+def test_set_skipped_when_invalidation_raced_with_read():
+    """
+    Race: worker reads an active row, a concurrent deactivate commits and its
+    invalidation is processed, then the reader caches the stale active row.
+    The generation captured before the read must make that set() a no-op.
+    """
+    cache = URLCache(FakeRedis())
+    generation = cache.generation
+    cache.evict("AAAAAA")  # invalidation arrives while the read is in flight
+    cache.set("AAAAAA", CachedURL(1, "https://a.com", True), generation)
+
+    assert cache.get("AAAAAA") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reaches_other_workers():
+    """invalidate() on one worker evicts the key from every subscribed worker."""
+    redis = FakeRedis()
+    local, remote = URLCache(redis), URLCache(redis)
+    listener = asyncio.create_task(remote.listen())
+    await asyncio.sleep(0)  # let the listener subscribe
+
+    record = CachedURL(1, "https://a.com", True)
+    local.set("AAAAAA", record)
+    remote.set("AAAAAA", record)
+    await local.invalidate("AAAAAA")
+    await asyncio.sleep(0)
+
+    assert local.get("AAAAAA") is None
+    assert remote.get("AAAAAA") is None
+    assert remote.stats()["invalidations"] == 1
+
+    listener.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await listener
+
+
+@pytest.mark.asyncio
+async def test_cached_lookup_skips_database(test_db):
+    cache = URLCache(FakeRedis())
+    async with test_db() as db:
+        created = await URLService(db, cache=cache).create("https://example.com")
+
+    async with test_db() as db:
+        first = await URLService(db, cache=cache).get_by_key_cached(created.key)
+    async with test_db() as db:
+        service = URLService(db, cache=cache)
+        service.get_by_key = None  # any database access would now raise
+        second = await service.get_by_key_cached(created.key)
+
+    assert first == second == CachedURL(created.id, "https://example.com", True)
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_deactivate_invalidates_cache(test_db):
+    redis = FakeRedis()
+    cache = URLCache(redis)
+    async with test_db() as db:
+        service = URLService(db, cache=cache)
+        created = await service.create("https://example.com")
+        assert await service.get_by_key_cached(created.key) is not None
+
+        await service.deactivate(created.secret_key)
+
+        assert await service.get_by_key_cached(created.key) is None
+        # The inactive row is now cached, so repeat lookups stay off the DB
+        assert cache.get(created.key).is_active is False
+
+
+@pytest.mark.asyncio
+async def test_cold_worker_warms_from_shared_cache(test_db):
+    """create() writes through to Redis, so a worker with an empty process
+    cache resolves the key without touching the database."""
+    shared = RedisURLCache(FakeRedis())
+    async with test_db() as db:
+        created = await URLService(db, shared_cache=shared).create("https://example.com")
+
+    cold_cache = URLCache(shared.redis)
+    async with test_db() as db:
+        service = URLService(db, cache=cold_cache, shared_cache=shared)
+        service.get_by_key = None  # any database access would now raise
+        record = await service.get_by_key_cached(created.key)
+
+    assert record == CachedURL(created.id, "https://example.com", True)
+    assert shared.stats()["hits"] == 1
+    assert cold_cache.get(created.key) == record
+
+
+@pytest.mark.asyncio
+async def test_shared_fill_never_overwrites_deactivation():
+    """
+    Race: a reader loads an active row, a concurrent deactivate writes
+    active=0 through to Redis, then the reader fills. The fill must lose.
+    """
+    shared = RedisURLCache(FakeRedis())
+    await shared.set("AAAAAA", CachedURL(1, "https://a.com", False))
+    await shared.fill("AAAAAA", CachedURL(1, "https://a.com", True))
+
+    assert (await shared.get("AAAAAA")).is_active is False
+
+
+@pytest.mark.asyncio
+async def test_deactivate_writes_through_to_shared_cache(test_db):
+    shared = RedisURLCache(FakeRedis())
+    async with test_db() as db:
+        service = URLService(db, cache=URLCache(shared.redis), shared_cache=shared)
+        created = await service.create("https://example.com")
+        await service.deactivate(created.secret_key)
+
+    assert (await shared.get(created.key)).is_active is False
+
+
+class _DownRedis(FakeRedis):
+    def __init__(self):
+        super().__init__()
+        self.hset_calls = 0
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.hset_calls += 1
+        raise RedisConnectionError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_create_succeeds_when_the_shared_cache_is_down(client, monkeypatch):
+    """The write-through runs after the commit; failing it would 500 a created
+    URL and invite a retry that creates a duplicate."""
+    from shortener_app.main import app
+    shared = RedisURLCache(_DownRedis())
+    monkeypatch.setattr(app.state, "shared_url_cache", shared, raising=False)
+
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    assert response.status_code == 200
+    response = await client.post("/urls/batch", json={"target_urls": ["https://a.com", "https://b.com"]})
+    assert response.status_code == 200
+    assert shared.stats()["unavailable"] == 3
+
+
+@pytest.mark.asyncio
+async def test_deactivate_write_through_retries_then_raises(test_db):
+    redis = _DownRedis()
+    async with test_db() as db:
+        service = URLService(db, shared_cache=RedisURLCache(redis))
+        created = await service.create("https://example.com")
+        with pytest.raises(RedisConnectionError):
+            await service.deactivate(created.secret_key)
+    assert redis.hset_calls == 4  # the create's one attempt, then deactivate's three
+
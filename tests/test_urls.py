@@ -321,4 +321,94 @@ async def test_javascript_url_scheme(client):
 async def test_data_url_scheme(client):
     """Test rejection of data: URLs."""
     response = await client.post("/url", json={"target_url": "data:text/html,<script>alert('xss')</script>"})
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_metrics_reports_url_cache_counters(client, admin_headers):
+    """Test that repeat redirects are served from the URL cache and counted."""
+    create_response = await client.post("/url", json={"target_url": "https://example.com"})
+    url_key = create_response.json()["url"].split("/")[-1]
+
+    await client.get(f"/{url_key}", follow_redirects=False)  # miss, populates cache
+    await client.get(f"/{url_key}", follow_redirects=False)  # hit
+
+    response = await client.get("/admin/metrics", headers=admin_headers)
+    assert response.status_code == 200
+    stats = response.json()["url_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+    assert response.json()["click_flush_lease"] is None  # lifespan not run in tests
+
+
+@pytest.mark.asyncio
+async def test_cached_redirect_opens_no_session(client, test_db):
+    """Test that a redirect answered from the URL cache never builds a DB session."""
+    from shortener_app.main import app, get_session_factory
+
+    create_response = await client.post("/url", json={"target_url": "https://example.com"})
+    url_key = create_response.json()["url"].split("/")[-1]
+    await client.get(f"/{url_key}", follow_redirects=False)  # warm the cache
+
+    sessions_opened = []
+
+    def counting_factory():
+        sessions_opened.append(1)
+        return test_db()
+
+    app.dependency_overrides[get_session_factory] = lambda: counting_factory
+
+    response = await client.get(f"/{url_key}", follow_redirects=False)
+    assert response.status_code == 307
+    assert sessions_opened == []
+
+    response = await client.get("/NOTEXIST", follow_redirects=False)
+    assert response.status_code == 404
+    assert len(sessions_opened) == 1  # a miss still falls through to SQL
+
+
+@pytest.mark.asyncio
+async def test_over_limit_lookups_of_unknown_keys_issue_no_select(client, test_db, monkeypatch):
+    """The rate check runs before any Redis/SQL lookup the process cache can't
+    answer, so a client over its limit never reaches the database."""
+    from shortener_app.config import get_settings
+    from shortener_app.main import app, get_session_factory, read_rate_limiter
+
+    monkeypatch.setattr(get_settings(), "rate_limit_enabled", True)
+    monkeypatch.setattr(read_rate_limiter, "max_requests", 2)
+    counts = {}
+
+    async def incr(key):
+        counts[key] = counts.get(key, 0) + 1
+        return counts[key]
+
+    monkeypatch.setattr(app.state.redis, "incr", incr)
+    sessions_opened = []
+
+    def counting_factory():
+        sessions_opened.append(1)
+        return test_db()
+
+    app.dependency_overrides[get_session_factory] = lambda: counting_factory
+
+    for _ in range(2):
+        assert (await client.get("/NOTEXIST", follow_redirects=False)).status_code == 404
+    assert len(sessions_opened) == 2
+    for _ in range(3):
+        assert (await client.get("/NOTEXIST", follow_redirects=False)).status_code == 429
+    assert len(sessions_opened) == 2
+
+
+@pytest.mark.asyncio
+async def test_site_wide_admin_endpoints_need_the_admin_token(client, monkeypatch):
+    from shortener_app.config import get_settings
+
+    for path in ("/admin/metrics", "/admin/leaderboard"):
+        assert (await client.get(path)).status_code == 404  # no ADMIN_TOKEN: off
+
+    monkeypatch.setattr(get_settings(), "admin_token", "s3cret")
+    for path in ("/admin/metrics", "/admin/leaderboard"):
+        assert (await client.get(path)).status_code == 401
+        assert (await client.get(path, headers={"Authorization": "Bearer wrong"})).status_code == 401
+        assert (await client.get(path, headers={"Authorization": "Bearer s3cret"})).status_code == 200
+
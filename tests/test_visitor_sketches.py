@@ -0,0 +1,108 @@
+import pytest
+
+from shortener_app import models
+from shortener_app.infrastructure.click_buffer import ClickBuffer
+from shortener_app.infrastructure.visitor_sketches import VisitorSketches
+from shortener_app.main import app
+from shortener_app.services import URLService
+from tests.conftest import FakeRedis
+
+
+async def _create_url(factory) -> models.URL:
+    async with factory() as db:
+        return await URLService(db).create("https://example.com")
+
+
+@pytest.mark.asyncio
+async def test_repeat_visitors_are_counted_once():
+    redis = FakeRedis()
+    visitors = VisitorSketches(redis)
+    buffer = ClickBuffer(redis, visitors=visitors)
+    for ip in ["1.1.1.1", "1.1.1.1", "2.2.2.2", "1.1.1.1"]:
+        await buffer.increment_rate_limited(7, f"rate_limit:{ip}:/ABC", 100, 60, visitor=ip)
+
+    assert await buffer.get_count(7) == 4
+    assert await visitors.count(7) == 2
+    assert await redis.spop("visitors:dirty", 10) == ["7"]
+
+
+@pytest.mark.asyncio
+async def test_local_aggregation_sends_visitors_with_the_batch():
+    redis = FakeRedis()
+    visitors = VisitorSketches(redis)
+    buffer = ClickBuffer(redis, aggregate_locally=True, visitors=visitors)
+    for ip in ["1.1.1.1", "2.2.2.2", "2.2.2.2"]:
+        await buffer.increment(7, visitor=ip)
+    assert await visitors.count(7) == 0
+
+    await buffer.flush_local()
+
+    assert await visitors.count(7) == 2
+
+
+@pytest.mark.asyncio
+async def test_persist_survives_loss_of_the_redis_sketch(test_db):
+    """The stored sketch is merged back before persisting, so visitors seen
+    before Redis lost the key are still counted, and merging twice is harmless."""
+    redis = FakeRedis()
+    visitors = VisitorSketches(redis)
+    url = await _create_url(test_db)
+    await visitors.add(url.id, "1.1.1.1")
+    await visitors.add(url.id, "2.2.2.2")
+    async with test_db() as db:
+        assert await visitors.persist(db) == 1
+
+    await redis.delete(f"visitors:{url.id}")  # evicted / lost
+    await visitors.add(url.id, "3.3.3.3")
+    async with test_db() as db:
+        await visitors.persist(db)
+    await visitors.add(url.id, "3.3.3.3")  # dirty again, no new visitor
+    async with test_db() as db:
+        await visitors.persist(db)
+
+    assert await visitors.count(url.id) == 3
+    async with test_db() as db:
+        assert (await db.get(models.URL, url.id)).unique_visitors == 3
+        assert (await db.get(models.URLVisitorSketch, url.id)).sketch
+
+
+@pytest.mark.asyncio
+async def test_persisted_sketches_get_a_ttl(test_db, monkeypatch):
+    """Persisted sketches expire from Redis, unless the TTL is 0."""
+    redis = FakeRedis()
+    expired = []
+
+    async def expire(key, seconds):
+        expired.append((key, seconds))
+        return True
+
+    monkeypatch.setattr(redis, "expire", expire)
+    visitors = VisitorSketches(redis, ttl=3600)
+    url = await _create_url(test_db)
+    await visitors.add(url.id, "1.1.1.1")
+    async with test_db() as db:
+        await visitors.persist(db)
+    assert expired == [(f"visitors:{url.id}", 3600)]
+
+    expired.clear()
+    await VisitorSketches(redis, ttl=0).add(url.id, "2.2.2.2")
+    async with test_db() as db:
+        await VisitorSketches(redis, ttl=0).persist(db)
+    assert expired == []
+
+
+@pytest.mark.asyncio
+async def test_admin_reports_unique_visitors(client, monkeypatch):
+    visitors = VisitorSketches(app.state.redis)
+    monkeypatch.setattr(app.state, "visitor_sketches", visitors, raising=False)
+    app.state.click_buffer = ClickBuffer(app.state.redis, visitors=visitors)
+
+    response = await client.post("/url", json={"target_url": "https://example.com"})
+    url_key = response.json()["url"].split("/")[-1]
+    secret_key = response.json()["admin_url"].split("/")[-1]
+    for _ in range(3):
+        await client.get(f"/{url_key}", follow_redirects=False)
+
+    info = (await client.get(f"/admin/{secret_key}")).json()
+    assert info["clicks"] == 3
+    assert info["unique_visitors"] == 1  # every request comes from the test client's IP